@@ -1,16 +1,45 @@
 import os
+import sys
+import time
+import shutil
+import orjson
 import asyncio
+import importlib
 import argparse
 import logging
-from concurrent.futures import ThreadPoolExecutor
-from utility.audio.audio_generator import generate_audio
-from utility.captions.timed_captions_generator import generate_timed_captions
-from utility.video.background_video_generator import generate_video_url
-from utility.render.render_engine import get_output_media
-from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
+from contextlib import asynccontextmanager
+from utility import artifact_store, instrumentation
+from utility.audio.audio_generator import generate_audio, VOICE, TTS_BACKEND
+from utility.captions.timed_captions_generator import generate_timed_captions, generate_timed_captions_from_boundaries
+from utility.video import search_cache
+from utility.video.background_video_generator import VideoRegistry
+from utility.render.output_sink import StreamSink, as_sink
+from utility.video import video_search_query_generator
+from utility.video.video_search_query_generator import streamVideoSearchQueriesTimed, merge_empty_intervals
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Backends are imported on first use: moviepy alone takes about half a
+# second to import, and --help or the ffmpeg backends never need it
+RENDER_BACKENDS = {
+    "moviepy": ("utility.render.render_engine", "get_output_media"),
+    "ffmpeg": ("utility.render.ffmpeg_render_engine", "get_output_media_ffmpeg"),
+    "segmented": ("utility.render.segment_render_engine", "get_output_media_segmented"),
+    "concat": ("utility.render.concat_render_engine", "get_output_media_concat"),
+}
+DRAFT_RENDER_BACKEND = ("utility.render.ffmpeg_render_engine", "get_output_media_draft")
+
+STAGES = ["audio", "captions", "search_terms", "video_search", "render"]
+
+AUDIO_FILE_NAME = "audio_tts.wav"
+OUTPUT_FILE_NAME = "rendered_video.mp4"
+DRAFT_FILE_NAME = "draft_video.mp4"
+VIDEO_SERVER = "pexel"
+
+def load_render_backend(backend):
+    module, function = backend
+    return getattr(importlib.import_module(module), function)
+
 def read_script_from_file(file_path):
     try:
         with open(file_path, 'r') as file:
@@ -22,53 +51,252 @@ def read_script_from_file(file_path):
         logging.error(f"Error reading script file: {file_path}")
         raise
 
-async def process_audio_and_captions(script, audio_file):
-    audio_task = asyncio.create_task(generate_audio(script, audio_file))
-    await audio_task
+@asynccontextmanager
+async def stage(name, limits=None, timings=None):
+    # Holds the stage's concurrency slot (if limits has one) and records the
+    # time spent inside it into timings[name] and an instrumentation span
+    limit = (limits or {}).get(name)
+    queued = time.perf_counter()
+    if limit is not None:
+        await limit.acquire()
+    start = time.perf_counter()
+    try:
+        with instrumentation.span(name, slot_wait_s=round(start - queued, 6)):
+            yield
+    finally:
+        if timings is not None:
+            timings[name] = round(timings.get(name, 0) + time.perf_counter() - start, 3)
+        if limit is not None:
+            limit.release()
+
+async def caption_audio(audio_file, word_boundaries, caption_source, transcriber=None):
+    if word_boundaries:
+        timed_captions = generate_timed_captions_from_boundaries(word_boundaries)
+        if timed_captions:
+            return timed_captions
+        logging.warning("TTS word boundaries produced no captions, falling back to Whisper")
+    elif caption_source == "tts":
+        logging.warning("No TTS word boundaries received, falling back to Whisper")
+    if transcriber is not None:
+        return await transcriber.transcribe(audio_file)
     return await asyncio.to_thread(generate_timed_captions, audio_file)
 
-async def main(script_file, video_type):
-    SAMPLE_FILE_NAME = "audio_tts.wav"
-    VIDEO_SERVER = "pexel"
+async def process_audio(script, audio_file, caption_source="tts", limits=None, timings=None):
+    # Returns (audio_key, word_boundaries); the audio is reused from the
+    # artifact store when the script and voice are unchanged
+    audio_key = artifact_store.artifact_key("audio", script, VOICE, TTS_BACKEND)
+    word_boundaries = [] if caption_source == "tts" else None
+    async with stage("audio", limits, timings):
+        cached = artifact_store.load("audio", audio_key, file=audio_file, metrics=timings)
+        if caption_source == "tts" and cached is not None and cached["word_boundaries"] is None:
+            # Saved by a Whisper-captioned run, which doesn't capture word boundaries
+            cached = None
+        if cached is not None:
+            # Whisper captions ignore boundaries a TTS-captioned run saved
+            if caption_source == "tts":
+                word_boundaries = cached["word_boundaries"]
+        else:
+            await generate_audio(script, audio_file, word_boundaries)
+            artifact_store.save("audio", audio_key, {"word_boundaries": word_boundaries}, file=audio_file)
+    return audio_key, word_boundaries
+
+async def process_captions(audio_key, audio_file, word_boundaries, caption_source="tts", limits=None, timings=None, transcriber=None):
+    whisper_model = transcriber.model_size if transcriber else "base"
+    captions_key = artifact_store.artifact_key("captions", audio_key, caption_source, whisper_model)
+    # A transcription service queues Whisper work itself, so the stage slot isn't needed
+    async with stage("captions", None if transcriber else limits, timings):
+        cached = artifact_store.load("captions", captions_key, metrics=timings)
+        if cached is not None:
+            return [((t1, t2), text) for (t1, t2), text in cached]
+        timed_captions = await caption_audio(audio_file, word_boundaries, caption_source, transcriber)
+        if timed_captions:
+            artifact_store.save("captions", captions_key, timed_captions)
+        return timed_captions
+
+async def process_audio_and_captions(script, audio_file, caption_source="tts", limits=None, timings=None, transcriber=None):
+    audio_key, word_boundaries = await process_audio(script, audio_file, caption_source, limits, timings)
+    return await process_captions(audio_key, audio_file, word_boundaries, caption_source, limits, timings, transcriber)
+
+async def stream_search_terms(script, timed_captions, search_terms, limits=None, timings=None):
+    # Yields keyword segments as the LLM streams them, collecting them in
+    # search_terms; on any failure search_terms is emptied, as no terms were generated
+    async with stage("search_terms", limits, timings):
+        try:
+            async for segment in streamVideoSearchQueriesTimed(script, timed_captions, search_terms):
+                yield segment
+        except Exception as e:
+            logging.error(f"Error in getVideoSearchQueriesTimed: {str(e)}")
+            search_terms.clear()
+
+def draft_manifest_path(draft_file):
+    return os.path.splitext(draft_file)[0] + ".json"
 
+def save_draft_manifest(draft_file, audio_file, timed_captions, background_video_urls):
+    # Everything the final render needs, so it uses exactly the footage and
+    # timings of the approved draft; the audio is copied as audio_file is reused
+    base = os.path.splitext(draft_file)[0]
+    draft_audio = base + "_audio" + os.path.splitext(audio_file)[1]
+    shutil.copyfile(audio_file, draft_audio)
+    manifest = {"audio": os.path.abspath(draft_audio), "captions": timed_captions,
+                "background_video_urls": background_video_urls}
+    with open(draft_manifest_path(draft_file), "wb") as f:
+        f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+    return draft_manifest_path(draft_file)
+
+async def render_from_draft(manifest_file, output_file=OUTPUT_FILE_NAME, render_backend="moviepy", limits=None, timings=None):
+    # Final render of an approved draft: no TTS, LLM or search, the footage is
+    # what the draft showed at full resolution
+    timings = {} if timings is None else timings
+    with open(manifest_file, "rb") as f:
+        manifest = orjson.loads(f.read())
+    timed_captions = [((t1, t2), text) for (t1, t2), text in manifest["captions"]]
+    return await render_video(manifest["audio"], timed_captions, manifest["background_video_urls"], output_file,
+                              render_backend, limits, timings)
+
+async def generate_video(script, audio_file=AUDIO_FILE_NAME, output_file=OUTPUT_FILE_NAME, render_backend="moviepy",
+                         caption_source="tts", limits=None, timings=None, transcriber=None, draft=False, pexels_client=None):
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
     try:
-        script = read_script_from_file(script_file)
-        logging.info(f"Script read from file: {script[:50]}...")
+        return await run_stages(script, audio_file, output_file, render_backend, caption_source, limits, timings, transcriber, draft,
+                                pexels_client)
+    finally:
+        timings["total"] = round(time.perf_counter() - start, 3)
+        logging.info(f"Stage timings: {timings}")
 
-        timed_captions = await process_audio_and_captions(script, SAMPLE_FILE_NAME)
-        logging.info(f"Timed captions generated: {len(timed_captions)} captions")
+async def run_stages(script, audio_file, output_file, render_backend, caption_source, limits, timings, transcriber, draft=False,
+                     pexels_client=None):
+    timed_captions = await process_audio_and_captions(script, audio_file, caption_source, limits, timings, transcriber)
+    if not timed_captions:
+        logging.warning("No timed captions generated")
+        return None
+    logging.info(f"Timed captions generated: {len(timed_captions)} captions")
 
-        with ThreadPoolExecutor() as executor:
-            search_terms_future = executor.submit(getVideoSearchQueriesTimed, script, timed_captions)
-            search_terms = search_terms_future.result()
+    background_video_urls, previews = await find_footage(script, timed_captions, render_backend, limits, timings, draft, pexels_client,
+                                                         audio_file)
+    if not background_video_urls:
+        return None
 
-        logging.info(f"Search terms generated: {len(search_terms) if search_terms else 0} terms")
+    video = await render_video(audio_file, timed_captions, background_video_urls, output_file, render_backend,
+                               limits, timings, draft, previews)
+    if draft and video:
+        logging.info(f"Draft manifest written: {save_draft_manifest(video, audio_file, timed_captions, background_video_urls)}")
+    logging.info(f"Artifact store: {timings.get('artifacts', {})}")
+    return video
 
-        if search_terms:
-            background_video_urls = await asyncio.to_thread(generate_video_url, search_terms, VIDEO_SERVER)
-            logging.info(f"Background video URLs generated: {len(background_video_urls) if background_video_urls else 0} URLs")
-            background_video_urls = merge_empty_intervals(background_video_urls)
+async def find_footage(script, timed_captions, render_backend="moviepy", limits=None, timings=None, draft=False, pexels_client=None,
+                       audio_file=None):
+    # Returns ([[t1, t2], url] entries with gaps merged, previews), or (None, {})
+    # when no search terms or footage were found. Jobs running side by side
+    # pass one pexels_client so they share its rate limit and connection pool.
+    # With the concat backend, clips are normalized as they download, cut at
+    # the end of audio_file as the render will cut them.
+    search_terms_key = artifact_store.artifact_key("search_terms", script, timed_captions,
+                                                    video_search_query_generator.model, video_search_query_generator.prompt,
+                                                    video_search_query_generator.WINDOW_SECONDS, video_search_query_generator.WINDOW_OVERLAP)
+    search_terms = artifact_store.load("search_terms", search_terms_key, metrics=timings)
+    streamed = search_terms is None
+    background_video_urls = None
+    previews = {}
+    if not streamed:
+        video_urls_key = artifact_store.artifact_key("video_urls", search_terms)
+        background_video_urls = artifact_store.load("video_urls", video_urls_key, metrics=timings)
+        previews = artifact_store.load("previews", video_urls_key, metrics=timings) or {}
 
-            if background_video_urls:
-                video = await asyncio.to_thread(get_output_media, SAMPLE_FILE_NAME, timed_captions, background_video_urls, VIDEO_SERVER)
-                logging.info(f"Output video generated: {video}")
+    if background_video_urls is None:
+        # Segments are searched and their footage downloaded as they flow
+        # through the footage pipeline, so the render mostly hits the cache.
+        # Fresh keyword segments enter it as the LLM response streams in.
+        # aiohttp and requests load here rather than at startup, while TTS
+        # is the first thing a run waits on
+        from utility.video.footage_pipeline import stream_footage
+        from utility.render.render_engine import probe_duration
+        normalize = render_backend == "concat" and not draft
+        async with stage("video_search", limits, timings):
+            timeline_end = await asyncio.to_thread(probe_duration, audio_file) if normalize and audio_file else None
+            if streamed:
+                search_terms = []
+                segments = stream_search_terms(script, timed_captions, search_terms, limits, timings)
             else:
-                logging.warning("No video generated due to lack of background videos")
-        else:
-            logging.warning("No background video search terms generated")
+                segments = search_terms
+            used_vids = VideoRegistry()
+            background_video_urls = await stream_footage(segments, metrics=timings, client=pexels_client, used_vids=used_vids, draft=draft,
+                                                         normalize=normalize, timeline_end=timeline_end)
+            previews = used_vids.previews
+        if streamed and search_terms:
+            artifact_store.save("search_terms", search_terms_key, search_terms)
+        if search_terms and background_video_urls:
+            video_urls_key = artifact_store.artifact_key("video_urls", search_terms)
+            artifact_store.save("video_urls", video_urls_key, background_video_urls)
+            artifact_store.save("previews", video_urls_key, previews)
+    logging.info(f"Search terms generated: {len(search_terms) if search_terms else 0} terms")
+
+    if not search_terms:
+        logging.warning("No background video search terms generated")
+        return None, {}
+    logging.info(f"Background video URLs generated: {len(background_video_urls) if background_video_urls else 0} URLs")
+    logging.info(f"Pexels search cache: {search_cache.get_stats()}")
+    background_video_urls = merge_empty_intervals(background_video_urls)
 
+    if not background_video_urls:
+        logging.warning("No video generated due to lack of background videos")
+        return None, {}
+    return background_video_urls, previews
+
+async def render_video(audio_file, timed_captions, background_video_urls, output_file=OUTPUT_FILE_NAME, render_backend="moviepy",
+                       limits=None, timings=None, draft=False, previews=None):
+    timings = {} if timings is None else timings
+    render = load_render_backend(DRAFT_RENDER_BACKEND if draft else RENDER_BACKENDS[render_backend])
+    render_video_urls = background_video_urls
+    if draft:
+        # Same clips and timings, from their low-resolution renditions
+        render_video_urls = [[interval, (previews or {}).get(url, url) if url else url] for interval, url in background_video_urls]
+    sink = as_sink(output_file)
+    async with stage("render", limits, timings):
+        video = await asyncio.to_thread(render, audio_file, timed_captions, render_video_urls, VIDEO_SERVER, output_file=sink)
+    timings["output"] = sink.metrics
+    logging.info(f"Output video generated: {video}")
+    return video
+
+async def main(script_file, video_type, render_backend="moviepy", caption_source="tts", report_file=None, trace_file=None,
+               draft=False, from_draft=None, output=None):
+    try:
+        timings = {}
+        # "-" streams the video to stdout as fragmented MP4; logs stay on stderr
+        if output == "-":
+            output = StreamSink(sys.stdout.buffer, "stdout")
+        if from_draft:
+            with instrumentation.recording(os.path.basename(from_draft), report_file, trace_file, metrics=timings):
+                return await render_from_draft(from_draft, output or OUTPUT_FILE_NAME, render_backend, timings=timings)
+        script = read_script_from_file(script_file)
+        logging.info(f"Script read from file: {script[:50]}...")
+        output_file = output or (DRAFT_FILE_NAME if draft else OUTPUT_FILE_NAME)
+        with instrumentation.recording(os.path.basename(script_file), report_file, trace_file, metrics=timings):
+            return await generate_video(script, AUDIO_FILE_NAME, output_file, render_backend, caption_source, timings=timings, draft=draft)
     except Exception as e:
         logging.error(f"An error occurred during video generation: {str(e)}")
         raise
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate a video from a script file.")
-    parser.add_argument("script_file", type=str, help="Path to the script file")
+    parser.add_argument("script_file", type=str, nargs="?", help="Path to the script file")
     parser.add_argument("--video_type", type=str, choices=['short', 'long'], default='short', help="Type of video to generate")
+    parser.add_argument("--render_backend", type=str, choices=list(RENDER_BACKENDS), default='moviepy', help="Engine used for the final render")
+    parser.add_argument("--caption_source", type=str, choices=['tts', 'whisper'], default='tts', help="Take caption timings from TTS word boundaries or from a Whisper transcription")
+    parser.add_argument("--report", type=str, help="Write a JSON run report with per-stage timing, CPU, memory and throughput")
+    parser.add_argument("--trace", type=str, help="Write a Chrome trace (chrome://tracing, Perfetto) of the run")
+    parser.add_argument("--draft", action="store_true", help=f"Render a low-resolution preview to {DRAFT_FILE_NAME} and save its footage selection for --from_draft")
+    parser.add_argument("--from_draft", type=str, help="Render the final video from an approved draft's manifest, reusing its footage and timings")
+    parser.add_argument("--output", type=str, help=f"Output video path (default {OUTPUT_FILE_NAME}); '-' streams it to stdout for piping to a player or upload")
 
     args = parser.parse_args()
+    if not args.script_file and not args.from_draft:
+        parser.error("script_file is required unless --from_draft is given")
+    if args.draft and args.output == "-":
+        parser.error("--draft writes a manifest next to the draft video, so it needs a file --output")
 
     try:
-        asyncio.run(main(args.script_file, args.video_type))
+        asyncio.run(main(args.script_file, args.video_type, args.render_backend, args.caption_source, args.report, args.trace,
+                         args.draft, args.from_draft, args.output))
     except Exception as e:
-        logging.error(f"Video generation failed: {str(e)}")
\ No newline at end of file
+        logging.error(f"Video generation failed: {str(e)}")
@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import time
+import asyncio
+import argparse
+import logging
+from utility import instrumentation
+from app import RENDER_BACKENDS, STAGES, AUDIO_FILE_NAME, OUTPUT_FILE_NAME, read_script_from_file, generate_video
+from utility.captions.transcription_service import TranscriptionService, WHISPER_WORKERS
+
+DEFAULT_LIMITS = {
+    "audio": 4,
+    "captions": 1,
+    "search_terms": 4,
+    "video_search": 4,
+    "render": 1,
+}
+
+def load_jobs(source):
+    # A directory of *.txt scripts, a JSON manifest ([{"script_file": ..., "name": ...}]
+    # or a list of paths) or a text manifest with one script path per line
+    if os.path.isdir(source):
+        paths = sorted(os.path.join(source, name) for name in os.listdir(source) if name.endswith(".txt"))
+        entries = [{"script_file": path} for path in paths]
+    else:
+        base = os.path.dirname(os.path.abspath(source))
+        with open(source, 'r') as f:
+            if source.endswith(".json"):
+                entries = json.load(f)
+            else:
+                entries = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        entries = [entry if isinstance(entry, dict) else {"script_file": entry} for entry in entries]
+        for entry in entries:
+            if not os.path.isabs(entry["script_file"]):
+                entry["script_file"] = os.path.join(base, entry["script_file"])
+
+    jobs = []
+    seen = set()
+    for entry in entries:
+        name = entry.get("name") or os.path.splitext(os.path.basename(entry["script_file"]))[0]
+        name = re.sub(r'[^\w\-.]', '_', name)
+        unique = name
+        suffix = 1
+        while unique in seen:
+            suffix += 1
+            unique = f"{name}_{suffix}"
+        seen.add(unique)
+        jobs.append({"name": unique, "script_file": entry["script_file"]})
+    return jobs
+
+async def run_job(job, output_dir, render_backend, caption_source, limits, transcriber=None, instrument=False, pexels_client=None):
+    work_dir = os.path.join(output_dir, job["name"])
+    os.makedirs(work_dir, exist_ok=True)
+    timings = {}
+    result = {"name": job["name"], "script_file": job["script_file"], "work_dir": work_dir}
+    start = time.perf_counter()
+    try:
+        script = read_script_from_file(job["script_file"])
+        report_file = os.path.join(work_dir, "run_report.json") if instrument else None
+        trace_file = os.path.join(work_dir, "trace.json") if instrument else None
+        with instrumentation.recording(job["name"], report_file, trace_file, metrics=timings):
+            video = await generate_video(
+                script,
+                audio_file=os.path.join(work_dir, AUDIO_FILE_NAME),
+                output_file=os.path.join(work_dir, OUTPUT_FILE_NAME),
+                render_backend=render_backend,
+                caption_source=caption_source,
+                limits=limits,
+                timings=timings,
+                transcriber=transcriber,
+                pexels_client=pexels_client,
+            )
+        result["status"] = "ok" if video else "no_output"
+        result["output"] = video
+    except Exception as e:
+        logging.error(f"Job {job['name']} failed: {str(e)}")
+        result["status"] = "error"
+        result["error"] = str(e)
+    result["timings"] = timings
+    result["wall_s"] = round(time.perf_counter() - start, 3)
+    logging.info(f"Job {job['name']} finished: {result['status']} in {result['wall_s']}s")
+    return result
+
+async def run_batch(jobs, output_dir, render_backend="moviepy", caption_source="tts", stage_limits=None, max_jobs=4,
+                    whisper_workers=WHISPER_WORKERS, instrument=False):
+    os.makedirs(output_dir, exist_ok=True)
+    limits = {name: asyncio.Semaphore(value) for name, value in {**DEFAULT_LIMITS, **(stage_limits or {})}.items()}
+    # The LLM client is module-level and shared by every job in this process.
+    # One Pexels client serves every job, so they share its rate limit,
+    # request coalescing and connection pool. Whisper runs in one service;
+    # with TTS captions it's only the fallback, so it starts on first use.
+    from utility.video.pexels_client import PexelsClient
+    pexels_client = PexelsClient()
+    transcriber = TranscriptionService(workers=whisper_workers)
+    if caption_source == "whisper":
+        await transcriber.start()
+
+    job_slots = asyncio.Semaphore(max_jobs)
+
+    async def bounded(job):
+        async with job_slots:
+            return await run_job(job, output_dir, render_backend, caption_source, limits, transcriber, instrument, pexels_client)
+
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(bounded(job) for job in jobs))
+    finally:
+        await transcriber.stop()
+        await pexels_client.close()
+    summary = {
+        "jobs": results,
+        "succeeded": sum(1 for r in results if r["status"] == "ok"),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "wall_s": round(time.perf_counter() - start, 3),
+        "transcription": transcriber.get_stats(),
+    }
+    with open(os.path.join(output_dir, "summary.json"), 'w') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate videos for many script files.")
+    parser.add_argument("source", type=str, help="Directory of .txt scripts, or a .json/.txt manifest")
+    parser.add_argument("--output_dir", type=str, default="batch_output", help="Directory for per-job working directories and summary.json")
+    parser.add_argument("--video_type", type=str, choices=['short', 'long'], default='short', help="Type of video to generate")
+    parser.add_argument("--render_backend", type=str, choices=list(RENDER_BACKENDS), default='moviepy', help="Engine used for the final render")
+    parser.add_argument("--caption_source", type=str, choices=['tts', 'whisper'], default='tts', help="Take caption timings from TTS word boundaries or from a Whisper transcription")
+    parser.add_argument("--max_jobs", type=int, default=4, help="Jobs in flight at once")
+    parser.add_argument("--instrument", action="store_true", help="Write run_report.json and trace.json into each job's directory")
+    parser.add_argument("--whisper_workers", type=int, default=WHISPER_WORKERS, help="Concurrent transcriptions, each with its own loaded Whisper model")
+    for name in STAGES:
+        parser.add_argument(f"--{name}_concurrency", type=int, default=DEFAULT_LIMITS[name], help=f"Concurrent jobs allowed in the {name} stage")
+
+    args = parser.parse_args()
+    stage_limits = {name: getattr(args, f"{name}_concurrency") for name in STAGES}
+
+    jobs = load_jobs(args.source)
+    logging.info(f"Loaded {len(jobs)} jobs from {args.source}")
+    summary = asyncio.run(run_batch(jobs, args.output_dir, args.render_backend, args.caption_source, stage_limits, args.max_jobs, args.whisper_workers, args.instrument))
+    logging.info(f"Batch finished: {summary['succeeded']} succeeded, {summary['failed']} failed in {summary['wall_s']}s")
@@ -0,0 +1,67 @@
+import json
+import time
+import argparse
+import tracemalloc
+from benchmarks.fixtures import make_timeline
+
+# Per-caption render time and memory of the legacy full-frame ImageMagick
+# TextClip versus the cached, cropped in-process caption rasters.
+#
+#   python -m benchmarks.caption_benchmark --duration 600
+
+def render_textclip(captions):
+    from moviepy.editor import TextClip
+    clips = []
+    for (t1, t2), text in captions:
+        clip = TextClip(txt=text, fontsize=50, color="white", stroke_width=2, stroke_color="black", method='caption', size=(1920, 1080))
+        clips.append(clip.set_start(t1).set_end(t2).set_position(('center', 'bottom')))
+    return clips
+
+def render_raster(captions):
+    from utility.render.caption_renderer import make_caption_clip, clear_caption_cache
+    clear_caption_cache()
+    return [make_caption_clip(text, t1, t2) for (t1, t2), text in captions]
+
+def clip_bytes(clips):
+    total = 0
+    for clip in clips:
+        total += clip.get_frame(0).nbytes
+        if clip.mask is not None:
+            total += clip.mask.get_frame(0).nbytes
+    return total
+
+def measure(name, render, captions):
+    tracemalloc.start()
+    start = time.perf_counter()
+    clips = render(captions)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = max(len(captions), 1)
+    return {
+        "renderer": name,
+        "captions": len(captions),
+        "ms_per_caption": round(elapsed * 1000 / count, 3),
+        "peak_alloc_mb": round(peak / 1024 / 1024, 1),
+        "kb_per_caption_frame": round(clip_bytes(clips) / 1024 / count, 1),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark caption rendering.")
+    parser.add_argument("--duration", type=float, default=120, help="Timeline length in seconds")
+    parser.add_argument("--distinct", type=int, default=0, help="Limit to N distinct caption strings (0 = all distinct)")
+    parser.add_argument("--skip-textclip", action="store_true", help="Skip the ImageMagick baseline")
+    args = parser.parse_args()
+
+    _, captions = make_timeline(args.duration)
+    if args.distinct:
+        captions = [((t1, t2), f"caption number {i % args.distinct}") for i, ((t1, t2), _) in enumerate(captions)]
+
+    renderers = [("raster", render_raster)]
+    if not args.skip_textclip:
+        renderers.insert(0, ("textclip", render_textclip))
+    for name, render in renderers:
+        print(json.dumps(measure(name, render, captions)))
+
+if __name__ == "__main__":
+    main()
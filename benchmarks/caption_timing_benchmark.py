@@ -0,0 +1,79 @@
+import json
+import time
+import random
+import argparse
+from utility.captions.timed_captions_generator import getCaptionsWithTime, cleanWord, splitWordsBySize
+
+# Scaling of getCaptionsWithTime on synthetic whisper outputs, against the
+# previous linear dict-scan lookup. Also checks both produce the same pairs.
+#
+#   python -m benchmarks.caption_timing_benchmark --sizes 1000 10000 100000
+
+WORDS = ["desert", "alien", "the", "of", "classified", "aircraft", "secrets", "a", "hangar", "lights", "sky,", "world's"]
+
+def make_whisper_output(word_count, seed=0):
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    words = []
+    for i in range(word_count):
+        text = rng.choice(WORDS)
+        start = t
+        t += rng.uniform(0.15, 0.6)
+        words.append({"text": text, "start": round(start, 2), "end": round(t, 2)})
+        if len(words) == 20 or i == word_count - 1:
+            segments.append({"words": words})
+            words = []
+    text = " ".join(word["text"] for segment in segments for word in segment["words"])
+    return {"text": text, "segments": segments}
+
+def legacy_captions_with_time(whisper_analysis, maxCaptionSize=15):
+    locationToTimestamp = {}
+    index = 0
+    for segment in whisper_analysis['segments']:
+        for word in segment['words']:
+            newIndex = index + len(word['text']) + 1
+            locationToTimestamp[(index, newIndex)] = word['end']
+            index = newIndex
+
+    def interpolate(word_position):
+        for key, value in locationToTimestamp.items():
+            if key[0] <= word_position <= key[1]:
+                return value
+        return None
+
+    position = 0
+    start_time = 0
+    pairs = []
+    words = [cleanWord(word) for word in splitWordsBySize(whisper_analysis['text'].split(), maxCaptionSize)]
+    for word in words:
+        position += len(word) + 1
+        end_time = interpolate(position)
+        if end_time and word:
+            pairs.append(((start_time, end_time), word))
+            start_time = end_time
+    return pairs
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark caption timing lookup.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 3000, 10000, 30000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=10000, help="Largest size to run the quadratic baseline on")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        analysis = make_whisper_output(size)
+        pairs, elapsed = timed(getCaptionsWithTime, analysis)
+        row = {"words": size, "captions": len(pairs), "indexed_ms": round(elapsed * 1000, 2)}
+        if size <= args.legacy_max:
+            legacy_pairs, legacy_elapsed = timed(legacy_captions_with_time, analysis)
+            row["legacy_ms"] = round(legacy_elapsed * 1000, 2)
+            row["identical"] = legacy_pairs == pairs
+        print(json.dumps(row))
+
+if __name__ == "__main__":
+    main()
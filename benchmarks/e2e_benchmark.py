@@ -0,0 +1,162 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# Runs app.main end to end on short and long scripts with every external
+# service replaced by a local fake: the fake TTS backend, the canned LLM
+# client and a stub Pexels API whose links point at a local server of
+# sample clips. Each scenario runs in a fresh interpreter with cold caches
+# and records per-stage timings and peak memory from the run report.
+#
+#   python -m benchmarks.e2e_benchmark --output results.json
+#   python -m benchmarks.e2e_benchmark --compare results.json
+#   python -m benchmarks.e2e_benchmark --draft     # low-resolution preview renders
+
+SCENARIOS = {"short": 120, "long": 600}
+SENTENCES = [
+    "Deep in the Nevada desert lies a military base that officially did not exist for decades.",
+    "Pilots flying over the area reported strange lights moving faster than any known aircraft.",
+    "The government later admitted the site was used to test experimental spy planes.",
+    "Still, many people believe the hangars hide far stranger secrets.",
+    "Every year thousands of tourists drive the lonely highway hoping to see something unusual.",
+]
+
+def make_script(word_count):
+    words = []
+    i = 0
+    while len(words) < word_count:
+        words += SENTENCES[i % len(SENTENCES)].split()
+        i += 1
+    return " ".join(words)
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        return result.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_scenario(name, script_file, run_dir, render_backend, draft=False):
+    # Runs inside the child interpreter, with the fake backends selected by env
+    import asyncio
+    import app
+    os.chdir(run_dir)
+    report_file = os.path.join(run_dir, "run_report.json")
+    start = time.perf_counter()
+    video = asyncio.run(app.main(script_file, name, render_backend, "tts", report_file=report_file, draft=draft))
+    wall = time.perf_counter() - start
+    with open(report_file) as f:
+        report = json.load(f)
+    stages = {stage: report["metrics"].get(stage) for stage in app.STAGES}
+    print(json.dumps({
+        "scenario": name,
+        "draft": draft,
+        "ok": bool(video),
+        "wall_s": round(wall, 3),
+        "stages": stages,
+        "peak_rss_mb": report["peak_rss_mb"],
+        "cpu_s": report["cpu_s"],
+        "children_cpu_s": report["children_cpu_s"],
+        "bytes_downloaded": report["metrics"].get("bytes_downloaded", 0),
+        "frames_encoded": report["metrics"].get("output", {}).get("frames_encoded", 0),
+        "spans": {span: totals["count"] for span, totals in report["spans_by_name"].items()},
+    }))
+
+def compare(baseline, results):
+    old = {r["scenario"]: r for r in baseline["results"]}
+    for result in results["results"]:
+        before = old.get(result["scenario"])
+        if before is None:
+            continue
+        rows = [("wall_s", before["wall_s"], result["wall_s"]), ("peak_rss_mb", before["peak_rss_mb"], result["peak_rss_mb"])]
+        rows += [(stage, before["stages"].get(stage), value) for stage, value in result["stages"].items()]
+        print(f"{result['scenario']}: {baseline.get('commit')} -> {results.get('commit')}")
+        for label, a, b in rows:
+            if a and b is not None:
+                print(f"  {label:14} {a:10.3f} {b:10.3f} {100 * (b - a) / a:+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark with offline fakes.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--render_backend", default="ffmpeg")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Print changes against an earlier --output file")
+    parser.add_argument("--draft", action="store_true", help="Render low-resolution drafts instead of final videos")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    parser.add_argument("--script-file", help=argparse.SUPPRESS)
+    parser.add_argument("--run-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        run_scenario(args.run_scenario, args.script_file, args.run_dir, args.render_backend, args.draft)
+        return
+
+    from benchmarks.fixtures import StubPexelsServer, SampleClipHandler, serve_directory, make_sample_clip
+    workdir = tempfile.mkdtemp(prefix="e2e_bench_")
+    clip_dir = os.path.join(workdir, "clips")
+    os.makedirs(clip_dir)
+    for i in range(SampleClipHandler.clip_count):
+        make_sample_clip(os.path.join(clip_dir, f"clip_{i}.mp4"), duration=15)
+        if args.draft:
+            make_sample_clip(os.path.join(clip_dir, f"clip_{i}_sd.mp4"), duration=15, size=(640, 360))
+    file_server, clip_url = serve_directory(clip_dir, SampleClipHandler)
+    pexels = StubPexelsServer(latency=0.05, link_base=clip_url).start()
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "render_backend": args.render_backend,
+        "draft": args.draft,
+        "results": [],
+    }
+    try:
+        for name in args.scenarios:
+            run_dir = os.path.join(workdir, name)
+            os.makedirs(run_dir)
+            script_file = os.path.join(run_dir, "script.txt")
+            with open(script_file, "w") as f:
+                f.write(make_script(SCENARIOS[name]))
+            env = dict(
+                os.environ,
+                PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')])),
+                TTS_BACKEND="fake",
+                LLM_BACKEND="fake",
+                PEXELS_API_URL=pexels.url,
+                PEXELS_KEY="benchmark",
+                # Cold caches so every stage does its work
+                ARTIFACT_CACHE="0",
+                FOOTAGE_CACHE_DIR=os.path.join(run_dir, "footage"),
+                PEXELS_CACHE_DB=os.path.join(run_dir, "pexels.sqlite3"),
+            )
+            output = subprocess.run([sys.executable, "-m", "benchmarks.e2e_benchmark", "--run-scenario", name,
+                                     "--script-file", script_file, "--run-dir", run_dir,
+                                     "--render_backend", args.render_backend] + (["--draft"] if args.draft else []),
+                                    check=True, cwd=repo_root, env=env, stdout=subprocess.PIPE, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(json.dumps(result))
+            results["results"].append(result)
+    finally:
+        pexels.stop()
+        file_server.shutdown()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == "__main__":
+    main()
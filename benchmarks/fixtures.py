@@ -0,0 +1,211 @@
+import os
+import time
+import zlib
+import asyncio
+import threading
+import subprocess
+import functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from aiohttp import web
+from utility.render.render_engine import get_ffmpeg_path
+
+def make_sample_clip(filename, duration=10, size=(1920, 1080), fps=30, faststart=False):
+    width, height = size
+    subprocess.run([
+        get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac",
+        *(["-movflags", "+faststart"] if faststart else []),
+        filename,
+    ], check=True)
+    return filename
+
+def make_sample_audio(filename, duration):
+    subprocess.run([
+        get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+        filename,
+    ], check=True)
+    return filename
+
+def make_timeline(duration, segment_length=3, caption_length=1.5):
+    segments = []
+    t = 0
+    while t < duration:
+        segments.append((t, min(t + segment_length, duration)))
+        t += segment_length
+    captions = []
+    t = 0
+    i = 0
+    while t < duration:
+        end = min(t + caption_length, duration)
+        captions.append(((t, end), f"caption number {i}"))
+        t = end
+        i += 1
+    return segments, captions
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+class RangeRequestHandler(QuietHandler):
+    # SimpleHTTPRequestHandler plus single "bytes=a-b" Range support
+    def send_head(self):
+        range_header = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if not range_header or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        try:
+            start, end = range_header.strip().split("=", 1)[1].split("-", 1)
+            start = int(start) if start else size - int(end)
+            end = min(int(end), size - 1) if end and start >= 0 else size - 1
+        except ValueError:
+            self.send_error(400, "Bad Range header")
+            return None
+        if start >= size or start > end:
+            self.send_error(416, "Requested Range Not Satisfiable")
+            return None
+        f = open(path, "rb")
+        f.seek(start)
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        self.range_remaining = end - start + 1
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = getattr(self, "range_remaining", None)
+        if remaining is None:
+            return super().copyfile(source, outputfile)
+        while remaining > 0:
+            chunk = source.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            remaining -= len(chunk)
+
+class SampleClipHandler(RangeRequestHandler):
+    # Serves one of the directory's clip_<n>.mp4 files for any requested
+    # .mp4 name, so stub Pexels links resolve to real footage; .sd.mp4
+    # links get clip_<n>_sd.mp4 when the directory has low-resolution clips
+    clip_count = 4
+
+    def translate_path(self, path):
+        name = path.split("?", 1)[0].rsplit("/", 1)[-1]
+        if name.endswith(".mp4") and not name.startswith("clip_"):
+            clip = f"clip_{zlib.crc32(name.split('.', 1)[0].encode()) % self.clip_count}"
+            if name.endswith(".sd.mp4") and os.path.exists(os.path.join(self.directory, clip + "_sd.mp4")):
+                clip += "_sd"
+            name = clip + ".mp4"
+        return super().translate_path("/" + name)
+
+class QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop connections on purpose (e.g. a range probe answered with 200)
+        pass
+
+def serve_directory(directory, handler_class=QuietHandler):
+    # Serves files from directory on an ephemeral localhost port; returns (server, base_url)
+    handler = functools.partial(handler_class, directory=directory)
+    server = QuietServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def prepare_render_inputs(workdir, duration, clip_count=4):
+    os.makedirs(workdir, exist_ok=True)
+    clips = [make_sample_clip(os.path.join(workdir, f"clip_{i}.mp4")) for i in range(clip_count)]
+    audio = make_sample_audio(os.path.join(workdir, "audio.wav"), duration)
+    segments, captions = make_timeline(duration)
+    return [os.path.basename(c) for c in clips], audio, segments, captions
+
+def make_search_response(query, page=1, per_page=15, link_base="https://videos.example.com"):
+    # Canned Pexels /videos/search payload; every third video is 16:9 1080p
+    videos = []
+    for i in range(per_page):
+        video_id = zlib.crc32(f"{query}:{page}:{i}".encode()) % 10_000_000
+        hd = i % 3 == 0
+        width, height = (1920, 1080) if hd else (1280, 960)
+        videos.append({
+            "id": video_id,
+            "width": width,
+            "height": height,
+            "duration": 5 + i,
+            "video_files": [
+                {"id": video_id * 10, "quality": "hd", "width": width, "height": height,
+                 "link": f"{link_base}/{video_id}.hd.mp4"},
+                {"id": video_id * 10 + 1, "quality": "sd", "width": 640, "height": 360,
+                 "link": f"{link_base}/{video_id}.sd.mp4"},
+            ],
+        })
+    return {"page": page, "per_page": per_page, "videos": videos, "total_results": per_page * 3}
+
+class StubPexelsServer:
+    # aiohttp stub of the Pexels search API running on its own thread and
+    # event loop so both the requests and aiohttp clients can hit it.
+    # errors is a list of HTTP statuses answered to the first requests in
+    # turn; reset_seconds puts the rate limit reset that far in the future.
+    def __init__(self, latency=0.05, rate_limit=None, link_base="https://videos.example.com", errors=(),
+                 reset_seconds=0):
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.link_base = link_base
+        self.errors = list(errors)
+        self.reset_seconds = reset_seconds
+        self.requests = 0
+        self.request_times = []
+        self.url = None
+        self._loop = None
+        self._runner = None
+        self._thread = None
+
+    async def handle_search(self, request):
+        self.requests += 1
+        self.request_times.append(time.monotonic())
+        await asyncio.sleep(self.latency)
+        query = request.query.get("query", "")
+        page = int(request.query.get("page", 1))
+        per_page = int(request.query.get("per_page", 15))
+        headers = {}
+        if self.rate_limit is not None:
+            remaining = max(self.rate_limit - self.requests, 0)
+            reset = time.time() + self.reset_seconds if self.reset_seconds else 0
+            headers = {"X-Ratelimit-Limit": str(self.rate_limit), "X-Ratelimit-Remaining": str(remaining),
+                       "X-Ratelimit-Reset": str(reset)}
+        if self.errors:
+            return web.json_response({"error": "stub error"}, status=self.errors.pop(0), headers=headers)
+        return web.json_response(make_search_response(query, page, per_page, self.link_base), headers=headers)
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            app = web.Application()
+            app.router.add_get("/videos/search", self.handle_search)
+            self._runner = web.AppRunner(app)
+            self._loop.run_until_complete(self._runner.setup())
+            site = web.TCPSite(self._runner, "127.0.0.1", 0)
+            self._loop.run_until_complete(site.start())
+            port = site._server.sockets[0].getsockname()[1]
+            self.url = f"http://127.0.0.1:{port}"
+            ready.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._runner.cleanup(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
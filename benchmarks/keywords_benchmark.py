@@ -0,0 +1,87 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+# Keyword extraction for a long-form script with the fake LLM: one request
+# for the whole caption timeline against overlapping windows requested
+# concurrently, then the windowed run again to show the per-window cache.
+# Each run checks that the segments are strictly consecutive and cover the
+# captions. --malformed truncates that fraction of responses: failed
+# windows are retried, then split into smaller windows, and a run that still
+# can't cover the timeline reports ok: false.
+#
+#   python -m benchmarks.keywords_benchmark --words 1400 --malformed 0.2
+
+WORDS_PER_SECOND = 2.5
+WORDS_PER_CAPTION = 3
+
+def make_captions(script):
+    words = script.split()
+    captions = []
+    for i in range(0, len(words), WORDS_PER_CAPTION):
+        t1 = round(i / WORDS_PER_SECOND, 2)
+        t2 = round(min(i + WORDS_PER_CAPTION, len(words)) / WORDS_PER_SECOND, 2)
+        captions.append(((t1, t2), " ".join(words[i:i + WORDS_PER_CAPTION])))
+    return captions
+
+def check_segments(segments, captions):
+    consecutive = all(previous[0][1] == segment[0][0] for previous, segment in zip(segments, segments[1:]))
+    covered = segments[-1][0][1] - segments[0][0][0] if segments else 0
+    return {"consecutive": consecutive, "coverage": round(covered / (captions[-1][0][1] - captions[0][0][0]), 3)}
+
+def run(name, script, captions, window_seconds, concurrency, workdir):
+    from utility import instrumentation
+    from utility.video import video_search_query_generator
+
+    report_file = os.path.join(workdir, f"{name}.json")
+    start = time.perf_counter()
+    with instrumentation.recording(name, report_file):
+        segments = video_search_query_generator.getVideoSearchQueriesTimed(script, captions, window_seconds, concurrency)
+    wall = time.perf_counter() - start
+    with open(report_file) as f:
+        requests = [span["attrs"] for span in json.load(f)["spans"] if span["name"] == "llm_request"]
+    result = {"name": name, "wall_s": round(wall, 3), "ok": segments is not None, "segments": len(segments or []),
+              "requests": len(requests), "retries": sum(1 for attrs in requests if attrs.get("attempt", 1) > 1)}
+    if segments:
+        result.update(check_segments(segments, captions))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-request and windowed keyword extraction.")
+    parser.add_argument("--words", type=int, default=1400, help="Script length; 1400 words is about ten minutes")
+    parser.add_argument("--window", type=float, default=90, help="Window length in seconds")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--malformed", type=float, default=0, help="Fraction of truncated LLM responses")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="keywords_bench_")
+    os.environ.update(LLM_BACKEND="fake", FAKE_LLM_MALFORMED_RATE=str(args.malformed), FAKE_LLM_SEED="1",
+                      ARTIFACT_CACHE="1", ARTIFACT_CACHE_DIR=os.path.join(workdir, "artifacts"))
+    from benchmarks.e2e_benchmark import make_script
+
+    script = make_script(args.words)
+    captions = make_captions(script)
+    try:
+        results = [
+            run("single", script, captions, float("inf"), 1, workdir),
+            run("windowed", script, captions, args.window, args.concurrency, workdir),
+            run("windowed_cached", script, captions, args.window, args.concurrency, workdir),
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    summary = {"words": args.words, "captions": len(captions), "duration_s": captions[-1][0][1],
+               "malformed": args.malformed, "results": results}
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    if not all(result.get("consecutive") for result in results if result["ok"]):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
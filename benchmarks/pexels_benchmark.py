@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from benchmarks.fixtures import StubPexelsServer
+
+# Search throughput of the threaded requests path versus the aiohttp
+# PexelsClient against a local stub of the Pexels search API. Each client
+# runs in a fresh interpreter with an empty search cache, so neither run
+# measures responses cached by the other or by an earlier run.
+#
+#   python -m benchmarks.pexels_benchmark --segments 200 --latency 0.1
+
+KEYWORDS = ["desert landscape", "ufo sky", "military base", "night lights", "secret hangar", "aircraft test"]
+
+def make_segments(count):
+    return [[[i * 3, i * 3 + 3], [KEYWORDS[i % len(KEYWORDS)], KEYWORDS[(i + 1) % len(KEYWORDS)]]] for i in range(count)]
+
+def run_threaded(segments):
+    from utility.video.background_video_generator import generate_video_url
+    return generate_video_url(segments, "pexel")
+
+async def run_async(segments):
+    from utility.video.pexels_client import PexelsClient
+    async with PexelsClient(requests_per_second=1000, burst=1000) as client:
+        results = await asyncio.gather(*(client.search_video_for_segment(t1, t2, terms) for (t1, t2), terms in segments))
+        return results, dict(client.stats)
+
+def run_client(client, segment_count):
+    # Runs inside the child interpreter
+    segments = make_segments(segment_count)
+    start = time.perf_counter()
+    if client == "threaded":
+        results = run_threaded(segments)
+        stats = {}
+    else:
+        results, stats = asyncio.run(run_async(segments))
+    print(json.dumps({"client": client, "segments": len(segments), "wall_s": round(time.perf_counter() - start, 3),
+                      "found": sum(1 for _, url in results if url), **stats}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Pexels search clients against a stub server.")
+    parser.add_argument("--segments", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub server latency per request in seconds")
+    parser.add_argument("--client", choices=["threaded", "aiohttp"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client:
+        run_client(args.client, args.segments)
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="pexels_bench_")
+    server = StubPexelsServer(latency=args.latency).start()
+    try:
+        for client in ("threaded", "aiohttp"):
+            env = dict(
+                os.environ,
+                PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')])),
+                PEXELS_API_URL=server.url,
+                PEXELS_CACHE_DB=os.path.join(workdir, f"{client}.sqlite3"),
+            )
+            server.requests = 0
+            output = subprocess.run([sys.executable, "-m", "benchmarks.pexels_benchmark", "--client", client,
+                                     "--segments", str(args.segments)],
+                                    check=True, cwd=repo_root, env=env, stdout=subprocess.PIPE, text=True).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result["requests"] = server.requests
+            print(json.dumps(result))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
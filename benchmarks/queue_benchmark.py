@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import subprocess
+
+# Runs the job queue on one machine with several worker processes per
+# stage, against the same offline fakes as e2e_benchmark. With --kill, the
+# first worker to lease a render task is SIGKILLed mid-render and
+# replaced, so the job must recover through lease expiry and a retry.
+#
+#   python -m benchmarks.queue_benchmark --jobs 4 --workers audio+captions=1 footage=2 render=2 --kill
+
+LEASE_SECONDS = 6
+
+def parse_workers(specs):
+    # "footage=2" or "audio+captions=1" -> [(["audio", "captions"], 1), ...]
+    workers = []
+    for spec in specs:
+        stages, _, count = spec.partition("=")
+        workers.append((stages.split("+"), int(count or 1)))
+    return workers
+
+def start_worker(repo_root, env, db, stages, log_dir):
+    log = open(os.path.join(log_dir, f"worker_{'+'.join(stages)}_{time.monotonic_ns()}.log"), "w")
+    return subprocess.Popen([sys.executable, "worker.py", "--db", db, "work", "--stages", *stages, "--drain"],
+                            cwd=repo_root, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+def leased_render_pid(queue):
+    row = queue.connection().execute("SELECT lease_owner FROM tasks WHERE stage = 'render' AND status = 'leased' LIMIT 1").fetchone()
+    return int(row[0].split(":")[1]) if row else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the job queue with several local workers.")
+    parser.add_argument("--jobs", type=int, default=4)
+    parser.add_argument("--words", type=int, default=60, help="Script length per job")
+    parser.add_argument("--workers", nargs="+", default=["audio+captions=1", "footage=2", "render=2"],
+                        help="Worker processes as stage[+stage]=count")
+    parser.add_argument("--render_backend", default="ffmpeg")
+    parser.add_argument("--full", action="store_true", help="Render full-resolution videos instead of drafts")
+    parser.add_argument("--kill", action="store_true", help="SIGKILL a render worker mid-task and start a replacement")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory")
+    args = parser.parse_args()
+
+    from benchmarks.fixtures import StubPexelsServer, SampleClipHandler, serve_directory, make_sample_clip
+    from benchmarks.e2e_benchmark import make_script
+    from utility.job_queue import JobQueue
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="queue_bench_")
+    clip_dir = os.path.join(workdir, "clips")
+    script_dir = os.path.join(workdir, "scripts")
+    log_dir = os.path.join(workdir, "logs")
+    for directory in (clip_dir, script_dir, log_dir):
+        os.makedirs(directory)
+    for i in range(SampleClipHandler.clip_count):
+        make_sample_clip(os.path.join(clip_dir, f"clip_{i}.mp4"), duration=15)
+        make_sample_clip(os.path.join(clip_dir, f"clip_{i}_sd.mp4"), duration=15, size=(640, 360))
+    for i in range(args.jobs):
+        with open(os.path.join(script_dir, f"job_{i:03d}.txt"), "w") as f:
+            # Distinct scripts, so no job reuses another's artifacts
+            f.write(f"Story number {i}. " + make_script(args.words))
+    file_server, clip_url = serve_directory(clip_dir, SampleClipHandler)
+    pexels = StubPexelsServer(latency=0.05, link_base=clip_url).start()
+
+    db = os.path.join(workdir, "jobs.sqlite3")
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')])),
+        TTS_BACKEND="fake",
+        LLM_BACKEND="fake",
+        PEXELS_API_URL=pexels.url,
+        PEXELS_KEY="benchmark",
+        ARTIFACT_CACHE="0",
+        FOOTAGE_CACHE_DIR=os.path.join(workdir, "footage"),
+        PEXELS_CACHE_DB=os.path.join(workdir, "pexels.sqlite3"),
+        QUEUE_LEASE_SECONDS=str(LEASE_SECONDS),
+        QUEUE_RETRY_DELAY="1",
+        QUEUE_POLL_INTERVAL="0.2",
+    )
+    workers = parse_workers(args.workers)
+    queue = JobQueue(db)
+    killed = None
+    processes = []
+    try:
+        subprocess.run([sys.executable, "worker.py", "--db", db, "enqueue", script_dir, "--output_dir", os.path.join(workdir, "jobs"),
+                        "--render_backend", args.render_backend] + ([] if args.full else ["--draft"]),
+                       check=True, cwd=repo_root, env=env, stderr=subprocess.DEVNULL)
+        start = time.perf_counter()
+        processes += [(stages, start_worker(repo_root, env, db, stages, log_dir)) for stages, count in workers for _ in range(count)]
+        while any(process.poll() is None for _, process in processes):
+            if args.kill and killed is None:
+                pid = leased_render_pid(queue)
+                if pid:
+                    os.kill(pid, signal.SIGKILL)
+                    killed = pid
+                    print(f"Killed render worker {pid}; its lease expires within {LEASE_SECONDS}s")
+                    processes.append((["render"], start_worker(repo_root, env, db, ["render"], log_dir)))
+            time.sleep(0.2)
+        wall = time.perf_counter() - start
+    finally:
+        for _, process in processes:
+            if process.poll() is None:
+                process.kill()
+        pexels.stop()
+        file_server.shutdown()
+
+    jobs = queue.jobs()
+    result = {
+        "jobs": len(jobs),
+        "done": sum(1 for job in jobs if job["status"] == "done"),
+        "failed": sum(1 for job in jobs if job["status"] == "failed"),
+        "wall_s": round(wall, 2),
+        "workers": args.workers,
+        "killed_worker": killed,
+        "retried_tasks": [f"{job['name']}/{task['stage']}" for job in jobs for task in job["tasks"] if task["attempts"] > 1],
+        "stats": queue.get_stats(),
+    }
+    print(json.dumps(result, indent=2))
+    if args.keep:
+        print(f"Working directory: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if result["done"] != result["jobs"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
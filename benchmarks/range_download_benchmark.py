@@ -0,0 +1,49 @@
+import os
+import json
+import time
+import argparse
+import tempfile
+
+# Bytes fetched and saved by range downloads versus full downloads, for
+# faststart and moov-at-end sample MP4s served by a local Range-capable server.
+#
+#   python -m benchmarks.range_download_benchmark --clip-duration 30 --use 3
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark partial footage downloads.")
+    parser.add_argument("--clip-duration", type=float, default=30, help="Length of each sample clip in seconds")
+    parser.add_argument("--use", type=float, nargs="+", default=[2, 3, 4], help="Seconds of each clip the timeline needs")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="range_bench_")
+    from benchmarks.fixtures import make_sample_clip, serve_directory, RangeRequestHandler
+    from utility.render import footage_cache
+
+    clips = {
+        "faststart": make_sample_clip(os.path.join(workdir, "faststart.mp4"), args.clip_duration, faststart=True),
+        "moov_at_end": make_sample_clip(os.path.join(workdir, "moov_at_end.mp4"), args.clip_duration),
+    }
+    server, base_url = serve_directory(workdir, RangeRequestHandler)
+    try:
+        for layout, path in clips.items():
+            for seconds in args.use:
+                for mode in ("range", "full"):
+                    footage_cache.RANGE_DOWNLOADS = mode == "range"
+                    footage_cache.CACHE_DIRECTORY = os.path.join(workdir, f"cache_{layout}_{mode}_{seconds}")
+                    url = f"{base_url}/{os.path.basename(path)}"
+                    metrics = {}
+                    start = time.perf_counter()
+                    fetched = footage_cache.fetch(url, duration=seconds, metrics=metrics)
+                    print(json.dumps({
+                        "layout": layout, "mode": mode, "use_s": seconds,
+                        "file_bytes": os.path.getsize(path),
+                        "bytes_downloaded": metrics.get("bytes_downloaded", 0),
+                        "bytes_saved": metrics.get("bytes_saved", 0),
+                        "wall_s": round(time.perf_counter() - start, 3),
+                        "path": fetched,
+                    }))
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+# Compares wall time and peak RSS of the render backends
+# on synthetic footage served from a local HTTP server.
+#
+#   python -m benchmarks.render_benchmark --duration 60
+
+BACKENDS = ["moviepy", "ffmpeg", "segmented", "concat"]
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux; children covers ffmpeg subprocesses
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+def run_backend(backend, workdir, base_url):
+    os.environ['FOOTAGE_CACHE_DIR'] = os.path.join(workdir, f"cache_{backend}")
+    with open(os.path.join(workdir, "inputs.json")) as f:
+        inputs = json.load(f)
+    segments = inputs["segments"]
+    captions = [((t1, t2), text) for (t1, t2), text in inputs["captions"]]
+    clips = inputs["clips"]
+    background = [[[t1, t2], f"{base_url}/{clips[i % len(clips)]}"] for i, (t1, t2) in enumerate(segments)]
+    output = os.path.join(workdir, f"out_{backend}.mp4")
+
+    if backend == "ffmpeg":
+        from utility.render.ffmpeg_render_engine import get_output_media_ffmpeg as render_backend
+    elif backend == "concat":
+        from utility.render.concat_render_engine import get_output_media_concat as render_backend
+    elif backend == "segmented":
+        from utility.render.segment_render_engine import get_output_media_segmented as render_backend
+    else:
+        from utility.render.render_engine import get_output_media as render_backend
+    render = lambda: render_backend(inputs["audio"], captions, background, "pexel", output_file=output)
+
+    extra = {}
+    if backend == "concat":
+        # The app normalizes clips while footage is still being searched;
+        # time that separately so wall_s is what is left for the render
+        from utility.render.render_engine import fetch_video_file
+        from utility.render.footage_normalizer import frame_count, normalize_clip
+        start = time.perf_counter()
+        for (t1, t2), url in background:
+            normalize_clip(fetch_video_file(url, t2 - t1), frame_count(t1, t2))
+        extra["normalize_s"] = round(time.perf_counter() - start, 2)
+
+    start = time.perf_counter()
+    result = render()
+    wall = time.perf_counter() - start
+    print(json.dumps({"backend": backend, "wall_s": round(wall, 2), **extra, "peak_rss_mb": round(peak_rss_mb(), 1), "output": result}))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark render backends.")
+    parser.add_argument("--duration", type=float, default=30, help="Length of the synthetic video in seconds")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--run-backend", choices=BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--base-url", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_backend:
+        run_backend(args.run_backend, args.workdir, args.base_url)
+        return
+
+    from benchmarks.fixtures import prepare_render_inputs, serve_directory, RangeRequestHandler
+    workdir = tempfile.mkdtemp(prefix="render_bench_")
+    clips, audio, segments, captions = prepare_render_inputs(workdir, args.duration)
+    with open(os.path.join(workdir, "inputs.json"), "w") as f:
+        json.dump({"clips": clips, "audio": audio, "segments": segments, "captions": captions}, f)
+    server, base_url = serve_directory(workdir, RangeRequestHandler)
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')])))
+
+    try:
+        for backend in args.backends:
+            # Each backend runs in a fresh interpreter so peak RSS is not shared
+            subprocess.run([sys.executable, "-m", "benchmarks.render_benchmark",
+                            "--run-backend", backend, "--workdir", workdir, "--base-url", base_url],
+                           check=True, cwd=workdir, env=env)
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
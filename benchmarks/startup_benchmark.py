@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+# Startup cost of the CLI: time to import app, wall time of `app.py --help`
+# and time from interpreter start to the first pipeline stage (audio, with
+# the fake TTS backend). Each sample is a fresh interpreter. With --compare
+# it exits non-zero when a heavy dependency is imported at startup again or
+# a timing regresses past the tolerance, so it can guard CI.
+#
+#   python -m benchmarks.startup_benchmark --output startup.json
+#   python -m benchmarks.startup_benchmark --compare startup.json
+
+# Loaded on first use only; none of these may be imported by `import app`
+HEAVY_MODULES = ["moviepy", "numpy", "PIL", "IPython", "torch", "whisper_timestamped", "openai", "groq",
+                 "edge_tts", "aiohttp", "requests"]
+TIMINGS = ["import_s", "help_s", "first_stage_s"]
+
+def run_probe(script_file, workdir):
+    # Runs inside the child interpreter
+    start = time.perf_counter()
+    import app
+    imported = time.perf_counter()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    import asyncio
+    from utility import instrumentation
+    report_file = os.path.join(workdir, "report.json")
+    with instrumentation.recording("startup", report_file) as recorder:
+        script = app.read_script_from_file(script_file)
+        asyncio.run(app.process_audio_and_captions(script, os.path.join(workdir, "audio.mp3")))
+        origin = recorder.origin
+    with open(report_file) as f:
+        spans = json.load(f)["spans"]
+    audio = min(span["start_s"] for span in spans if span["name"] == "audio")
+    print(json.dumps({"import_s": round(imported - start, 4), "first_stage_s": round(origin - start + audio, 4),
+                      "heavy_modules": heavy}))
+
+def measure(repo_root, env, workdir, script_file):
+    probe = subprocess.run([sys.executable, "-m", "benchmarks.startup_benchmark", "--probe",
+                            "--script-file", script_file, "--workdir", workdir],
+                           check=True, cwd=repo_root, env=env, stdout=subprocess.PIPE, text=True).stdout
+    result = json.loads(probe.strip().splitlines()[-1])
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "app.py", "--help"], check=True, cwd=repo_root, env=env, stdout=subprocess.DEVNULL)
+    result["help_s"] = round(time.perf_counter() - start, 4)
+    return result
+
+def compare(baseline, results, tolerance):
+    failures = []
+    if results["heavy_modules"]:
+        failures.append(f"heavy modules imported at startup: {', '.join(results['heavy_modules'])}")
+    for name in TIMINGS:
+        before, after = baseline.get(name), results[name]
+        if not before:
+            continue
+        change = (after - before) / before
+        print(f"  {name:14} {before:8.3f} {after:8.3f} {100 * change:+7.1f}%")
+        if change > tolerance:
+            failures.append(f"{name} regressed {100 * change:.0f}% (tolerance {100 * tolerance:.0f}%)")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CLI startup and time to the first stage.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per measurement; the median is reported")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--compare", help="Fail on regressions against an earlier --output file")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed slowdown against --compare, as a fraction")
+    parser.add_argument("--probe", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--script-file", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.probe:
+        run_probe(args.script_file, args.workdir)
+        return
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    script_file = os.path.join(workdir, "script.txt")
+    with open(script_file, "w") as f:
+        f.write("Deep in the Nevada desert lies a military base that officially did not exist for decades.")
+    env = dict(
+        os.environ,
+        PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get('PYTHONPATH')])),
+        TTS_BACKEND="fake",
+        LLM_BACKEND="fake",
+        FAKE_TTS_LATENCY="0",
+        ARTIFACT_CACHE="0",
+    )
+    # No API keys: startup must not need them
+    for key in ("OPENAI_KEY", "GROQ_API_KEY", "PEXELS_KEY"):
+        env.pop(key, None)
+
+    samples = [measure(repo_root, env, workdir, script_file) for _ in range(args.runs)]
+    results = {name: round(statistics.median(sample[name] for sample in samples), 4) for name in TIMINGS}
+    results["heavy_modules"] = sorted({name for sample in samples for name in sample["heavy_modules"]})
+    results["runs"] = args.runs
+    print(json.dumps(results))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            failures = compare(json.load(f), results, args.tolerance)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if failures:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
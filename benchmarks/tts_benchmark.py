@@ -0,0 +1,61 @@
+import os
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+# TTS wall time against chunk concurrency, using the offline fake backend.
+# Checks the stitched file's length and that word boundaries stay ordered
+# and end inside the audio.
+#
+#   python -m benchmarks.tts_benchmark --words 1400 --concurrency 1 2 4 8
+
+SENTENCE = "The lights over the desert hangar were never explained by anyone who saw them."
+
+def make_script(word_count):
+    words_per_sentence = len(SENTENCE.split())
+    return " ".join([SENTENCE] * max(1, word_count // words_per_sentence))
+
+async def run(script, output_filename, concurrency):
+    from utility.audio import audio_generator
+    audio_generator.TTS_CONCURRENCY = concurrency
+    chunks = audio_generator.split_script(script)
+    boundaries = []
+    start = time.perf_counter()
+    if len(chunks) > 1:
+        await audio_generator.generate_audio_chunked(chunks, output_filename, boundaries, concurrency=concurrency, backend="fake")
+    else:
+        await audio_generator.generate_audio(script, output_filename, boundaries, backend="fake")
+    return time.perf_counter() - start, len(chunks), boundaries
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark chunked TTS synthesis with the fake backend.")
+    parser.add_argument("--words", type=int, default=1400)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    from utility.audio import mp3_frames
+    from utility.render.render_engine import probe_duration
+    script = make_script(args.words)
+    workdir = tempfile.mkdtemp(prefix="tts_bench_")
+    for concurrency in args.concurrency:
+        output = os.path.join(workdir, f"audio_{concurrency}.mp3")
+        wall, chunk_count, boundaries = asyncio.run(run(script, output, concurrency))
+        with open(output, "rb") as f:
+            duration = mp3_frames.duration(f.read())
+        starts = [b["start"] for b in boundaries]
+        print(json.dumps({
+            "concurrency": concurrency,
+            "chunks": chunk_count,
+            "wall_s": round(wall, 3),
+            "words": len(boundaries),
+            "audio_s": round(duration, 3),
+            "decoded_s": probe_duration(output),
+            "last_word_end_s": round(boundaries[-1]["end"], 3),
+            "ordered": starts == sorted(starts),
+            "within_audio": boundaries[-1]["end"] <= duration,
+        }))
+
+if __name__ == "__main__":
+    main()
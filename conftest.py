@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Caches, queues and backends are read from the environment at import, so
+# point them at a scratch directory before any test module imports them
+_workdir = tempfile.mkdtemp(prefix="tests_")
+os.environ.update(
+    PEXELS_CACHE_DB=os.path.join(_workdir, "pexels_search.sqlite3"),
+    ARTIFACT_CACHE_DIR=os.path.join(_workdir, "artifacts"),
+    FOOTAGE_CACHE_DIR=os.path.join(_workdir, "footage"),
+    QUEUE_DB=os.path.join(_workdir, "jobs.sqlite3"),
+    LLM_BACKEND="fake",
+    TTS_BACKEND="fake",
+)
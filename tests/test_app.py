@@ -0,0 +1,19 @@
+import asyncio
+import app
+
+SCRIPT = "The lighthouse keeper climbed the stairs every night for forty years."
+
+def process_audio(audio_file, caption_source):
+    timings = {}
+    _, boundaries = asyncio.run(app.process_audio(SCRIPT, audio_file, caption_source, timings=timings))
+    return boundaries, timings["artifacts"]["audio"]
+
+def test_tts_captions_resynthesize_audio_cached_without_boundaries(tmp_path):
+    audio_file = str(tmp_path / "audio.wav")
+    assert process_audio(audio_file, "whisper") == (None, {"hits": 0, "misses": 1})
+    # The cached audio has no word boundaries, so TTS captions can't reuse it
+    boundaries, stats = process_audio(audio_file, "tts")
+    assert boundaries
+    assert stats == {"hits": 1, "misses": 0}
+    assert process_audio(audio_file, "whisper") == (None, {"hits": 1, "misses": 0})
+    assert process_audio(audio_file, "tts") == (boundaries, {"hits": 1, "misses": 0})
@@ -0,0 +1,34 @@
+from utility.render import concat_render_engine, footage_cache
+from utility.render.concat_render_engine import frame_timeline, burn_captions
+from utility.render.footage_normalizer import VIDEO_FPS, segment_frames, normalized_path, encode_args
+
+def test_timeline_frames_match_the_pipeline_count():
+    entries = [((0, 3.2), "a"), ((3.2, 7.01), "b"), ((7.01, 12.5), "c")]
+    files = ["a.mp4", "b.mp4", "c.mp4"]
+    total = 10.9
+    timeline = frame_timeline(entries, files, total)
+    assert [frames for _, _, frames, _ in timeline] == [segment_frames(t1, t2, total) for (t1, t2), _ in entries]
+    assert sum(frames for _, _, frames, _ in timeline) == round(total * VIDEO_FPS)
+    assert timeline[-1][1] == total
+
+def test_gaps_and_tail_are_black():
+    timeline = frame_timeline([((1, 4), "a")], ["a.mp4"], 6)
+    assert [(t1, t2, source) for t1, t2, _, source in timeline] == [(0, 1, None), (1, 4, "a.mp4"), (4, 6, None)]
+
+def test_normalized_segments_are_keyed_by_clip_not_file():
+    url = "https://videos.example.com/123.hd.mp4"
+    full = footage_cache.cache_path(url)
+    partials = [footage_cache.cache_path(url, seconds) for seconds in (4, 9)]
+    assert len({normalized_path(path, 120) for path in [full, *partials]}) == 1
+    assert normalized_path(full, 120) != normalized_path(full, 121)
+    assert normalized_path(full, 120) != normalized_path(footage_cache.cache_path(url + "?v=2"), 120)
+
+def test_burned_segments_use_the_normalize_encoder_settings(monkeypatch, tmp_path):
+    commands = []
+    monkeypatch.setattr(concat_render_engine.subprocess, "run", lambda command, **kwargs: commands.append(command))
+    output = str(tmp_path / "segment.mp4")
+    assert burn_captions("segment_in.mp4", [((0, 1), "hello")], output) == output
+    command = commands[0]
+    args = encode_args()
+    assert command[command.index("-c:v"):command.index("-c:v") + len(args)] == args
+    assert command[-1] == output
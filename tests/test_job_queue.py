@@ -0,0 +1,179 @@
+import time
+import asyncio
+import threading
+import pytest
+import worker
+from utility.job_queue import JobQueue, JobFailed
+
+STAGES = ["audio", "captions", "footage", "render"]
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "jobs.sqlite3")
+
+def task_status(queue, job_id):
+    job = next(job for job in queue.jobs() if job["id"] == job_id)
+    return {task["stage"]: task["status"] for task in job["tasks"]}
+
+def test_workers_claim_each_task_once(db_path):
+    setup = JobQueue(db_path)
+    job_ids = [setup.enqueue(f"job{i}", {"i": i}, stages=["audio", "render"]) for i in range(20)]
+    claims = []
+    lock = threading.Lock()
+
+    def work(owner):
+        # Each thread is a worker with its own connection to the database
+        queue = JobQueue(db_path)
+        while queue.pending(["audio", "render"]):
+            task = queue.claim(["audio", "render"], owner)
+            if task is None:
+                time.sleep(0.005)
+                continue
+            with lock:
+                claims.append((task["job_id"], task["stage"]))
+            if task["stage"] == "render":
+                assert task["checkpoints"]["audio"] == {"audio_of": task["params"]["i"]}
+            assert queue.complete(task["job_id"], task["stage"], owner, {f"{task['stage']}_of": task["params"]["i"]})
+
+    threads = [threading.Thread(target=work, args=(f"worker{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(30)
+    assert sorted(claims) == sorted((job_id, stage) for job_id in job_ids for stage in ["audio", "render"])
+    assert setup.get_stats()["jobs"] == {"done": 20}
+
+def test_expired_lease_goes_to_another_worker(db_path):
+    queue = JobQueue(db_path, lease_seconds=0.2)
+    job_id = queue.enqueue("job", {})
+    first = queue.claim(["audio"], "a")
+    assert first["attempt"] == 1
+    assert queue.claim(["audio"], "b") is None
+    assert queue.heartbeat(job_id, "audio", "a")
+
+    time.sleep(0.3)
+    second = queue.claim(["audio"], "b")
+    assert (second["job_id"], second["stage"], second["attempt"]) == (job_id, "audio", 2)
+    # The first worker finds out at its next heartbeat and can't store a result
+    assert not queue.heartbeat(job_id, "audio", "a")
+    assert not queue.complete(job_id, "audio", "a", {"from": "a"})
+    assert not queue.fail(job_id, "audio", "a", "late error")
+    assert queue.complete(job_id, "audio", "b", {"from": "b"})
+    assert queue.claim(["captions"], "a")["checkpoints"] == {"audio": {"from": "b"}}
+
+def test_failed_tasks_retry_with_backoff_until_max_attempts(db_path):
+    queue = JobQueue(db_path, max_attempts=3, retry_delay=0.1)
+    job_id = queue.enqueue("job", {})
+    for attempt in range(1, 4):
+        task = queue.claim(["audio"], "a")
+        assert task["attempt"] == attempt
+        assert queue.fail(job_id, "audio", "a", f"error {attempt}")
+        # Backoff: not claimable until retry_delay * 2 ** (attempt - 1) has passed
+        assert queue.claim(["audio"], "a") is None
+        time.sleep(0.1 * 2 ** (attempt - 1) + 0.02)
+    assert queue.claim(["audio"], "a") is None
+    assert queue.jobs()[0]["status"] == "failed"
+    assert queue.jobs()[0]["error"] == "audio: error 3"
+    assert task_status(queue, job_id) == {"audio": "failed", "captions": "cancelled", "footage": "cancelled",
+                                          "render": "cancelled"}
+    assert queue.pending() == 0
+
+def test_expired_leases_count_towards_max_attempts(db_path):
+    queue = JobQueue(db_path, lease_seconds=0.05, max_attempts=2)
+    job_id = queue.enqueue("job", {})
+    for owner in ["a", "b"]:
+        assert queue.claim(["audio"], owner) is not None
+        time.sleep(0.1)
+    assert queue.claim(["audio"], "c") is None
+    assert task_status(queue, job_id)["audio"] == "failed"
+
+def test_fail_without_retry_and_requeue(db_path):
+    queue = JobQueue(db_path, retry_delay=0)
+    job_id = queue.enqueue("job", {})
+    queue.claim(["audio"], "a")
+    assert queue.complete(job_id, "audio", "a", {"audio_file": "audio.wav"})
+    task = queue.claim(["captions"], "a")
+    assert queue.fail(task["job_id"], "captions", "a", "no captions", retry=False)
+    assert queue.jobs("failed")[0]["id"] == job_id
+    assert queue.claim(STAGES, "a") is None
+
+    assert queue.requeue(job_id)
+    assert not queue.requeue(job_id)
+    task = queue.claim(STAGES, "b")
+    assert (task["stage"], task["attempt"]) == ("captions", 1)
+    assert task["checkpoints"] == {"audio": {"audio_file": "audio.wav"}}
+    assert task_status(queue, job_id) == {"audio": "done", "captions": "leased", "footage": "waiting",
+                                          "render": "waiting"}
+
+def test_release_hands_the_task_back_without_an_attempt(db_path):
+    queue = JobQueue(db_path)
+    job_id = queue.enqueue("job", {})
+    queue.claim(["audio"], "a")
+    assert queue.release(job_id, "audio", "a")
+    assert queue.claim(["audio"], "b")["attempt"] == 1
+
+def test_stage_is_cancelled_once_its_lease_is_lost(db_path, monkeypatch):
+    queue = JobQueue(db_path, lease_seconds=0.3)
+    job_id = queue.enqueue("job", {})
+    finished = []
+
+    async def slow_audio(params, checkpoints, timings, transcriber, attempt):
+        try:
+            await asyncio.sleep(5)
+            return {}
+        finally:
+            finished.append(time.monotonic())
+
+    monkeypatch.setitem(worker.STAGE_RUNNERS, "audio", slow_audio)
+    task = queue.claim(["audio"], "a")
+
+    async def run():
+        running = asyncio.create_task(worker.run_task(queue, task, "a", None))
+        await asyncio.sleep(0.15)
+        # Another worker takes over the task, as after a missed heartbeat
+        queue.connection().execute("UPDATE tasks SET lease_owner = 'b' WHERE job_id = ? AND stage = 'audio'", (job_id,))
+        start = time.monotonic()
+        await running
+        return start
+
+    start = asyncio.run(run())
+    assert finished and finished[0] - start < 0.5
+    # The new owner's lease is untouched: nothing failed, released or completed
+    assert task_status(queue, job_id)["audio"] == "leased"
+    assert queue.heartbeat(job_id, "audio", "b")
+
+def test_workers_drain_the_queue(db_path, monkeypatch):
+    runs = []
+
+    def runner(stage, fail_first=False):
+        async def run(params, checkpoints, timings, transcriber, attempt):
+            runs.append((params["i"], stage, attempt))
+            if params["i"] == 0 and stage == "footage":
+                raise JobFailed("no footage")
+            if fail_first and attempt == 1:
+                raise RuntimeError("flaky")
+            await asyncio.sleep(0.01)
+            return {"stage": stage}
+        return run
+
+    for stage in STAGES:
+        monkeypatch.setitem(worker.STAGE_RUNNERS, stage, runner(stage, fail_first=stage == "captions"))
+    queue = JobQueue(db_path, retry_delay=0)
+    job_ids = [queue.enqueue(f"job{i}", {"i": i}) for i in range(6)]
+
+    async def run():
+        # Two workers for the front stages and one for the back ones
+        workers = [JobQueue(db_path, retry_delay=0) for _ in range(3)]
+        await asyncio.gather(
+            worker.run_worker(workers[0], ["audio", "captions"], concurrency=2, drain=True, poll_interval=0.01),
+            worker.run_worker(workers[1], ["audio", "captions"], concurrency=2, drain=True, poll_interval=0.01),
+            worker.run_worker(workers[2], ["footage", "render"], concurrency=2, drain=True, poll_interval=0.01),
+        )
+
+    asyncio.run(asyncio.wait_for(run(), 30))
+    jobs = {job["id"]: job for job in queue.jobs()}
+    assert jobs[job_ids[0]]["status"] == "failed"
+    assert all(jobs[job_id]["status"] == "done" for job_id in job_ids[1:])
+    assert sorted(attempt for i, stage, attempt in runs if stage == "captions") == [1] * 6 + [2] * 6
+    assert len([run for run in runs if run[1] == "render"]) == 5
+    assert queue.pending() == 0
@@ -0,0 +1,83 @@
+import orjson
+import pytest
+from utility.video.llm_json import JsonRepairer, KeywordSegmentParser, repair_json, loads_tolerant
+
+SEGMENTS = [[[0, 2.5], ["desert road", "sand dunes"]], [[2.5, 5], ["night sky", "it's \"late\""]], [[5, 7.25], []]]
+
+@pytest.mark.parametrize("text, expected", [
+    ('[[[0, 1], ["a", "b",],],]', [[[0, 1], ["a", "b"]]]),
+    ("[[[0, 1], ['desert road', 'car']]]", [[[0, 1], ["desert road", "car"]]]),
+    ('[[[0, 1], [“smart quotes”, ‘single’]]]', [[[0, 1], ["smart quotes", "single"]]]),
+    ('Here are the keywords:\n[[[0, 1], ["a"]]]', [[[0, 1], ["a"]]]),
+    ('[[[0, 1], ["the "best" car", "b"]]]', [[[0, 1], ['the "best" car', "b"]]]),
+    ("[[[0, 1], ['it\\'s', 'the dog's bone']]]", [[[0, 1], ["it's", "the dog's bone"]]]),
+    ('[[[0, 1], ["line\nbreak\ttab"]]]', [[[0, 1], ["line break tab"]]]),
+    ('{"a": "b",}', {"a": "b"}),
+])
+def test_repair_json(text, expected):
+    assert orjson.loads(repair_json(text)) == expected
+
+def test_valid_json_passes_through():
+    text = orjson.dumps(SEGMENTS).decode()
+    assert repair_json(text) == text
+    assert loads_tolerant(text) == SEGMENTS
+
+def test_truncated_string_is_closed():
+    assert repair_json('[[[0, 1], ["desert ro').endswith('["desert ro"')
+
+@pytest.mark.parametrize("chunk", [1, 2, 3, 7, 16])
+def test_incremental_repair_matches_one_pass(chunk):
+    text = "Sure! [[[0, 1], ['the \"best\" car', “dune”,],], [[1, 2], ['it\\'s', 'a\nb']],]"
+    repairer = JsonRepairer()
+    repaired = "".join(repairer.feed(text[i:i + chunk]) for i in range(0, len(text), chunk))
+    repaired += repairer.feed("", final=True)
+    assert repaired == repair_json(text)
+    assert orjson.loads(repaired) == [[[0, 1], ['the "best" car', "dune"]], [[1, 2], ["it's", "a b"]]]
+
+@pytest.mark.parametrize("chunk", [1, 5, 16, 1000])
+def test_parser_yields_segments_as_they_complete(chunk):
+    text = orjson.dumps(SEGMENTS).decode()
+    ends = []
+    end = 1
+    for segment in SEGMENTS:
+        end += len(orjson.dumps(segment))
+        ends.append(end)
+        end += 1
+    parser = KeywordSegmentParser()
+    received = []
+    for i in range(0, len(text), chunk):
+        received.extend(parser.feed(text[i:i + chunk]))
+        # A segment comes out as soon as its closing bracket has arrived
+        assert len(received) == sum(1 for end in ends if end <= i + chunk)
+    received.extend(parser.finish())
+    assert received == SEGMENTS
+
+def test_truncated_response_keeps_its_complete_prefix():
+    text = orjson.dumps(SEGMENTS).decode()
+    cut = text.index("[[5")
+    parser = KeywordSegmentParser()
+    received = parser.feed(text[:cut + 5])
+    assert received == SEGMENTS[:2]
+    with pytest.raises(ValueError, match="Truncated"):
+        parser.finish()
+
+@pytest.mark.parametrize("segment", [
+    '[[0, 1]]',
+    '[[0], ["a"]]',
+    '[["0", 1], ["a"]]',
+    '[[true, 1], ["a"]]',
+    '[[0, 1], "a"]',
+    '[[0, 1], [1, 2]]',
+])
+def test_parser_rejects_malformed_segments(segment):
+    parser = KeywordSegmentParser()
+    assert parser.feed('[[[0, 1], ["ok"]], ') == [[[0, 1], ["ok"]]]
+    with pytest.raises(ValueError):
+        parser.feed(segment + "]")
+
+def test_parser_repairs_as_it_goes():
+    parser = KeywordSegmentParser()
+    received = parser.feed("Keywords: [[[0, 1], ['a \"quoted\" word', 'b',],], ")
+    received += parser.feed("[[1, 2], [“c”]]]")
+    received += parser.finish()
+    assert received == [[[0, 1], ['a "quoted" word', "b"]], [[1, 2], ["c"]]]
@@ -0,0 +1,47 @@
+import io
+import subprocess
+import pytest
+from benchmarks.fixtures import make_sample_clip, make_sample_audio
+from utility.render.output_sink import FileSink, StreamSink
+from utility.render.render_engine import combine_video_segments, get_ffmpeg_path
+
+@pytest.fixture(scope="module")
+def segments(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("segments")
+    clips = [make_sample_clip(str(directory / f"segment_{i}.mp4"), 2, (320, 240)) for i in range(2)]
+    return clips, make_sample_audio(str(directory / "audio.wav"), 4)
+
+def assert_decodes(path):
+    result = subprocess.run([get_ffmpeg_path(), "-v", "error", "-i", path, "-f", "null", "-"],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+def test_file_sink_renames_into_place(segments, tmp_path):
+    clips, audio = segments
+    output = tmp_path / "out" / "video.mp4"
+    assert combine_video_segments(clips, FileSink(str(output)), audio_file=audio) == str(output)
+    assert list((tmp_path / "out").iterdir()) == [output]
+    assert_decodes(str(output))
+
+def test_stream_sink_writes_fragmented_mp4_to_the_stream(segments, tmp_path):
+    clips, audio = segments
+    stream = io.BytesIO()
+    sink = StreamSink(stream, "buffer")
+    assert combine_video_segments(clips, sink, audio_file=audio) == "buffer"
+    data = stream.getvalue()
+    assert sink.metrics["bytes_written"] == len(data)
+    assert b"moof" in data
+    output = tmp_path / "streamed.mp4"
+    output.write_bytes(data)
+    assert_decodes(str(output))
+
+def test_stream_sink_streams_a_file_target_on_commit(segments):
+    clips, _ = segments
+    stream = io.BytesIO()
+    sink = StreamSink(stream)
+    with open(clips[0], "rb") as f:
+        expected = f.read()
+    with open(sink.target(), "wb") as f:
+        f.write(expected)
+    sink.commit()
+    assert stream.getvalue() == expected
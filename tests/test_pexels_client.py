@@ -0,0 +1,104 @@
+import time
+import asyncio
+import pytest
+from benchmarks.fixtures import StubPexelsServer
+from utility.video import pexels_client
+from utility.video.pexels_client import PexelsClient
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(pexels_client, "RETRY_DELAY", 0.01)
+
+def run_searches(server, queries, **client_args):
+    # Runs the searches concurrently on a fresh client; returns (results, stats)
+    async def search():
+        async with PexelsClient(api_key="test", search_url=server.url + "/videos/search", **client_args) as client:
+            results = await asyncio.gather(*(client.search_videos(query) for query in queries))
+            return results, client.stats
+
+    server.start()
+    try:
+        return asyncio.run(search())
+    finally:
+        server.stop()
+
+def test_identical_searches_in_flight_share_one_request():
+    server = StubPexelsServer(latency=0.2)
+    results, stats = run_searches(server, ["coalesce ocean waves"] * 5)
+    assert server.requests == 1
+    assert stats["requests"] == 1
+    assert stats["coalesced"] == 4
+    assert all(result == results[0] for result in results)
+    assert len(results[0]["videos"]) == 15
+
+def test_token_bucket_spaces_requests_past_the_burst():
+    server = StubPexelsServer(latency=0)
+    queries = [f"bucket query {i}" for i in range(5)]
+    results, stats = run_searches(server, queries, requests_per_second=10, burst=2)
+    assert all(result is not None for result in results)
+    assert server.requests == 5
+    times = server.request_times
+    # Two requests go out as a burst, the other three at the refill rate
+    assert times[-1] - times[0] >= 0.25
+
+def test_exhausted_rate_limit_pauses_until_reset():
+    server = StubPexelsServer(latency=0, rate_limit=1, reset_seconds=0.5)
+
+    async def search():
+        async with PexelsClient(api_key="test", search_url=server.url + "/videos/search") as client:
+            await client.search_videos("ratelimit first")
+            assert client.bucket.blocked_until > time.monotonic()
+            start = time.monotonic()
+            await client.search_videos("ratelimit second")
+            return time.monotonic() - start
+
+    server.start()
+    try:
+        waited = asyncio.run(search())
+    finally:
+        server.stop()
+    assert server.requests == 2
+    assert waited >= 0.4
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_retries_rate_limit_and_server_errors(no_retry_delay, status):
+    server = StubPexelsServer(latency=0, errors=[status, status])
+    results, stats = run_searches(server, [f"retry query {status}"])
+    assert results[0] is not None
+    assert server.requests == 3
+    assert stats["retries"] == 2
+    assert stats["failures"] == 0
+
+def test_gives_up_after_max_retries(no_retry_delay):
+    server = StubPexelsServer(latency=0, errors=[502] * pexels_client.MAX_RETRIES)
+    results, stats = run_searches(server, ["retry exhausted query"])
+    assert results == [None]
+    assert server.requests == pexels_client.MAX_RETRIES
+    assert stats["failures"] == 1
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+def test_other_client_errors_fail_without_retrying(no_retry_delay, status):
+    server = StubPexelsServer(latency=0, errors=[status])
+    results, stats = run_searches(server, [f"fail fast query {status}"])
+    assert results == [None]
+    assert server.requests == 1
+    assert stats["retries"] == 0
+    assert stats["failures"] == 1
+
+def test_failed_search_is_not_memoized(no_retry_delay):
+    server = StubPexelsServer(latency=0, errors=[401])
+
+    async def lookup():
+        async with PexelsClient(api_key="test", search_url=server.url + "/videos/search") as client:
+            first = await client.get_candidates("memo query")
+            second = await client.get_candidates("memo query")
+            return first, second
+
+    server.start()
+    try:
+        first, second = asyncio.run(lookup())
+    finally:
+        server.stop()
+    assert first == ()
+    assert len(second) > 0
+    assert server.requests == 2
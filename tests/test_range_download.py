@@ -0,0 +1,98 @@
+import os
+import subprocess
+import pytest
+from benchmarks.fixtures import make_sample_clip, serve_directory, QuietHandler, RangeRequestHandler
+from utility.render import footage_cache
+from utility.render.render_engine import get_ffmpeg_path
+from utility.render.range_download import download_partial
+
+CLIP_SECONDS = 20
+PARTIAL_SECONDS = 3
+
+@pytest.fixture(scope="module")
+def clips(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("clips")
+    make_sample_clip(str(directory / "faststart.mp4"), CLIP_SECONDS, (320, 240), faststart=True)
+    make_sample_clip(str(directory / "moov_at_end.mp4"), CLIP_SECONDS, (320, 240))
+    with open(directory / "moov_at_end.mp4", "rb") as f:
+        data = f.read()
+    moov = data.rindex(b"moov") - 4
+    # Cut off the end of the sample tables
+    with open(directory / "truncated.mp4", "wb") as f:
+        f.write(data[:moov + (len(data) - moov) // 2])
+    # Point every chunk offset table at more entries than the box holds
+    corrupt = bytearray(data)
+    for table in (b"stco", b"co64"):
+        index = corrupt.find(table, moov)
+        while index != -1:
+            corrupt[index + 8:index + 12] = (0x7FFFFFFF).to_bytes(4, "big")
+            index = corrupt.find(table, index + 4)
+    with open(directory / "corrupt.mp4", "wb") as f:
+        f.write(corrupt)
+    return directory
+
+@pytest.fixture(scope="module")
+def range_server(clips):
+    server, url = serve_directory(str(clips), RangeRequestHandler)
+    yield url
+    server.shutdown()
+
+@pytest.fixture(scope="module")
+def plain_server(clips):
+    # SimpleHTTPRequestHandler ignores Range and answers 200 with the whole file
+    server, url = serve_directory(str(clips), QuietHandler)
+    yield url
+    server.shutdown()
+
+def decodes(path, seconds):
+    result = subprocess.run([get_ffmpeg_path(), "-v", "error", "-t", str(seconds), "-i", path, "-f", "null", "-"],
+                            capture_output=True, text=True)
+    return result.returncode == 0 and not result.stderr.strip()
+
+@pytest.mark.parametrize("name", ["faststart.mp4", "moov_at_end.mp4"])
+def test_partial_download_plays_the_requested_span(clips, range_server, tmp_path, name):
+    target = str(tmp_path / name)
+    result = download_partial(f"{range_server}/{name}", target, PARTIAL_SECONDS, footage_cache.HEADERS)
+    assert result is not None
+    fetched, total = result
+    assert total == os.path.getsize(clips / name)
+    assert fetched < total / 2
+    assert os.path.getsize(target) == total
+    assert decodes(target, PARTIAL_SECONDS)
+
+def test_partial_download_keeps_the_original_offsets(clips, range_server, tmp_path):
+    target = str(tmp_path / "moov_at_end.mp4")
+    assert download_partial(f"{range_server}/moov_at_end.mp4", target, PARTIAL_SECONDS, footage_cache.HEADERS)
+    with open(clips / "moov_at_end.mp4", "rb") as f:
+        original = f.read()
+    with open(target, "rb") as f:
+        partial = f.read()
+    moov = original.rindex(b"moov") - 4
+    assert partial[:1024] == original[:1024]
+    assert partial[moov:] == original[moov:]
+
+@pytest.mark.parametrize("name", ["faststart.mp4", "moov_at_end.mp4"])
+def test_fetch_caches_partial_downloads(range_server, name):
+    url = f"{range_server}/{name}?partial"
+    path = footage_cache.fetch(url, duration=PARTIAL_SECONDS - 0.5)
+    assert path == footage_cache.cache_path(url, PARTIAL_SECONDS)
+    assert footage_cache.fetch(url, duration=PARTIAL_SECONDS) == path
+    assert decodes(path, PARTIAL_SECONDS)
+
+def test_server_ignoring_range_falls_back_to_full_download(clips, plain_server, tmp_path):
+    url = f"{plain_server}/moov_at_end.mp4"
+    assert download_partial(url, str(tmp_path / "partial.mp4"), PARTIAL_SECONDS, footage_cache.HEADERS) is None
+    assert not os.path.exists(tmp_path / "partial.mp4")
+    path = footage_cache.fetch(url, duration=PARTIAL_SECONDS)
+    assert path == footage_cache.cache_path(url)
+    with open(path, "rb") as f, open(clips / "moov_at_end.mp4", "rb") as original:
+        assert f.read() == original.read()
+
+@pytest.mark.parametrize("name", ["truncated.mp4", "corrupt.mp4"])
+def test_broken_moov_falls_back_to_full_download(clips, range_server, tmp_path, name):
+    url = f"{range_server}/{name}"
+    assert download_partial(url, str(tmp_path / name), PARTIAL_SECONDS, footage_cache.HEADERS) is None
+    assert os.listdir(tmp_path) == []
+    path = footage_cache.fetch(url, duration=PARTIAL_SECONDS)
+    assert path == footage_cache.cache_path(url)
+    assert os.path.getsize(path) == os.path.getsize(clips / name)
@@ -0,0 +1,33 @@
+import sys
+import types
+import asyncio
+import threading
+from utility.captions.transcription_service import TranscriptionService
+
+def fake_module(name, **functions):
+    module = types.ModuleType(name)
+    module.__dict__.update(functions)
+    return module
+
+def test_each_worker_loads_its_own_model(monkeypatch):
+    # whisper_timestamped and torch stand-ins that record which thread loaded each model
+    loads = []
+
+    def load_model(model_size):
+        model = {"size": model_size, "thread": threading.current_thread().name}
+        loads.append(model)
+        return model
+
+    monkeypatch.setitem(sys.modules, "whisper_timestamped",
+                        fake_module("whisper_timestamped", load_model=load_model))
+    monkeypatch.setitem(sys.modules, "torch",
+                        fake_module("torch", set_num_threads=lambda n: None, set_num_interop_threads=lambda n: None))
+
+    async def run():
+        async with TranscriptionService("tiny", workers=3) as service:
+            return list(service.models)
+
+    models = asyncio.run(run())
+    assert len(loads) == 3
+    assert len({id(model) for model in models}) == 3
+    assert sorted(model["thread"] for model in models) == sorted(f"whisper{i}_0" for i in range(3))
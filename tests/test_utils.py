@@ -0,0 +1,44 @@
+import os
+import gzip
+import glob
+import orjson
+import multiprocessing
+import pytest
+from utility.utils import ResponseLogWriter, LOG_TYPE_GPT
+
+ENTRIES = 400
+
+def write_entries(directory, compress, worker):
+    writer = ResponseLogWriter({LOG_TYPE_GPT: directory}, compress=compress)
+    for i in range(ENTRIES):
+        writer.put(LOG_TYPE_GPT, {"worker": worker, "i": i, "text": os.urandom(2048).hex()})
+    assert writer.flush(timeout=30)
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_processes_appending_to_one_file_keep_it_readable(tmp_path, compress):
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=write_entries, args=(str(tmp_path), compress, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+    files = glob.glob(os.path.join(tmp_path, "*"))
+    assert len(files) == 1
+    opener = gzip.open if compress else open
+    with opener(files[0], "rb") as f:
+        entries = [orjson.loads(line) for line in f]
+    assert sorted((entry["worker"], entry["i"]) for entry in entries) == [(w, i) for w in range(4) for i in range(ENTRIES)]
+
+def test_rotates_past_the_size_limit(tmp_path):
+    writer = ResponseLogWriter({LOG_TYPE_GPT: str(tmp_path)}, rotate_bytes=2048)
+    for i in range(200):
+        writer.put(LOG_TYPE_GPT, {"i": i, "text": "x" * 40})
+        if i % 20 == 19:
+            writer.flush()
+    assert writer.flush(timeout=10)
+    files = sorted(glob.glob(os.path.join(tmp_path, "gpt_*.jsonl")))
+    assert len(files) > 1
+    assert all(os.path.getsize(path) <= 2048 for path in files)
+    lines = [orjson.loads(line) for path in files for line in open(path, "rb")]
+    assert [line["i"] for line in lines] == list(range(200))
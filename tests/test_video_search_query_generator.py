@@ -0,0 +1,150 @@
+import time
+import asyncio
+import threading
+import pytest
+import orjson
+from benchmarks.e2e_benchmark import make_script
+from benchmarks.keywords_benchmark import make_captions
+from utility import artifact_store
+from utility.video import fake_llm, video_search_query_generator as generator
+from utility.video.fake_llm import FakeClient
+from utility.video.llm_json import KeywordSegmentParser
+
+class ScriptedCompletions:
+    # Answers like the fake client, but respond(captions, call) decides each
+    # response's text; the captions of every request are recorded
+    def __init__(self, respond):
+        self.respond = respond
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        captions = fake_llm.parse_captions(messages[-1]["content"])
+        with self.lock:
+            self.calls.append(captions)
+            call = len(self.calls)
+        return fake_llm.stream_content(self.respond(captions, call))
+
+def scripted_client(monkeypatch, respond):
+    client = FakeClient()
+    client.chat.completions = ScriptedCompletions(respond)
+    monkeypatch.setattr(generator, "_client", client)
+    return client.chat.completions
+
+def keywords_for(captions):
+    return orjson.dumps(fake_llm.keyword_windows(captions)).decode()
+
+def assert_covers(segments, captions):
+    assert segments
+    assert segments[0][0][0] == captions[0][0][0]
+    assert segments[-1][0][1] == captions[-1][0][1]
+    for previous, segment in zip(segments, segments[1:]):
+        assert previous[0][1] == segment[0][0]
+    assert all(t1 < t2 for (t1, t2), _ in segments)
+
+@pytest.fixture(autouse=True)
+def fake_llm_client(monkeypatch):
+    # Windows aren't cached between tests, and each test gets its own client
+    monkeypatch.setattr(artifact_store, "ENABLED", False)
+    monkeypatch.setattr(fake_llm, "LATENCY", 0.01)
+    monkeypatch.setattr(fake_llm, "STREAM_CHUNK_DELAY", 0)
+    monkeypatch.setattr(generator, "_client", FakeClient(seed="1"))
+
+def test_stopping_the_stream_early_abandons_the_responses(monkeypatch):
+    # About ten minutes of captions; each window takes seconds to stream in
+    monkeypatch.setattr(fake_llm, "STREAM_CHUNK_DELAY", 0.02)
+    script = make_script(1400)
+    captions = make_captions(script)
+
+    async def first_segment():
+        stream = generator.streamVideoSearchQueriesTimed(script, captions)
+        segment = await stream.__anext__()
+        start = time.perf_counter()
+        await stream.aclose()
+        return segment, time.perf_counter() - start
+
+    segment, closing = asyncio.run(first_segment())
+    assert segment[0][0] == captions[0][0][0]
+    assert closing < 0.5
+    # The window threads drop their requests at the next chunk too
+    deadline = time.monotonic() + 1
+    while any(thread.is_alive() for thread in threading.enumerate() if thread.name.startswith("keyword-window")):
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+def test_stitch_segment_clips_and_chains():
+    assert generator.stitch_segment([[8, 12], ["a"]], None, 10, 20) == [[10, 12], ["a"]]
+    assert generator.stitch_segment([[11, 14], ["a"]], 12, 10, 20) == [[12, 14], ["a"]]
+    assert generator.stitch_segment([[17, 25], ["a"]], 18.5, 10, 20) == [[18.5, 20], ["a"]]
+    # Repeats of segments already covered, e.g. from a retry, are dropped
+    assert generator.stitch_segment([[10, 12], ["a"]], 14, 10, 20) is None
+    assert generator.stitch_segment([[21, 24], ["a"]], 20, 10, 20) is None
+
+def test_windows_own_consecutive_ranges_with_overlapping_context():
+    captions = make_captions(make_script(700))
+    windows = generator.split_caption_windows(captions, 90, 10)
+    assert len(windows) > 2
+    assert windows[0][0] == float("-inf") and windows[-1][1] == float("inf")
+    for (_, own_end, _), (own_start, _, _) in zip(windows, windows[1:]):
+        assert own_end == own_start
+    for own_start, own_end, window_captions in windows:
+        assert window_captions[0][0][1] > own_start - 10 and window_captions[-1][0][0] < own_end + 10
+        assert all(caption in window_captions for caption in captions if own_start <= caption[0][0] < own_end)
+
+@pytest.mark.parametrize("seed", ["1", "2", "3"])
+@pytest.mark.parametrize("malformed_rate", [0, 0.3, 0.6])
+def test_windowed_segments_cover_the_timeline(monkeypatch, seed, malformed_rate):
+    monkeypatch.setattr(generator, "_client", FakeClient(malformed_rate, seed))
+    script = make_script(1400)
+    captions = make_captions(script)
+    segments = generator.getVideoSearchQueriesTimed(script, captions, window_seconds=90, concurrency=4)
+    assert_covers(segments, captions)
+
+def test_single_request_covers_the_timeline(monkeypatch):
+    monkeypatch.setattr(generator, "_client", FakeClient(0.5, "4"))
+    script = make_script(300)
+    captions = make_captions(script)
+    assert_covers(generator.getVideoSearchQueriesTimed(script, captions, window_seconds=float("inf")), captions)
+
+def test_retry_requests_only_the_captions_after_the_valid_prefix(monkeypatch):
+    # The first response is cut off partway; what parsed is kept
+    def respond(captions, call):
+        content = keywords_for(captions)
+        return content[:len(content) // 2] if call == 1 else content
+
+    completions = scripted_client(monkeypatch, respond)
+    script = make_script(120)
+    captions = make_captions(script)
+    segments = generator.getVideoSearchQueriesTimed(script, captions, window_seconds=float("inf"))
+    assert_covers(segments, captions)
+    first, retry = completions.calls
+    assert first == captions
+    content = keywords_for(captions)
+    salvaged = KeywordSegmentParser().feed(content[:len(content) // 2])
+    assert salvaged
+    assert retry == [caption for caption in captions if caption[0][1] > salvaged[-1][0][1]]
+
+def test_failed_window_is_split_into_smaller_windows(monkeypatch):
+    # Requests spanning more than 50 s always get prose back instead of JSON
+    def respond(captions, call):
+        if captions[-1][0][1] - captions[0][0][0] > 50:
+            return "Sorry, I can't help with that."
+        return keywords_for(captions)
+
+    completions = scripted_client(monkeypatch, respond)
+    script = make_script(700)
+    captions = make_captions(script)
+    segments = generator.getVideoSearchQueriesTimed(script, captions, window_seconds=90, concurrency=4)
+    assert_covers(segments, captions)
+    spans = [call[-1][0][1] - call[0][0][0] for call in completions.calls]
+    assert max(spans) > 50 and any(span <= 50 for span in spans)
+
+def test_window_fails_once_smaller_windows_would_be_too_short(monkeypatch):
+    completions = scripted_client(monkeypatch, lambda captions, call: "not json")
+    script = make_script(300)
+    captions = make_captions(script)
+    with pytest.raises(ValueError):
+        list(generator.iterVideoSearchQueriesTimed(script, captions, window_seconds=60, concurrency=2))
+    assert generator.getVideoSearchQueriesTimed(script, captions, window_seconds=60, concurrency=2) is None
+    # The first window was retried, then split into 30 s and 15 s windows before giving up
+    assert len(completions.calls) >= 3 * (generator.WINDOW_RETRIES + 1)
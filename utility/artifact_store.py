@@ -0,0 +1,132 @@
+import os
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+import orjson
+
+# Persistent store for pipeline stage outputs, keyed by a hash of the stage's
+# inputs and configuration. An artifact is a JSON value, optionally with a
+# file (audio, a rendered chunk) stored next to it under the same key.
+
+ARTIFACT_DIRECTORY = os.environ.get('ARTIFACT_CACHE_DIR', '.cache/artifacts')
+ARTIFACT_MAX_BYTES = int(os.environ.get('ARTIFACT_CACHE_MAX_MB', '4096')) * 1024 * 1024
+ENABLED = os.environ.get('ARTIFACT_CACHE', '1') == '1'
+# Bump to invalidate every stored artifact after a change to stage outputs
+STORE_VERSION = 1
+# Once over ARTIFACT_MAX_BYTES the store is trimmed to this fraction of it,
+# so a full store is walked once per batch of saves rather than on each one
+EVICT_TARGET = 0.9
+
+_lock = threading.Lock()
+_stats = {}
+# Running size of each store directory, measured by the first evict() walk
+_store_bytes = {}
+
+def artifact_key(stage, *inputs):
+    payload = orjson.dumps([STORE_VERSION, stage, inputs], option=orjson.OPT_SORT_KEYS)
+    return hashlib.sha256(payload).hexdigest()
+
+def artifact_path(key, suffix=".json"):
+    return os.path.join(ARTIFACT_DIRECTORY, key[:2], key + suffix)
+
+def file_path(key):
+    return artifact_path(key, ".data")
+
+def _record(stage, outcome, metrics=None):
+    with _lock:
+        counts = _stats.setdefault(stage, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+    if metrics is not None:
+        counts = metrics.setdefault("artifacts", {}).setdefault(stage, {"hits": 0, "misses": 0})
+        counts[outcome] += 1
+
+def get_stats():
+    with _lock:
+        return {stage: dict(counts) for stage, counts in _stats.items()}
+
+def _write_atomic(path, write):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def load(stage, key, file=None, metrics=None):
+    # Returns the stored value, or None on a miss. With file, the stored file
+    # is also copied there; a copy, so rewriting it can't corrupt the store.
+    if not ENABLED:
+        return None
+    try:
+        with open(artifact_path(key), 'rb') as f:
+            value = orjson.loads(f.read())
+        if file is not None:
+            shutil.copyfile(file_path(key), file)
+        os.utime(artifact_path(key), None)  # bump mtime so LRU eviction keeps it
+    except (OSError, orjson.JSONDecodeError):
+        _record(stage, "misses", metrics)
+        return None
+    _record(stage, "hits", metrics)
+    return value
+
+def save(stage, key, value, file=None):
+    if not ENABLED:
+        return
+    try:
+        # The file goes first so a readable value always has its file
+        if file is not None:
+            with open(file, 'rb') as source:
+                _write_atomic(file_path(key), lambda f: shutil.copyfileobj(source, f))
+        _write_atomic(artifact_path(key), lambda f: f.write(orjson.dumps(value)))
+        added = os.path.getsize(artifact_path(key)) + (os.path.getsize(file_path(key)) if file is not None else 0)
+    except OSError as e:
+        logging.warning(f"Could not store {stage} artifact: {str(e)}")
+        return
+    with _lock:
+        known = _store_bytes.get(ARTIFACT_DIRECTORY)
+        if known is not None:
+            _store_bytes[ARTIFACT_DIRECTORY] = known + added
+    # The directory is only walked to measure it the first time and once the
+    # running total passes the limit
+    if known is None or known + added > ARTIFACT_MAX_BYTES:
+        evict(ARTIFACT_MAX_BYTES)
+
+def evict(max_bytes=ARTIFACT_MAX_BYTES, target=EVICT_TARGET):
+    entries = {}
+    total = 0
+    for root, _, files in os.walk(ARTIFACT_DIRECTORY):
+        for name in files:
+            key, suffix = os.path.splitext(name)
+            if suffix not in (".json", ".data"):
+                continue
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            mtime, size = entries.get(key, (0, 0))
+            entries[key] = (max(mtime, st.st_mtime), size + st.st_size)
+            total += st.st_size
+
+    removed = 0
+    if total > max_bytes:
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= max_bytes * target:
+                break
+            for path in (artifact_path(key), file_path(key)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        logging.info(f"Artifact store evicted {removed} artifacts")
+    with _lock:
+        _store_bytes[ARTIFACT_DIRECTORY] = total
+    return removed
@@ -1,20 +1,136 @@
-import edge_tts
+import os
+import re
 import logging
 import asyncio
+from utility.audio import mp3_frames
+from utility import instrumentation
 
-async def generate_audio(text, output_filename):
+TICKS_PER_SECOND = 10_000_000  # edge-tts offsets are in 100 ns units
+VOICE = "en-AU-WilliamNeural"
+TTS_BACKEND = os.environ.get('TTS_BACKEND', 'edge')
+# Scripts longer than this are split at sentence boundaries and synthesized concurrently
+CHUNK_WORDS = int(os.environ.get('TTS_CHUNK_WORDS', '120'))
+TTS_CONCURRENCY = int(os.environ.get('TTS_CONCURRENCY', '4'))
+CHUNK_RETRIES = 3
+
+def get_communicate(backend=None):
+    backend = backend or TTS_BACKEND
+    if backend == "fake":
+        from utility.audio.fake_tts import FakeCommunicate
+        return FakeCommunicate
+    import edge_tts
+    return edge_tts.Communicate
+
+async def generate_audio(text, output_filename, word_boundaries=None, backend=None):
     try:
-        communicate = edge_tts.Communicate(text, "en-AU-WilliamNeural")
-        await communicate.save(output_filename)
+        chunks = split_script(text)
+        stitched = False
+        if len(chunks) > 1:
+            try:
+                await generate_audio_chunked(chunks, output_filename, word_boundaries, backend=backend)
+                stitched = True
+            except mp3_frames.NotMp3 as e:
+                logging.warning(f"Cannot stitch TTS chunks ({str(e)}), synthesizing in one request")
+        if not stitched:
+            communicate = get_communicate(backend)(text, VOICE)
+            if word_boundaries is None:
+                await communicate.save(output_filename)
+            else:
+                await stream_audio_with_boundaries(communicate, output_filename, word_boundaries)
         logging.info(f"Audio generated successfully: {output_filename}")
     except Exception as e:
         logging.error(f"Error generating audio: {str(e)}")
         raise
 
-async def generate_audio_with_retry(text, output_filename, max_retries=3):
+def parse_boundary(chunk, offset=0):
+    start = chunk["offset"] / TICKS_PER_SECOND + offset
+    return {
+        "text": chunk["text"],
+        "start": start,
+        "end": start + chunk["duration"] / TICKS_PER_SECOND,
+    }
+
+async def stream_audio_with_boundaries(communicate, output_filename, word_boundaries):
+    # Writes the audio as it streams and collects WordBoundary events as
+    # {"text", "start", "end"} dicts in seconds, appended to word_boundaries
+    boundaries = []
+    with open(output_filename, "wb") as f:
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                f.write(chunk["data"])
+            elif chunk["type"] == "WordBoundary":
+                boundaries.append(parse_boundary(chunk))
+    word_boundaries.extend(boundaries)
+
+def split_script(text, max_words=CHUNK_WORDS):
+    # Groups whole sentences into chunks of at most max_words; a sentence
+    # longer than that becomes a chunk of its own
+    sentences = [s for s in re.split(r'(?<=[.!?])\s+', text.strip()) if s]
+    chunks = []
+    current = []
+    count = 0
+    for sentence in sentences:
+        words = len(sentence.split())
+        if current and count + words > max_words:
+            chunks.append(" ".join(current))
+            current = []
+            count = 0
+        current.append(sentence)
+        count += words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+async def synthesize_chunk(communicate_class, text, index, limit, retries=CHUNK_RETRIES):
+    # Returns (mp3 bytes, boundaries relative to the chunk start); only this
+    # chunk is retried when the stream fails
+    for attempt in range(retries):
+        async with limit:
+            try:
+                with instrumentation.span("tts_chunk", chunk=index, attempt=attempt + 1, words=len(text.split())):
+                    audio = bytearray()
+                    boundaries = []
+                    async for chunk in communicate_class(text, VOICE).stream():
+                        if chunk["type"] == "audio":
+                            audio += chunk["data"]
+                        elif chunk["type"] == "WordBoundary":
+                            boundaries.append(chunk)
+                if not audio:
+                    raise ValueError("no audio received")
+                return bytes(audio), boundaries
+            except Exception as e:
+                if attempt == retries - 1:
+                    logging.error(f"Audio chunk {index} failed after {retries} attempts: {str(e)}")
+                    raise
+                logging.warning(f"Audio chunk {index} attempt {attempt + 1} failed: {str(e)}. Retrying...")
+        await asyncio.sleep(1)
+
+async def generate_audio_chunked(chunks, output_filename, word_boundaries=None, concurrency=TTS_CONCURRENCY, backend=None):
+    # Synthesizes chunks concurrently and joins the MP3 streams at frame
+    # boundaries. Each chunk's boundaries are shifted by the exact sample
+    # count of the audio before it, so timings stay aligned with the file.
+    communicate_class = get_communicate(backend)
+    limit = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(synthesize_chunk(communicate_class, text, i, limit) for i, text in enumerate(chunks)))
+
+    offset = 0.0
+    boundaries = []
+    with open(output_filename, "wb") as f:
+        for i, (audio, chunk_boundaries) in enumerate(results):
+            start, end, samples, sample_rate = mp3_frames.frames(audio)
+            # Keep the first chunk's tag, drop later ones and any partial
+            # trailing frame so the next chunk starts on a frame sync
+            f.write(audio[0 if i == 0 else start:end])
+            boundaries.extend(parse_boundary(chunk, offset) for chunk in chunk_boundaries)
+            offset += samples / sample_rate
+    logging.info(f"Audio synthesized in {len(chunks)} chunks, {offset:.2f}s")
+    if word_boundaries is not None:
+        word_boundaries.extend(boundaries)
+
+async def generate_audio_with_retry(text, output_filename, max_retries=3, word_boundaries=None):
     for attempt in range(max_retries):
         try:
-            await generate_audio(text, output_filename)
+            await generate_audio(text, output_filename, word_boundaries)
             return
         except Exception as e:
             if attempt < max_retries - 1:
@@ -22,4 +138,4 @@ async def generate_audio_with_retry(text, output_filename, max_retries=3):
                 await asyncio.sleep(1)  # Wait for 1 second before retrying
             else:
                 logging.error(f"All audio generation attempts failed.")
-                raise
\ No newline at end of file
+                raise
@@ -0,0 +1,49 @@
+import os
+import random
+import asyncio
+from utility.audio.audio_generator import TICKS_PER_SECOND
+
+# Offline stand-in for edge_tts.Communicate: streams silent MP3 frames in the
+# same format as edge-tts (24 kHz mono, 48 kbit/s) plus WordBoundary events,
+# after a delay that scales with the text like a remote synthesis would.
+#
+#   TTS_BACKEND=fake python app.py script.txt
+
+SAMPLE_RATE = 24000
+SAMPLES_PER_FRAME = 576
+# MPEG-2 Layer III, 48 kbit/s, 24 kHz, mono, no CRC; an all-zero body decodes as silence
+FRAME = bytes([0xFF, 0xF3, 0x64, 0xC0]) + bytes(140)
+SECONDS_PER_WORD = 0.35
+LATENCY = float(os.environ.get('FAKE_TTS_LATENCY', '0.2'))
+LATENCY_PER_WORD = float(os.environ.get('FAKE_TTS_LATENCY_PER_WORD', '0.005'))
+FAILURE_RATE = float(os.environ.get('FAKE_TTS_FAILURE_RATE', '0'))
+
+class FakeCommunicate:
+    def __init__(self, text, voice=None, failure_rate=FAILURE_RATE):
+        self.text = text
+        self.voice = voice
+        self.failure_rate = failure_rate
+
+    async def stream(self):
+        words = self.text.split()
+        await asyncio.sleep(LATENCY + LATENCY_PER_WORD * len(words))
+        if random.random() < self.failure_rate:
+            raise ConnectionError("fake TTS dropped the connection")
+
+        frame_seconds = SAMPLES_PER_FRAME / SAMPLE_RATE
+        frame_count = max(1, round(len(words) * SECONDS_PER_WORD / frame_seconds))
+        for i, word in enumerate(words):
+            yield {
+                "type": "WordBoundary",
+                "offset": round(i * SECONDS_PER_WORD * TICKS_PER_SECOND),
+                "duration": round(SECONDS_PER_WORD * 0.8 * TICKS_PER_SECOND),
+                "text": word,
+            }
+        for _ in range(frame_count):
+            yield {"type": "audio", "data": FRAME}
+
+    async def save(self, output_filename):
+        with open(output_filename, "wb") as f:
+            async for chunk in self.stream():
+                if chunk["type"] == "audio":
+                    f.write(chunk["data"])
@@ -0,0 +1,67 @@
+import struct
+
+# MPEG audio Layer III frame headers, enough to count the samples in an
+# edge-tts stream and to cut it at frame boundaries.
+
+class NotMp3(Exception):
+    pass
+
+VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+
+def skip_id3(data):
+    # Length of a leading ID3v2 tag, or 0
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = 0
+        for byte in data[6:10]:
+            size = (size << 7) | (byte & 0x7F)
+        return 10 + size + (10 if data[5] & 0x10 else 0)
+    return 0
+
+def read_frame_header(data, offset):
+    # Returns (frame_length, samples, sample_rate) for the frame at offset
+    if offset + 4 > len(data):
+        raise NotMp3("truncated frame header")
+    header, = struct.unpack_from(">I", data, offset)
+    if header >> 21 != 0x7FF:
+        raise NotMp3(f"no frame sync at {offset}")
+    version = VERSIONS.get((header >> 19) & 0b11)
+    layer = (header >> 17) & 0b11
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 0b11
+    padding = (header >> 9) & 1
+    if version is None or layer != 0b01 or bitrate_index in (0, 15) or rate_index == 3:
+        raise NotMp3(f"unsupported frame header {header:#010x} at {offset}")
+    bitrate = BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    samples = 1152 if version == 1 else 576
+    length = (samples // 8) * bitrate // sample_rate + padding
+    return length, samples, sample_rate
+
+def frames(data):
+    # Returns (first_frame_offset, end_offset, total_samples, sample_rate)
+    # over the complete frames; a trailing partial frame is left out
+    offset = start = skip_id3(data)
+    total = 0
+    rate = None
+    while offset + 4 <= len(data):
+        length, samples, sample_rate = read_frame_header(data, offset)
+        if offset + length > len(data):
+            break
+        if rate is None:
+            rate = sample_rate
+        elif sample_rate != rate:
+            raise NotMp3("sample rate changes mid-stream")
+        total += samples
+        offset += length
+    if rate is None:
+        raise NotMp3("no complete frames")
+    return start, offset, total, rate
+
+def duration(data):
+    _, _, samples, rate = frames(data)
+    return samples / rate
@@ -1,22 +1,41 @@
-import whisper_timestamped as whisper
-from whisper_timestamped import load_model, transcribe_timestamped
 import re
 import logging
+from bisect import bisect_left
 from functools import lru_cache
 
+# whisper_timestamped pulls in torch, so it is only imported when a
+# transcription actually runs; TTS-timed captions never need it
+
 @lru_cache(maxsize=1)
 def load_whisper_model(model_size):
+    from whisper_timestamped import load_model
     return load_model(model_size)
 
+def transcribe_captions(model, audio_filename):
+    from whisper_timestamped import transcribe_timestamped
+    gen = transcribe_timestamped(model, audio_filename, verbose=False, fp16=False)
+    return getCaptionsWithTime(gen)
+
 def generate_timed_captions(audio_filename, model_size="base"):
     try:
         WHISPER_MODEL = load_whisper_model(model_size)
-        gen = transcribe_timestamped(WHISPER_MODEL, audio_filename, verbose=False, fp16=False)
-        return getCaptionsWithTime(gen)
+        return transcribe_captions(WHISPER_MODEL, audio_filename)
     except Exception as e:
         logging.error(f"Error generating timed captions: {str(e)}")
         return None
 
+def generate_timed_captions_from_boundaries(word_boundaries):
+    # Builds the whisper-shaped analysis from edge-tts WordBoundary events so
+    # the captions go through the same getCaptionsWithTime path
+    if not word_boundaries:
+        return None
+    words = [{"text": word["text"], "start": word["start"], "end": word["end"]} for word in word_boundaries]
+    analysis = {
+        "text": " ".join(word["text"] for word in words),
+        "segments": [{"words": words}],
+    }
+    return getCaptionsWithTime(analysis)
+
 def splitWordsBySize(words, maxCaptionSize):
     captions = []
     current_caption = []
@@ -35,23 +54,29 @@ def splitWordsBySize(words, maxCaptionSize):
     return captions
 
 def getTimestampMapping(whisper_analysis):
-    locationToTimestamp = {}
+    # Word intervals are contiguous from 0, so only the end boundary of each
+    # interval is stored; ends[i] pairs with times[i] and ends is ascending.
+    ends = []
+    times = []
     index = 0
     for segment in whisper_analysis['segments']:
         for word in segment['words']:
-            newIndex = index + len(word['text']) + 1
-            locationToTimestamp[(index, newIndex)] = word['end']
-            index = newIndex
-    return locationToTimestamp
+            index += len(word['text']) + 1
+            ends.append(index)
+            times.append(word['end'])
+    return ends, times
 
 def cleanWord(word):
     return re.sub(r'[^\w\s\-_"\'\']', '', word)
 
-def interpolateTimeFromDict(word_position, d):
-    for key, value in d.items():
-        if key[0] <= word_position <= key[1]:
-            return value
-    return None
+def interpolateTimeFromIndex(word_position, mapping, lo=0):
+    # First interval whose end is >= word_position, same as the first
+    # (start, end) key with start <= word_position <= end in the old dict scan
+    ends, times = mapping
+    i = bisect_left(ends, word_position, lo)
+    if i == len(ends) or word_position < 0:
+        return None, i
+    return times[i], i
 
 def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation=False):
     try:
@@ -68,9 +93,10 @@ def getCaptionsWithTime(whisper_analysis, maxCaptionSize=15, considerPunctuation
             words = text.split()
             words = [cleanWord(word) for word in splitWordsBySize(words, maxCaptionSize)]
         
+        lo = 0
         for word in words:
             position += len(word) + 1
-            end_time = interpolateTimeFromDict(position, wordLocationToTime)
+            end_time, lo = interpolateTimeFromIndex(position, wordLocationToTime, lo)
             if end_time and word:
                 CaptionsPairs.append(((start_time, end_time), word))
                 start_time = end_time
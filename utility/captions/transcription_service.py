@@ -0,0 +1,136 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from utility.captions.timed_captions_generator import transcribe_captions
+
+WHISPER_MODEL_SIZE = os.environ.get('WHISPER_MODEL', 'base')
+WHISPER_WORKERS = int(os.environ.get('WHISPER_WORKERS', '1'))
+
+def configure_torch_threads(workers):
+    # torch's thread count is process-wide: give it an equal share of the
+    # cores per worker, so concurrent inferences don't oversubscribe them
+    import torch
+    threads = max(1, (os.cpu_count() or 1) // max(workers, 1))
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # can only be set before torch runs any parallel work
+    return threads
+
+def load_worker_model(model_size):
+    # A fresh model for every worker; load_whisper_model's cached instance
+    # is shared by the one-off transcriptions and must not be used here
+    from whisper_timestamped import load_model
+    return load_model(model_size)
+
+class TranscriptionService:
+    # Long-lived Whisper worker pool. Each worker has its own thread and its
+    # own loaded model: whisper_timestamped hooks the model it transcribes
+    # with, so concurrent transcriptions on one model would mix each other's
+    # word timings. Audio files are queued and transcribe() resolves with the
+    # timed captions for one file.
+    def __init__(self, model_size=WHISPER_MODEL_SIZE, workers=WHISPER_WORKERS, max_queue=0):
+        self.model_size = model_size
+        self.workers = max(workers, 1)
+        self.max_queue = max_queue
+        self.models = []
+        self.queue = None
+        self.executors = []
+        self.tasks = []
+        self.in_flight = 0
+        self.start_lock = asyncio.Lock()
+        self.stats = {"queued": 0, "completed": 0, "failed": 0, "wait_s": 0.0, "max_wait_s": 0.0,
+                      "transcribe_s": 0.0, "max_transcribe_s": 0.0, "model_load_s": 0.0, "torch_threads": 0}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        async with self.start_lock:
+            if not self.tasks:
+                await self._start()
+
+    async def _start(self):
+        self.executors = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"whisper{i}") for i in range(self.workers)]
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        threads = await asyncio.gather(*(loop.run_in_executor(executor, configure_torch_threads, self.workers)
+                                         for executor in self.executors))
+        self.stats["torch_threads"] = threads[0]
+        self.models = await asyncio.gather(*(loop.run_in_executor(executor, load_worker_model, self.model_size)
+                                             for executor in self.executors))
+        self.stats["model_load_s"] = round(time.perf_counter() - start, 3)
+        logging.info(f"Whisper model '{self.model_size}' loaded in {self.stats['model_load_s']}s, "
+                     f"{self.workers} workers x {self.stats['torch_threads']} torch threads")
+        self.queue = asyncio.Queue(self.max_queue)
+        self.tasks = [asyncio.create_task(self._worker(executor, model)) for executor, model in zip(self.executors, self.models)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.queue is not None:
+            while not self.queue.empty():
+                _, future, _ = self.queue.get_nowait()
+                if not future.done():
+                    future.cancel()
+        for executor in self.executors:
+            executor.shutdown(wait=True)
+        self.executors = []
+        self.models = []
+
+    async def transcribe(self, audio_file):
+        # Returns the timed captions, or None if transcription failed
+        if not self.tasks:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((audio_file, future, time.perf_counter()))
+        self.stats["queued"] += 1
+        return await future
+
+    async def _worker(self, executor, model):
+        loop = asyncio.get_running_loop()
+        while True:
+            audio_file, future, enqueued = await self.queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                started = time.perf_counter()
+                self._observe("wait_s", "max_wait_s", started - enqueued)
+                self.in_flight += 1
+                try:
+                    captions = await loop.run_in_executor(executor, transcribe_captions, model, audio_file)
+                    self.stats["completed"] += 1
+                except Exception as e:
+                    logging.error(f"Error generating timed captions for {audio_file}: {str(e)}")
+                    captions = None
+                    self.stats["failed"] += 1
+                finally:
+                    self.in_flight -= 1
+                    self._observe("transcribe_s", "max_transcribe_s", time.perf_counter() - started)
+                if not future.done():
+                    future.set_result(captions)
+            finally:
+                self.queue.task_done()
+
+    def _observe(self, total_key, max_key, seconds):
+        self.stats[total_key] = round(self.stats[total_key] + seconds, 3)
+        self.stats[max_key] = round(max(self.stats[max_key], seconds), 3)
+
+    def get_stats(self):
+        done = self.stats["completed"] + self.stats["failed"]
+        return {
+            **self.stats,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            "in_flight": self.in_flight,
+            "avg_wait_s": round(self.stats["wait_s"] / done, 3) if done else 0.0,
+            "avg_transcribe_s": round(self.stats["transcribe_s"] / done, 3) if done else 0.0,
+        }
@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+import orjson
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Spans around pipeline stages and their per-segment sub-tasks. Nothing is
+# recorded unless a run is inside recording(); span() is then a shared no-op.
+# The recorder travels in a context variable, so it follows asyncio tasks and
+# asyncio.to_thread calls but not plain executor submissions.
+
+_recorder = contextvars.ContextVar("instrumentation_recorder", default=None)
+_current_span = contextvars.ContextVar("instrumentation_span", default=None)
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux; children covers ffmpeg and render workers
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+def children_cpu_s():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NULL_SPAN = NullSpan()
+
+class Span:
+    __slots__ = ("recorder", "name", "attrs", "parent", "token", "start", "cpu_start")
+
+    def __init__(self, recorder, name, attrs):
+        self.recorder = recorder
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self)
+        self.start = time.perf_counter()
+        self.cpu_start = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        # CPU of the calling thread; for spans on the event loop this includes
+        # other tasks that ran while the span was waiting
+        cpu = time.thread_time() - self.cpu_start
+        _current_span.reset(self.token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.recorder.record(self, end, cpu)
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+class Recorder:
+    def __init__(self, name, metrics=None):
+        self.name = name
+        self.metrics = metrics if metrics is not None else {}
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.wall_clock = time.time()
+        self.cpu_origin = time.process_time()
+        self.children_cpu_origin = children_cpu_s()
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, span, end, cpu):
+        entry = {
+            "name": span.name,
+            "parent": span.parent.name if span.parent is not None else None,
+            "start_s": round(span.start - self.origin, 6),
+            "wall_s": round(end - span.start, 6),
+            "cpu_s": round(cpu, 6),
+            "peak_rss_mb": peak_rss_mb(),
+            "thread": threading.get_ident(),
+        }
+        if span.attrs:
+            entry["attrs"] = span.attrs
+        with self.lock:
+            self.spans.append(entry)
+
+    def report(self):
+        with self.lock:
+            spans = list(self.spans)
+        summary = {}
+        for entry in spans:
+            totals = summary.setdefault(entry["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "max_wall_s": 0.0})
+            totals["count"] += 1
+            totals["wall_s"] = round(totals["wall_s"] + entry["wall_s"], 6)
+            totals["cpu_s"] = round(totals["cpu_s"] + entry["cpu_s"], 6)
+            totals["max_wall_s"] = max(totals["max_wall_s"], entry["wall_s"])
+        children_cpu = children_cpu_s()
+        return {
+            "run": self.name,
+            "started_at": self.wall_clock,
+            "wall_s": round(time.perf_counter() - self.origin, 3),
+            "cpu_s": round(time.process_time() - self.cpu_origin, 3),
+            "children_cpu_s": round(children_cpu - self.children_cpu_origin, 3) if children_cpu is not None else None,
+            "peak_rss_mb": peak_rss_mb(),
+            "metrics": self.metrics,
+            "spans_by_name": summary,
+            "spans": spans,
+        }
+
+    def chrome_trace(self):
+        # Complete ("X") events in microseconds, loadable in chrome://tracing or Perfetto
+        with self.lock:
+            spans = list(self.spans)
+        events = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": self.name}}]
+        for entry in spans:
+            events.append({
+                "name": entry["name"],
+                "ph": "X",
+                "ts": round(entry["start_s"] * 1e6),
+                "dur": round(entry["wall_s"] * 1e6),
+                "pid": self.pid,
+                "tid": entry["thread"],
+                "args": {"cpu_s": entry["cpu_s"], "peak_rss_mb": entry["peak_rss_mb"], **entry.get("attrs", {})},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def span(name, **attrs):
+    recorder = _recorder.get()
+    if recorder is None:
+        return _NULL_SPAN
+    return Span(recorder, name, attrs)
+
+def _write_json(path, value):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(orjson.dumps(value, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS, default=str))
+
+@contextmanager
+def recording(name, report_file=None, trace_file=None, metrics=None):
+    # Records spans for the enclosed run and writes the JSON report and/or
+    # Chrome trace on exit. Without either file nothing is recorded.
+    if report_file is None and trace_file is None:
+        yield None
+        return
+    recorder = Recorder(name, metrics)
+    token = _recorder.set(recorder)
+    try:
+        with span("run"):
+            yield recorder
+    finally:
+        _recorder.reset(token)
+        try:
+            if report_file:
+                _write_json(report_file, recorder.report())
+                logging.info(f"Run report written: {report_file}")
+            if trace_file:
+                _write_json(trace_file, recorder.chrome_trace())
+                logging.info(f"Chrome trace written: {trace_file}")
+        except OSError as e:
+            logging.error(f"Error writing run report: {str(e)}")
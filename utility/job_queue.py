@@ -0,0 +1,242 @@
+import os
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+import orjson
+
+# Durable job queue in SQLite for running the pipeline across worker
+# processes. A job is a chain of stage tasks. A worker claims a ready task
+# of the stages it serves under a lease, extends the lease with heartbeats
+# while it runs, and stores the stage's output as a checkpoint the next
+# stage starts from. A task whose lease expires (its worker died or hung)
+# goes to another worker; failed tasks are retried with backoff up to
+# max_attempts, after which the job fails.
+#
+# Processes on one machine share the database through WAL. Across
+# machines, QUEUE_DB and the job directories must live on shared storage
+# with working file locks.
+
+QUEUE_DB = os.environ.get('QUEUE_DB', '.queue/jobs.sqlite3')
+LEASE_SECONDS = float(os.environ.get('QUEUE_LEASE_SECONDS', '120'))
+MAX_ATTEMPTS = int(os.environ.get('QUEUE_MAX_ATTEMPTS', '3'))
+RETRY_DELAY = float(os.environ.get('QUEUE_RETRY_DELAY', '5'))
+
+STAGES = ["audio", "captions", "footage", "render"]
+# Tasks in these states still need a worker
+OPEN_STATUSES = ("waiting", "ready", "leased")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    params BLOB NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    job_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    not_before REAL NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    checkpoint BLOB,
+    error TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (job_id, stage)
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (stage, status, not_before);
+"""
+
+class JobFailed(Exception):
+    # Raised by a stage to fail its job without retrying, e.g. when the
+    # script produced no captions
+    pass
+
+class JobQueue:
+    def __init__(self, path=QUEUE_DB, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.local = threading.local()
+
+    def connection(self):
+        # One connection per thread, like the Pexels search cache
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't
+        # both read a task as ready and claim it
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+
+    def enqueue(self, name, params, stages=STAGES, max_attempts=None):
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute("INSERT INTO jobs (id, name, params, status, created, updated) VALUES (?, ?, ?, 'queued', ?, ?)",
+                               (job_id, name, orjson.dumps(params), now, now))
+            connection.executemany(
+                "INSERT INTO tasks (job_id, stage, position, status, max_attempts, updated) VALUES (?, ?, ?, ?, ?, ?)",
+                [(job_id, stage, i, "ready" if i == 0 else "waiting", max_attempts or self.max_attempts, now)
+                 for i, stage in enumerate(stages)])
+        return job_id
+
+    def claim(self, stages, owner):
+        # Leases the oldest job's ready task among stages; returns the task
+        # with its job's params and the checkpoints of its earlier stages, or None
+        now = time.time()
+        placeholders = ",".join("?" * len(stages))
+        with self.transaction() as connection:
+            expired = connection.execute(
+                f"SELECT job_id, stage, attempts, max_attempts, lease_owner FROM tasks "
+                f"WHERE stage IN ({placeholders}) AND status = 'leased' AND lease_expires < ?", (*stages, now)).fetchall()
+            for job_id, stage, attempts, max_attempts, previous in expired:
+                logging.warning(f"Lease of {previous} on {job_id}/{stage} expired")
+                self._retry_or_fail(connection, job_id, stage, attempts, max_attempts, f"lease of {previous} expired", now, delay=0)
+
+            row = connection.execute(
+                f"SELECT t.job_id, t.stage, t.attempts, j.name, j.params FROM tasks t JOIN jobs j ON j.id = t.job_id "
+                f"WHERE t.stage IN ({placeholders}) AND t.status = 'ready' AND t.not_before <= ? "
+                f"ORDER BY j.created, t.position LIMIT 1", (*stages, now)).fetchone()
+            if row is None:
+                return None
+            job_id, stage, attempts, name, params = row
+            connection.execute(
+                "UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_owner = ?, lease_expires = ?, updated = ? "
+                "WHERE job_id = ? AND stage = ?", (owner, now + self.lease_seconds, now, job_id, stage))
+            connection.execute("UPDATE jobs SET status = 'running', updated = ? WHERE id = ?", (now, job_id))
+            checkpoints = {s: orjson.loads(c) for s, c in connection.execute(
+                "SELECT stage, checkpoint FROM tasks WHERE job_id = ? AND status = 'done'", (job_id,))}
+        return {"job_id": job_id, "name": name, "stage": stage, "attempt": attempts + 1,
+                "params": orjson.loads(params), "checkpoints": checkpoints}
+
+    def heartbeat(self, job_id, stage, owner):
+        # Extends the lease; False once the lease was lost to another worker
+        cursor = self.connection().execute(
+            "UPDATE tasks SET lease_expires = ?, updated = ? WHERE job_id = ? AND stage = ? AND status = 'leased' AND lease_owner = ?",
+            (time.time() + self.lease_seconds, time.time(), job_id, stage, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, job_id, stage, owner, checkpoint):
+        # Stores the checkpoint and readies the next stage; False (and
+        # nothing stored) if the lease was lost
+        now = time.time()
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "UPDATE tasks SET status = 'done', checkpoint = ?, lease_owner = NULL, lease_expires = NULL, error = NULL, updated = ? "
+                "WHERE job_id = ? AND stage = ? AND status = 'leased' AND lease_owner = ?",
+                (orjson.dumps(checkpoint), now, job_id, stage, owner))
+            if cursor.rowcount != 1:
+                return False
+            position = connection.execute("SELECT position FROM tasks WHERE job_id = ? AND stage = ?", (job_id, stage)).fetchone()[0]
+            cursor = connection.execute("UPDATE tasks SET status = 'ready', not_before = 0, updated = ? "
+                                        "WHERE job_id = ? AND position = ? AND status = 'waiting'", (now, job_id, position + 1))
+            if cursor.rowcount == 0:
+                connection.execute("UPDATE jobs SET status = 'done', error = NULL, updated = ? WHERE id = ?", (now, job_id))
+        return True
+
+    def fail(self, job_id, stage, owner, error, retry=True):
+        # Retries with exponential backoff until max_attempts, then fails the job
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute("SELECT attempts, max_attempts FROM tasks WHERE job_id = ? AND stage = ? "
+                                     "AND status = 'leased' AND lease_owner = ?", (job_id, stage, owner)).fetchone()
+            if row is None:
+                return False
+            attempts, max_attempts = row
+            self._retry_or_fail(connection, job_id, stage, attempts if retry else max_attempts, max_attempts, error, now)
+        return True
+
+    def release(self, job_id, stage, owner):
+        # Hands a task back without counting the attempt, for worker shutdown
+        cursor = self.connection().execute(
+            "UPDATE tasks SET status = 'ready', attempts = attempts - 1, lease_owner = NULL, lease_expires = NULL, updated = ? "
+            "WHERE job_id = ? AND stage = ? AND status = 'leased' AND lease_owner = ?", (time.time(), job_id, stage, owner))
+        return cursor.rowcount == 1
+
+    def _retry_or_fail(self, connection, job_id, stage, attempts, max_attempts, error, now, delay=None):
+        if attempts < max_attempts:
+            delay = self.retry_delay * 2 ** (attempts - 1) if delay is None else delay
+            connection.execute(
+                "UPDATE tasks SET status = 'ready', not_before = ?, lease_owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+                "WHERE job_id = ? AND stage = ?", (now + delay, error, now, job_id, stage))
+            return
+        connection.execute("UPDATE tasks SET status = 'failed', lease_owner = NULL, lease_expires = NULL, error = ?, updated = ? "
+                           "WHERE job_id = ? AND stage = ?", (error, now, job_id, stage))
+        connection.execute("UPDATE tasks SET status = 'cancelled', updated = ? WHERE job_id = ? AND status = 'waiting'", (now, job_id))
+        connection.execute("UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?", (f"{stage}: {error}", now, job_id))
+
+    def requeue(self, job_id):
+        # Restarts a failed job from its failed stage; finished stages keep their checkpoints
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute("SELECT MIN(position) FROM tasks WHERE job_id = ? AND status = 'failed'", (job_id,)).fetchone()
+            if row is None or row[0] is None:
+                return False
+            connection.execute("UPDATE tasks SET status = 'ready', attempts = 0, not_before = 0, error = NULL, updated = ? "
+                               "WHERE job_id = ? AND position = ?", (now, job_id, row[0]))
+            connection.execute("UPDATE tasks SET status = 'waiting', attempts = 0, updated = ? "
+                               "WHERE job_id = ? AND status = 'cancelled'", (now, job_id))
+            connection.execute("UPDATE jobs SET status = 'queued', error = NULL, updated = ? WHERE id = ?", (now, job_id))
+        return True
+
+    def pending(self, stages=STAGES):
+        # Open tasks among stages, including ones still waiting on an earlier stage
+        placeholders = ",".join("?" * len(stages))
+        return self.connection().execute(
+            f"SELECT COUNT(*) FROM tasks WHERE stage IN ({placeholders}) AND status IN ({','.join('?' * len(OPEN_STATUSES))})",
+            (*stages, *OPEN_STATUSES)).fetchone()[0]
+
+    def jobs(self, status=None):
+        query = "SELECT id, name, status, error, created, updated FROM jobs"
+        rows = self.connection().execute(query + (" WHERE status = ?" if status else "") + " ORDER BY created",
+                                         (status,) if status else ()).fetchall()
+        jobs = []
+        for job_id, name, job_status, error, created, updated in rows:
+            tasks = self.connection().execute(
+                "SELECT stage, status, attempts, error, checkpoint FROM tasks WHERE job_id = ? ORDER BY position", (job_id,)).fetchall()
+            jobs.append({
+                "id": job_id, "name": name, "status": job_status, "error": error,
+                "wall_s": round(updated - created, 3),
+                "tasks": [{"stage": stage, "status": task_status, "attempts": attempts, "error": task_error,
+                           "timings": orjson.loads(checkpoint).get("timings") if checkpoint else None}
+                          for stage, task_status, attempts, task_error, checkpoint in tasks],
+            })
+        return jobs
+
+    def get_stats(self):
+        connection = self.connection()
+        tasks = {}
+        for stage, status, count in connection.execute("SELECT stage, status, COUNT(*) FROM tasks GROUP BY stage, status"):
+            tasks.setdefault(stage, {})[status] = count
+        return {
+            "jobs": dict(connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()),
+            "tasks": tasks,
+        }
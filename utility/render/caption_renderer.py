@@ -0,0 +1,109 @@
+import os
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from moviepy.editor import ImageClip
+
+FRAME_SIZE = (1920, 1080)
+CAPTION_FONT = os.environ.get('CAPTION_FONT', 'DejaVuSans.ttf')
+CAPTION_FONT_SIZE = 50
+CAPTION_COLOR = "white"
+CAPTION_STROKE_COLOR = "black"
+CAPTION_STROKE_WIDTH = 2
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+_fonts = {}
+
+def load_font(font, font_size):
+    try:
+        return ImageFont.truetype(font, font_size)
+    except OSError:
+        logging.warning(f"Caption font not found: {font}, using default font")
+        return ImageFont.load_default()
+
+def get_font(font, font_size):
+    key = (font, font_size)
+    if key not in _fonts:
+        _fonts[key] = load_font(font, font_size)
+    return _fonts[key]
+
+def wrap_text(text, font, max_width, draw, stroke_width):
+    lines = []
+    current = ""
+    for word in text.split():
+        candidate = f"{current} {word}" if current else word
+        if current and draw.textlength(candidate, font=font) + 2 * stroke_width > max_width:
+            lines.append(current)
+            current = word
+        else:
+            current = candidate
+    if current:
+        lines.append(current)
+    return "\n".join(lines)
+
+def rasterize_caption(text, font=CAPTION_FONT, font_size=CAPTION_FONT_SIZE, stroke_width=CAPTION_STROKE_WIDTH,
+                      color=CAPTION_COLOR, stroke_color=CAPTION_STROKE_COLOR, max_width=FRAME_SIZE[0]):
+    # Returns (rgb, mask) arrays cropped to the text's bounding box
+    pil_font = get_font(font, font_size)
+    scratch = ImageDraw.Draw(Image.new("L", (1, 1)))
+    wrapped = wrap_text(text, pil_font, max_width, scratch, stroke_width)
+    left, top, right, bottom = scratch.multiline_textbbox((0, 0), wrapped, font=pil_font, align="center", stroke_width=stroke_width)
+    width, height = max(right - left, 1), max(bottom - top, 1)
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    ImageDraw.Draw(image).multiline_text((-left, -top), wrapped, font=pil_font, fill=color, align="center",
+                                         stroke_width=stroke_width, stroke_fill=stroke_color)
+    rgba = np.asarray(image)
+    rgb = np.ascontiguousarray(rgba[:, :, :3])
+    mask = rgba[:, :, 3].astype(np.float32) / 255
+    return rgb, mask
+
+def get_caption_raster(text, font=CAPTION_FONT, font_size=CAPTION_FONT_SIZE, stroke_width=CAPTION_STROKE_WIDTH):
+    global _cache_bytes
+    key = (text, font, font_size, stroke_width)
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return _cache[key]
+
+    raster = rasterize_caption(text, font, font_size, stroke_width)
+    size = raster[0].nbytes + raster[1].nbytes
+
+    with _lock:
+        _stats["misses"] += 1
+        if key not in _cache:
+            _cache[key] = raster
+            _cache_bytes += size
+            while _cache_bytes > CACHE_MAX_BYTES and len(_cache) > 1:
+                _, (rgb, mask) = _cache.popitem(last=False)
+                _cache_bytes -= rgb.nbytes + mask.nbytes
+                _stats["evictions"] += 1
+    return raster
+
+def get_caption_cache_stats():
+    with _lock:
+        return dict(_stats, entries=len(_cache), bytes=_cache_bytes)
+
+def clear_caption_cache():
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _cache_bytes = 0
+
+def caption_position(raster_size, frame_size=FRAME_SIZE):
+    # Centre of the frame, where the full-frame caption TextClip drew its text
+    width, height = raster_size
+    return ((frame_size[0] - width) // 2, (frame_size[1] - height) // 2)
+
+def make_caption_clip(text, t1, t2, font=CAPTION_FONT, font_size=CAPTION_FONT_SIZE, stroke_width=CAPTION_STROKE_WIDTH):
+    rgb, mask = get_caption_raster(text, font, font_size, stroke_width)
+    clip = ImageClip(rgb).set_mask(ImageClip(mask, ismask=True))
+    position = caption_position((rgb.shape[1], rgb.shape[0]))
+    return clip.set_start(t1).set_end(t2).set_position(position)
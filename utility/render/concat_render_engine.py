@@ -0,0 +1,110 @@
+import os
+import shutil
+import logging
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from utility.render.render_engine import fetch_video_file, combine_video_segments, get_ffmpeg_path, probe_duration
+from utility.render.ffmpeg_render_engine import write_ass_subtitles, escape_filter_path
+from utility.render.footage_normalizer import (VIDEO_FPS, NORMALIZE_WORKERS, frame_count, segment_frames,
+                                               encode_args, normalize_clip)
+from utility.render.output_sink import as_sink
+
+# Assembles the video from normalized segments with the concat demuxer.
+# Segments without captions are stream-copied; only segments that show a
+# caption are re-encoded, with the captions burned in on segment-local time.
+# CONCAT_CAPTIONS=track adds the captions as a subtitle track instead, so
+# no frame is re-encoded at all.
+
+CONCAT_CAPTIONS = os.environ.get('CONCAT_CAPTIONS', 'burn')
+
+def frame_timeline(entries, files, total_duration, fps=VIDEO_FPS):
+    # Returns (t1, t2, frames, source or None) covering [0, total_duration)
+    # on the frame grid; gaps and the tail after the last clip are black
+    timeline = []
+    cursor = 0
+    for ((t1, t2), _), source in sorted(zip(entries, files), key=lambda item: item[0][0][0]):
+        if source is None:
+            continue
+        t1 = max(t1, cursor)
+        frames = segment_frames(t1, t2, total_duration, fps)
+        if frames <= 0:
+            continue
+        if frame_count(cursor, t1, fps) > 0:
+            timeline.append((cursor, t1, frame_count(cursor, t1, fps), None))
+        t2 = min(t2, total_duration)
+        timeline.append((t1, t2, frames, source))
+        cursor = t2
+    if frame_count(cursor, total_duration, fps) > 0:
+        timeline.append((cursor, total_duration, frame_count(cursor, total_duration, fps), None))
+    return timeline
+
+def segment_captions(timed_captions, t1, t2):
+    # Captions overlapping [t1, t2), shifted to segment-local time
+    return [((max(c1, t1) - t1, min(c2, t2) - t1), text) for (c1, c2), text in timed_captions if c1 < t2 and c2 > t1]
+
+def burn_captions(segment_file, captions, output_file, fps=VIDEO_FPS):
+    subtitles_file = tempfile.NamedTemporaryFile(delete=False, suffix=".ass").name
+    try:
+        write_ass_subtitles(captions, subtitles_file)
+        subprocess.run([get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error", "-i", segment_file,
+                        "-vf", f"subtitles='{escape_filter_path(subtitles_file)}'",
+                        *encode_args(fps), output_file],
+                       check=True, capture_output=True)
+    finally:
+        os.remove(subtitles_file)
+    return output_file
+
+def get_output_media_concat(audio_file_path, timed_captions, background_video_data, video_server,
+                            output_file="rendered_video.mp4", workers=NORMALIZE_WORKERS, captions=None):
+    captions = captions or CONCAT_CAPTIONS
+    total_duration = probe_duration(audio_file_path)
+    if not total_duration:
+        logging.error(f"Error loading audio file: {audio_file_path}")
+        return None
+
+    entries = [(interval, url) for interval, url in background_video_data if url]
+    with ThreadPoolExecutor() as executor:
+        files = list(executor.map(fetch_video_file, [url for _, url in entries], [t2 - t1 for (t1, t2), _ in entries]))
+    timeline = frame_timeline(entries, files, total_duration)
+
+    sink = as_sink(output_file)
+    output_path = getattr(sink, "path", None)
+    work_dir = tempfile.mkdtemp(prefix="segments_", dir=os.path.dirname(os.path.abspath(output_path)) if output_path else None)
+    sink.start_encode()
+    try:
+        # Normalized segments usually exist already: the footage pipeline
+        # normalizes clips as they download
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            segments = list(executor.map(lambda entry: normalize_clip(entry[3], entry[2]), timeline))
+            if any(segment is None for segment in segments):
+                raise RuntimeError("footage normalization failed")
+
+            jobs = []
+            subtitles_file = None
+            if captions == "track":
+                if timed_captions:
+                    subtitles_file = write_ass_subtitles(timed_captions, os.path.join(work_dir, "captions.ass"))
+            else:
+                for i, ((t1, t2, frames, _), segment) in enumerate(zip(timeline, segments)):
+                    shown = segment_captions(timed_captions or [], t1, t2)
+                    if shown:
+                        jobs.append((i, executor.submit(burn_captions, segment, shown, os.path.join(work_dir, f"segment_{i:05d}.mp4"))))
+            for i, job in jobs:
+                segments[i] = job.result()
+
+        copied = len(segments) - len(jobs)
+        logging.info(f"Concat render: {len(segments)} segments, {copied} stream-copied, {len(jobs)} captioned")
+        sink.finish_encode(sum(timeline[i][2] for i, _ in jobs))
+        sink.metrics["segments_copied"] = copied
+        return combine_video_segments(segments, sink, audio_file=audio_file_path, subtitles_file=subtitles_file)
+    except subprocess.CalledProcessError as e:
+        sink.abort()
+        logging.error(f"Error rendering final video: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    except Exception as e:
+        sink.abort()
+        logging.error(f"Error rendering final video: {str(e)}")
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
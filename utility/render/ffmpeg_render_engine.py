@@ -0,0 +1,155 @@
+import os
+import subprocess
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from utility.render.render_engine import fetch_video_file, get_ffmpeg_path, probe_duration
+from utility.render.output_sink import as_sink
+
+VIDEO_SIZE = (1920, 1080)
+VIDEO_FPS = 30
+CAPTION_FONT = "Courier"
+CAPTION_FONT_SIZE = 50
+CAPTION_STROKE_WIDTH = 2
+# Draft renders for review: same timeline and caption layout, a fraction of the pixels
+DRAFT_SIZE = (640, 360)
+DRAFT_FPS = 15
+DRAFT_PRESET = "ultrafast"
+
+def format_ass_time(seconds):
+    centiseconds = int(round(max(seconds, 0) * 100))
+    hours, centiseconds = divmod(centiseconds, 360000)
+    minutes, centiseconds = divmod(centiseconds, 6000)
+    secs, centiseconds = divmod(centiseconds, 100)
+    return f"{hours}:{minutes:02d}:{secs:02d}.{centiseconds:02d}"
+
+def escape_ass_text(text):
+    return text.replace('\\', '\\\\').replace('{', '\\{').replace('}', '\\}').replace('\n', '\\N')
+
+def write_ass_subtitles(timed_captions, filename, size=VIDEO_SIZE, font_size=CAPTION_FONT_SIZE):
+    width, height = size
+    lines = [
+        "[Script Info]",
+        "ScriptType: v4.00+",
+        f"PlayResX: {width}",
+        f"PlayResY: {height}",
+        "WrapStyle: 0",
+        "",
+        "[V4+ Styles]",
+        "Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding",
+        # Alignment 5 = middle centre, same placement as the full-frame caption TextClip
+        f"Style: Caption,{CAPTION_FONT},{font_size},&H00FFFFFF,&H00FFFFFF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,{CAPTION_STROKE_WIDTH},0,5,20,20,20,1",
+        "",
+        "[Events]",
+        "Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text",
+    ]
+    for (t1, t2), text in timed_captions:
+        lines.append(f"Dialogue: 0,{format_ass_time(t1)},{format_ass_time(t2)},Caption,,0,0,0,,{escape_ass_text(text)}")
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    return filename
+
+def escape_filter_path(path):
+    # Paths inside a filter graph need ':' '\' and quotes escaped
+    return path.replace('\\', '/').replace(':', '\\:').replace("'", "\\'")
+
+def build_timeline(background_video_data, video_files):
+    # Returns (start, end, filename or None) entries covering the timeline
+    # from 0 with no overlap; gaps are filled with black like the composite.
+    timeline = []
+    cursor = 0
+    for ((t1, t2), _), filename in sorted(zip(background_video_data, video_files), key=lambda item: item[0][0][0]):
+        if filename is None:
+            continue
+        t1 = max(t1, cursor)
+        if t2 <= t1:
+            continue
+        if t1 > cursor:
+            timeline.append((cursor, t1, None))
+        timeline.append((t1, t2, filename))
+        cursor = t2
+    return timeline
+
+def build_ffmpeg_command(audio_file_path, timeline, subtitles_file, output, size=VIDEO_SIZE, fps=VIDEO_FPS, preset="medium", ffmpeg_path=None):
+    width, height = size
+    command = [ffmpeg_path or get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error"]
+    filters = []
+    labels = []
+    input_index = 0
+
+    for i, (t1, t2, filename) in enumerate(timeline):
+        duration = t2 - t1
+        label = f"v{i}"
+        if filename is None:
+            filters.append(f"color=c=black:s={width}x{height}:r={fps}:d={duration:.3f},setsar=1[{label}]")
+        else:
+            # Limit demuxing to the span we use; range downloads only hold that much.
+            # Clips shorter than the span hold their last frame, so later
+            # segments stay on the caption timeline.
+            command += ["-t", f"{duration + 0.5:.3f}", "-i", filename]
+            filters.append(
+                f"[{input_index}:v]tpad=stop_mode=clone:stop_duration={duration:.3f},"
+                f"trim=start=0:duration={duration:.3f},setpts=PTS-STARTPTS,"
+                f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},"
+                f"fps={fps},setsar=1[{label}]"
+            )
+            input_index += 1
+        labels.append(f"[{label}]")
+
+    audio_index = input_index
+    command += ["-i", audio_file_path]
+
+    if labels:
+        filters.append(f"{''.join(labels)}concat=n={len(labels)}:v=1:a=0[bg]")
+    else:
+        filters.append(f"color=c=black:s={width}x{height}:r={fps},setsar=1[bg]")
+
+    # Pad with black until the audio ends, as the composite uses the audio duration
+    video_chain = "[bg]tpad=stop=-1:color=black"
+    if subtitles_file:
+        video_chain += f",subtitles='{escape_filter_path(subtitles_file)}'"
+    filters.append(video_chain + ",format=yuv420p[out]")
+
+    command += [
+        "-filter_complex", ";".join(filters),
+        "-map", "[out]", "-map", f"{audio_index}:a",
+        "-c:v", "libx264", "-preset", preset, "-r", str(fps),
+        "-c:a", "aac", "-shortest",
+        *output,
+    ]
+    return command
+
+def get_output_media_ffmpeg(audio_file_path, timed_captions, background_video_data, video_server, output_file="rendered_video.mp4",
+                            size=VIDEO_SIZE, fps=VIDEO_FPS, preset="medium"):
+    entries = [(interval, url) for interval, url in background_video_data if url]
+    with ThreadPoolExecutor() as executor:
+        video_files = list(executor.map(fetch_video_file, [url for _, url in entries], [t2 - t1 for (t1, t2), _ in entries]))
+
+    timeline = build_timeline(entries, video_files)
+    subtitles_file = tempfile.NamedTemporaryFile(delete=False, suffix=".ass").name
+    sink = as_sink(output_file)
+    try:
+        # Captions are laid out on the full-size canvas; libass rasterizes them at the output size
+        write_ass_subtitles(timed_captions or [], subtitles_file)
+        output_args, target = sink.ffmpeg_output()
+        command = build_ffmpeg_command(audio_file_path, timeline, subtitles_file, [*output_args, target], size, fps, preset)
+        logging.info(f"Rendering with ffmpeg: {len(timeline)} timeline entries, {len(timed_captions or [])} captions")
+        sink.start_encode()
+        sink.run_ffmpeg(command)
+        sink.finish_encode(int(round((probe_duration(audio_file_path) or 0) * fps)))
+        return sink.commit()
+    except subprocess.CalledProcessError as e:
+        sink.abort()
+        logging.error(f"Error rendering final video with ffmpeg: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    except Exception as e:
+        sink.abort()
+        logging.error(f"Error rendering final video with ffmpeg: {str(e)}")
+        return None
+    finally:
+        if os.path.exists(subtitles_file):
+            os.remove(subtitles_file)
+
+def get_output_media_draft(audio_file_path, timed_captions, background_video_data, video_server, output_file="draft_video.mp4"):
+    return get_output_media_ffmpeg(audio_file_path, timed_captions, background_video_data, video_server, output_file,
+                                   size=DRAFT_SIZE, fps=DRAFT_FPS, preset=DRAFT_PRESET)
@@ -0,0 +1,193 @@
+import os
+import glob
+import math
+import hashlib
+import logging
+import tempfile
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from utility.render.range_download import download_partial
+
+CACHE_DIRECTORY = os.environ.get('FOOTAGE_CACHE_DIR', '.cache/footage')
+CACHE_MAX_BYTES = int(os.environ.get('FOOTAGE_CACHE_MAX_MB', '10240')) * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+RANGE_DOWNLOADS = os.environ.get('FOOTAGE_RANGE_DOWNLOADS', '1') == '1'
+# Once the cache passes CACHE_MAX_BYTES it is trimmed to this fraction of
+# it, so a full cache is walked once per batch of downloads, not per miss
+EVICT_TARGET = 0.9
+# Query parameters that only track the click; others, like profile_id or
+# quality on legacy Pexels/Vimeo links, select the rendition and stay
+TRACKING_PARAMS = {"utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "fbclid", "gclid", "ref"}
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+}
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "bytes_downloaded": 0, "bytes_saved": 0, "partial_downloads": 0}
+# Running size of each cache directory, measured by the first evict() walk
+_cache_bytes = {}
+
+def normalize_link(url):
+    # Pexels links carry tracking params that don't change the file
+    parts = urlsplit(url.strip())
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if name.lower() not in TRACKING_PARAMS)
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path, urlencode(query), ''))
+
+def cache_key(url):
+    return hashlib.sha256(normalize_link(url).encode('utf-8')).hexdigest()
+
+def cache_path(url, seconds=None):
+    # Partial downloads covering the first N seconds are stored as <key>.p<N>.mp4
+    key = cache_key(url)
+    suffix = ".mp4" if seconds is None else f".p{seconds}.mp4"
+    return os.path.join(CACHE_DIRECTORY, key[:2], key + suffix)
+
+def find_cached(url, duration=None):
+    path = cache_path(url)
+    if os.path.exists(path):
+        return path
+    if duration is None:
+        return None
+    needed = math.ceil(duration)
+    for candidate in glob.glob(cache_path(url, "*")):
+        try:
+            covered = int(candidate.rsplit(".p", 1)[1][:-len(".mp4")])
+        except ValueError:
+            continue
+        if covered >= needed:
+            return candidate
+    return None
+
+def disk_usage(st):
+    # Partial downloads are sparse files, so count allocated blocks where available
+    blocks = getattr(st, "st_blocks", None)
+    return min(st.st_size, blocks * 512) if blocks is not None else st.st_size
+
+def get_cache_stats():
+    with _lock:
+        return dict(_stats)
+
+def _record(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+def stream_to_file(url, filename, session=None):
+    # Streams the response body to disk in CHUNK_SIZE pieces, writing to a
+    # temp file in the same directory and renaming it into place on success.
+    directory = os.path.dirname(filename) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    written = 0
+    try:
+        getter = session.get if session is not None else requests.get
+        with getter(url, headers=HEADERS, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            response.raise_for_status()
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        written += len(chunk)
+        os.replace(tmp_path, filename)
+        return written
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _add_metrics(metrics, **values):
+    if metrics is not None:
+        for name, value in values.items():
+            metrics[name] = metrics.get(name, 0) + value
+
+def fetch(url, session=None, duration=None, metrics=None):
+    # With a duration, only the bytes needed to play the first `duration`
+    # seconds are fetched when the server and file layout allow it
+    path = find_cached(url, duration)
+    if path:
+        try:
+            os.utime(path, None)  # bump mtime so LRU eviction keeps it
+        except OSError:
+            pass
+        _record("hits")
+        _add_metrics(metrics, footage_cache_hits=1)
+        logging.info(f"Footage cache hit: {url}")
+        return path
+
+    _record("misses")
+    _add_metrics(metrics, footage_cache_misses=1)
+    if duration is not None and RANGE_DOWNLOADS:
+        seconds = math.ceil(duration)
+        path = cache_path(url, seconds)
+        result = download_partial(url, path, seconds, HEADERS, session)
+        if result is not None:
+            written, total = result
+            _record("bytes_downloaded", written)
+            _record("bytes_saved", total - written)
+            _record("partial_downloads")
+            _add_metrics(metrics, bytes_downloaded=written, bytes_saved=total - written)
+            logging.info(f"Footage cache miss, fetched {written} of {total} bytes for {seconds}s: {url}")
+            _account(path)
+            return path
+
+    path = cache_path(url)
+    written = stream_to_file(url, path, session=session)
+    _record("bytes_downloaded", written)
+    _add_metrics(metrics, bytes_downloaded=written)
+    logging.info(f"Footage cache miss, downloaded {written} bytes: {url}")
+    _account(path)
+    return path
+
+def _account(path, max_bytes=CACHE_MAX_BYTES):
+    # Adds a new file to the running cache size; the directory is only
+    # walked to measure it the first time and once the total passes max_bytes
+    try:
+        size = disk_usage(os.stat(path))
+    except OSError:
+        size = 0
+    with _lock:
+        known = _cache_bytes.get(CACHE_DIRECTORY)
+        if known is not None:
+            _cache_bytes[CACHE_DIRECTORY] = known + size
+    if known is None or known + size > max_bytes:
+        evict(max_bytes, keep=path)
+
+def evict(max_bytes=CACHE_MAX_BYTES, keep=None, target=EVICT_TARGET):
+    entries = []
+    total = 0
+    for root, _, files in os.walk(CACHE_DIRECTORY):
+        for name in files:
+            if not name.endswith(".mp4"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            size = disk_usage(st)
+            entries.append((st.st_mtime, size, path))
+            total += size
+
+    removed = 0
+    if total > max_bytes:
+        for _, size, path in sorted(entries):
+            if total <= max_bytes * target:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+    with _lock:
+        _cache_bytes[CACHE_DIRECTORY] = total
+    if removed:
+        _record("evictions", removed)
+        logging.info(f"Footage cache evicted {removed} files")
+    return removed
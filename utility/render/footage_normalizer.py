@@ -0,0 +1,98 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+import subprocess
+from utility.render import footage_cache
+from utility.render.render_engine import get_ffmpeg_path
+
+# Transcodes downloaded clips to one canonical format: fixed size, frame
+# rate and pixel format, no audio, an exact frame count and a keyframe on
+# the first frame. Segments in this format can be joined by the concat
+# demuxer without re-encoding. Normalized files live in the footage cache
+# next to their sources and are evicted with them.
+
+VIDEO_SIZE = (1920, 1080)
+VIDEO_FPS = 30
+# High quality, since captioned segments are encoded once more
+NORMALIZE_CRF = 18
+NORMALIZE_PRESET = os.environ.get('NORMALIZE_PRESET', 'veryfast')
+NORMALIZE_WORKERS = int(os.environ.get('NORMALIZE_WORKERS', '0')) or os.cpu_count() or 1
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "normalized": 0, "failures": 0}
+
+def get_normalize_stats():
+    with _lock:
+        return dict(_stats)
+
+def _record(name):
+    with _lock:
+        _stats[name] += 1
+
+def frame_count(t1, t2, fps=VIDEO_FPS):
+    # Frames between t1 and t2 on the output frame grid, so consecutive
+    # segments add up to exactly the frames of the whole timeline
+    return round(t2 * fps) - round(t1 * fps)
+
+def segment_frames(t1, t2, total_duration=None, fps=VIDEO_FPS):
+    # Frames a clip fills from t1 to t2, cut off at the end of the audio. The
+    # footage pipeline and the concat render both count with this, so the
+    # render finds the segments normalized while the footage downloaded.
+    if total_duration is not None:
+        t2 = min(t2, total_duration)
+    return frame_count(t1, t2, fps)
+
+def source_key(source):
+    # A clip's partial downloads (<key>.p<N>.mp4) start with the same frames
+    # as its full download, so normalized segments are keyed by the clip
+    # rather than by whichever of its files the cache returned
+    return os.path.basename(source).split(".", 1)[0] if source else "black"
+
+def encode_args(fps=VIDEO_FPS, preset=NORMALIZE_PRESET, crf=NORMALIZE_CRF):
+    return ["-c:v", "libx264", "-preset", preset, "-crf", str(crf), "-pix_fmt", "yuv420p",
+            "-r", str(fps), "-force_key_frames", "expr:eq(n,0)", "-an"]
+
+def normalized_path(source, frames, size=VIDEO_SIZE, fps=VIDEO_FPS, preset=NORMALIZE_PRESET):
+    identity = f"{source_key(source)}:{frames}:{size[0]}x{size[1]}@{fps}:{preset}:{NORMALIZE_CRF}"
+    key = hashlib.sha256(identity.encode('utf-8')).hexdigest()
+    return os.path.join(footage_cache.CACHE_DIRECTORY, "normalized", key[:2], key + ".mp4")
+
+def normalize_command(source, output, frames, size=VIDEO_SIZE, fps=VIDEO_FPS, preset=NORMALIZE_PRESET):
+    width, height = size
+    duration = frames / fps
+    command = [get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error"]
+    if source is None:
+        command += ["-f", "lavfi", "-i", f"color=c=black:s={width}x{height}:r={fps}:d={duration:.3f}", "-vf", "setsar=1"]
+    else:
+        # Clips shorter than the window hold their last frame so the segment keeps its length
+        command += ["-t", f"{duration + 0.5:.3f}", "-i", source, "-vf",
+                    f"scale={width}:{height}:force_original_aspect_ratio=increase,crop={width}:{height},"
+                    f"fps={fps},setsar=1,tpad=stop_mode=clone:stop=-1"]
+    return command + ["-frames:v", str(frames), *encode_args(fps, preset), "-f", "mp4", output]
+
+def normalize_clip(source, frames, size=VIDEO_SIZE, fps=VIDEO_FPS, preset=NORMALIZE_PRESET):
+    # Returns the normalized file for the first `frames` frames of source
+    # (None for black), or None if ffmpeg fails
+    path = normalized_path(source, frames, size, fps, preset)
+    if os.path.exists(path):
+        _record("hits")
+        return path
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Not .mp4, so cache eviction never picks up a file still being written
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    os.close(fd)
+    try:
+        subprocess.run(normalize_command(source, tmp_path, frames, size, fps, preset), check=True, capture_output=True)
+        os.replace(tmp_path, path)
+    except subprocess.CalledProcessError as e:
+        _record("failures")
+        logging.error(f"Error normalizing {source}: {e.stderr.decode(errors='replace').strip()}")
+        return None
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    _record("normalized")
+    return path
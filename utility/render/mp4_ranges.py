@@ -0,0 +1,145 @@
+import struct
+import logging
+
+# Minimal ISO-BMFF (MP4) reader: finds the moov box and works out how many
+# bytes of media data are needed to play the first N seconds of every track.
+
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+class UnsupportedLayout(Exception):
+    pass
+
+def read_box_header(data, offset):
+    # Returns (size, type, header_length); size 0 means "to end of file"
+    if len(data) - offset < 8:
+        raise UnsupportedLayout("truncated box header")
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header = 8
+    if size == 1:
+        if len(data) - offset < 16:
+            raise UnsupportedLayout("truncated large box header")
+        size = struct.unpack_from(">Q", data, offset + 8)[0]
+        header = 16
+    elif size != 0 and size < 8:
+        raise UnsupportedLayout(f"invalid box size {size}")
+    return size, box_type, header
+
+def iter_boxes(data, start=0, end=None):
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type, header = read_box_header(data, offset)
+        box_end = end if size == 0 else offset + size
+        yield box_type, offset + header, min(box_end, end)
+        offset = box_end
+
+def find_child(data, start, end, box_type):
+    for child_type, child_start, child_end in iter_boxes(data, start, end):
+        if child_type == box_type:
+            return child_start, child_end
+    return None
+
+def parse_mdhd_timescale(data, start):
+    version = data[start]
+    return struct.unpack_from(">I", data, start + (20 if version == 1 else 12))[0]
+
+def parse_stts(data, start):
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    values = struct.unpack_from(f">{count * 2}I", data, start + 8)
+    return list(zip(values[0::2], values[1::2]))
+
+def parse_stsc(data, start):
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    values = struct.unpack_from(f">{count * 3}I", data, start + 8)
+    return list(zip(values[0::3], values[1::3]))
+
+def parse_stsz(data, start):
+    sample_size, count = struct.unpack_from(">II", data, start + 4)
+    if sample_size:
+        return sample_size, count, None
+    return 0, count, struct.unpack_from(f">{count}I", data, start + 12)
+
+def parse_chunk_offsets(data, start, wide):
+    count = struct.unpack_from(">I", data, start + 4)[0]
+    return struct.unpack_from(f">{count}{'Q' if wide else 'I'}", data, start + 8)
+
+def samples_before(stts, limit):
+    # Number of samples whose decode time starts before limit (track timescale)
+    samples = 0
+    elapsed = 0
+    for count, delta in stts:
+        if delta == 0:
+            samples += count
+            continue
+        if elapsed + count * delta >= limit:
+            return samples + -(-(limit - elapsed) // delta)
+        samples += count
+        elapsed += count * delta
+    return samples
+
+def track_bytes_needed(data, stbl_start, stbl_end, seconds, timescale):
+    # End offset (exclusive) in the file of the last sample needed to cover
+    # the first `seconds` of this track
+    stts = find_child(data, stbl_start, stbl_end, b"stts")
+    stsc = find_child(data, stbl_start, stbl_end, b"stsc")
+    stsz = find_child(data, stbl_start, stbl_end, b"stsz")
+    stco = find_child(data, stbl_start, stbl_end, b"stco")
+    co64 = find_child(data, stbl_start, stbl_end, b"co64")
+    if not (stts and stsc and stsz and (stco or co64)):
+        raise UnsupportedLayout("missing sample tables")
+
+    sample_size, sample_count, sizes = parse_stsz(data, stsz[0])
+    offsets = parse_chunk_offsets(data, (stco or co64)[0], wide=stco is None)
+    if not sample_count or not offsets:
+        return 0
+    needed = min(samples_before(parse_stts(data, stts[0]), int(seconds * timescale)), sample_count)
+    last = max(needed - 1, 0)
+
+    # Walk stsc runs to find the chunk holding the last needed sample
+    runs = parse_stsc(data, stsc[0])
+    first_sample = 0
+    for i, (first_chunk, per_chunk) in enumerate(runs):
+        next_chunk = runs[i + 1][0] if i + 1 < len(runs) else len(offsets) + 1
+        run_samples = (next_chunk - first_chunk) * per_chunk
+        if last < first_sample + run_samples:
+            chunk = first_chunk - 1 + (last - first_sample) // per_chunk
+            chunk_first_sample = first_sample + ((last - first_sample) // per_chunk) * per_chunk
+            break
+        first_sample += run_samples
+    else:
+        raise UnsupportedLayout("sample outside chunk table")
+
+    if chunk >= len(offsets):
+        raise UnsupportedLayout("chunk outside offset table")
+    if sizes is None:
+        used = (last - chunk_first_sample + 1) * sample_size
+    else:
+        used = sum(sizes[chunk_first_sample:last + 1])
+    return offsets[chunk] + used
+
+def bytes_needed(moov, seconds):
+    # moov is the payload of the moov box; returns the largest end offset over all tracks
+    end = 0
+    tracks = 0
+    for box_type, start, stop in iter_boxes(moov):
+        if box_type == b"mvex":
+            raise UnsupportedLayout("fragmented mp4")
+        if box_type != b"trak":
+            continue
+        mdia = find_child(moov, start, stop, b"mdia")
+        mdhd = mdia and find_child(moov, mdia[0], mdia[1], b"mdhd")
+        minf = mdia and find_child(moov, mdia[0], mdia[1], b"minf")
+        stbl = minf and find_child(moov, minf[0], minf[1], b"stbl")
+        if not (mdhd and stbl):
+            raise UnsupportedLayout("track without sample tables")
+        try:
+            timescale = parse_mdhd_timescale(moov, mdhd[0])
+            end = max(end, track_bytes_needed(moov, stbl[0], stbl[1], seconds, timescale))
+        except struct.error as e:
+            # Entry counts that run past the box, e.g. a truncated or corrupt moov
+            raise UnsupportedLayout(f"corrupt sample tables: {str(e)}")
+        tracks += 1
+    if not tracks:
+        raise UnsupportedLayout("no tracks")
+    logging.debug(f"{tracks} tracks need {end} bytes for {seconds}s")
+    return end
@@ -0,0 +1,134 @@
+import os
+import time
+import logging
+import tempfile
+import subprocess
+from abc import ABC, abstractmethod
+
+CHUNK_SIZE = 1024 * 1024
+# Fragmented MP4 can be written front to back, which a pipe requires
+STREAMABLE_MP4_ARGS = ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+
+class OutputSink(ABC):
+    # Where a render backend writes the finished video. Encoders write to
+    # target(); commit() publishes the result, abort() discards it.
+    def __init__(self):
+        self.metrics = {"bytes_written": 0, "frames_encoded": 0, "encode_seconds": 0.0, "encode_fps": 0.0}
+        self._encode_start = None
+
+    def start_encode(self):
+        self._encode_start = time.perf_counter()
+
+    def finish_encode(self, frames):
+        elapsed = time.perf_counter() - (self._encode_start or time.perf_counter())
+        self.metrics["frames_encoded"] += frames
+        self.metrics["encode_seconds"] = round(self.metrics["encode_seconds"] + elapsed, 3)
+        if self.metrics["encode_seconds"]:
+            self.metrics["encode_fps"] = round(self.metrics["frames_encoded"] / self.metrics["encode_seconds"], 1)
+
+    @abstractmethod
+    def target(self):
+        pass
+
+    def ffmpeg_output(self):
+        # Extra ffmpeg output options and the output argument
+        return [], self.target()
+
+    def run_ffmpeg(self, command):
+        subprocess.run(command, check=True, capture_output=True)
+
+    @abstractmethod
+    def commit(self):
+        pass
+
+    def abort(self):
+        pass
+
+class FileSink(OutputSink):
+    # Writes to a unique temp file next to path and renames it into place,
+    # so readers never see a partial file and concurrent jobs can't collide
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._tmp_path = None
+
+    def target(self):
+        if self._tmp_path is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            base, ext = os.path.splitext(os.path.basename(self.path))
+            fd, self._tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{base}.", suffix=ext or ".mp4")
+            os.close(fd)
+        return self._tmp_path
+
+    def ffmpeg_output(self):
+        return ["-movflags", "+faststart"], self.target()
+
+    def commit(self):
+        self.metrics["bytes_written"] = os.path.getsize(self._tmp_path)
+        os.replace(self._tmp_path, self.path)
+        self._tmp_path = None
+        logging.info(f"Output written: {self.path} {self.metrics}")
+        return self.path
+
+    def abort(self):
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+
+class StreamSink(OutputSink):
+    # Sends the video to a writable binary stream (pipe, socket file, upload
+    # body). ffmpeg encodes straight into it as fragmented MP4; encoders that
+    # need a seekable file go through a temp file that is streamed on commit.
+    def __init__(self, stream, name="stream"):
+        super().__init__()
+        self.stream = stream
+        self.name = name
+        self._tmp_path = None
+
+    def target(self):
+        if self._tmp_path is None:
+            fd, self._tmp_path = tempfile.mkstemp(suffix=".mp4")
+            os.close(fd)
+        return self._tmp_path
+
+    def ffmpeg_output(self):
+        return list(STREAMABLE_MP4_ARGS), "pipe:1"
+
+    def run_ffmpeg(self, command):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            self._copy(process.stdout)
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read()
+            process.stderr.close()
+            if process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+
+    def _copy(self, source):
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.stream.write(chunk)
+            self.metrics["bytes_written"] += len(chunk)
+
+    def commit(self):
+        if self._tmp_path is not None:
+            with open(self._tmp_path, 'rb') as f:
+                self._copy(f)
+            os.remove(self._tmp_path)
+            self._tmp_path = None
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+        logging.info(f"Output streamed to {self.name}: {self.metrics}")
+        return self.name
+
+    def abort(self):
+        if self._tmp_path and os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+        self._tmp_path = None
+
+def as_sink(output):
+    return output if isinstance(output, OutputSink) else FileSink(output)
@@ -0,0 +1,136 @@
+import os
+import logging
+import tempfile
+import requests
+from utility.render import mp4_ranges
+
+PROBE_SIZE = 64 * 1024
+MARGIN_SECONDS = 1.0
+MAX_TOP_LEVEL_BOXES = 64
+# Not worth the extra round trips if we'd fetch most of the file anyway
+MAX_PARTIAL_FRACTION = 0.8
+CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_TIMEOUT = 60
+
+class RangeNotSupported(Exception):
+    pass
+
+def get_range(url, start, end, headers, session=None, stream=False):
+    # Fetches bytes [start, end); raises RangeNotSupported unless the server answers 206
+    getter = session.get if session is not None else requests.get
+    response = getter(url, headers={**headers, "Range": f"bytes={start}-{end - 1}"}, stream=True, timeout=DOWNLOAD_TIMEOUT)
+    if response.status_code != 206:
+        response.close()
+        raise RangeNotSupported(f"server answered {response.status_code} to a range request")
+    if stream:
+        return response
+    with response:
+        return response.content, response.headers.get("Content-Range", "")
+
+def parse_total_size(content_range):
+    # "bytes 0-65535/1234567"
+    try:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total)
+    except (IndexError, ValueError):
+        raise RangeNotSupported(f"unusable Content-Range: {content_range!r}")
+
+def locate_moov(url, probe, total, headers, session=None):
+    # Walks the top-level boxes, fetching just the 16-byte headers that fall
+    # outside the probe, and returns the moov box's (offset, size)
+    offset = 0
+    for _ in range(MAX_TOP_LEVEL_BOXES):
+        if offset >= total:
+            break
+        if offset + 16 <= len(probe):
+            header = probe[offset:offset + 16]
+        else:
+            header, _ = get_range(url, offset, min(offset + 16, total), headers, session)
+        size, box_type, _ = mp4_ranges.read_box_header(header, 0)
+        if size == 0:
+            size = total - offset
+        if box_type == b"moov":
+            return offset, size
+        if box_type == b"moof":
+            raise mp4_ranges.UnsupportedLayout("fragmented mp4")
+        offset += size
+    raise mp4_ranges.UnsupportedLayout("moov box not found")
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def plan_ranges(url, seconds, headers, session=None):
+    # Returns the merged byte ranges needed to play the first `seconds` of url,
+    # the file size, and the probe and moov bytes already fetched on the way
+    probe, content_range = get_range(url, 0, PROBE_SIZE, headers, session)
+    total = parse_total_size(content_range)
+    moov_offset, moov_size = locate_moov(url, probe, total, headers, session)
+    if moov_offset + moov_size <= len(probe):
+        moov = probe[moov_offset:moov_offset + moov_size]
+    else:
+        moov, _ = get_range(url, moov_offset, moov_offset + moov_size, headers, session)
+    _, _, header = mp4_ranges.read_box_header(moov, 0)
+    data_end = mp4_ranges.bytes_needed(moov[header:], seconds + MARGIN_SECONDS)
+    ranges = merge_ranges([(0, min(data_end, total)), (moov_offset, moov_offset + moov_size)])
+    return ranges, total, probe, moov_offset, moov
+
+def download_partial(url, filename, seconds, headers, session=None):
+    # Writes a sparse copy of url holding the header, the moov box and the
+    # media data for the first `seconds`, at their original offsets, so
+    # decoders can seek and read that span normally. Returns
+    # (bytes_fetched, total_size), or None when a full download should be used.
+    try:
+        ranges, total, probe, moov_offset, moov = plan_ranges(url, seconds, headers, session)
+    except (RangeNotSupported, mp4_ranges.UnsupportedLayout, IndexError, ValueError) as e:
+        logging.info(f"Range download not possible for {url}: {str(e)}")
+        return None
+
+    planned = sum(end - start for start, end in ranges)
+    if planned >= total * MAX_PARTIAL_FRACTION:
+        return None
+
+    directory = os.path.dirname(filename) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    fetched = len(probe)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.truncate(total)
+            for start, end in ranges:
+                # Reuse bytes already fetched while planning
+                if end <= len(probe):
+                    f.seek(start)
+                    f.write(probe[start:end])
+                    continue
+                if start == moov_offset and end == moov_offset + len(moov):
+                    f.seek(start)
+                    f.write(moov)
+                    continue
+                if start < len(probe):
+                    f.seek(start)
+                    f.write(probe[start:])
+                    start = len(probe)
+                f.seek(start)
+                with get_range(url, start, end, headers, session, stream=True) as response:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:
+                            f.write(chunk)
+                            fetched += len(chunk)
+        os.replace(tmp_path, filename)
+    except RangeNotSupported as e:
+        logging.info(f"Range download not possible for {url}: {str(e)}")
+        os.remove(tmp_path)
+        return None
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    if moov_offset + len(moov) > len(probe):
+        fetched += len(moov)
+    return fetched, total
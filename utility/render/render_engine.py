@@ -1,24 +1,23 @@
 import os
-import tempfile
 import platform
 import subprocess
 import logging
-from moviepy.editor import (AudioFileClip, CompositeVideoClip, TextClip, VideoFileClip, concatenate_videoclips)
+import tempfile
 import requests
 from concurrent.futures import ThreadPoolExecutor, as_completed
-import mmap
+import re
+from utility.render import footage_cache
+from utility.render.output_sink import as_sink
+
+# moviepy (and numpy, PIL and IPython with it) is imported only by the
+# functions that composite with it; the ffmpeg-based backends use the
+# helpers here without loading it
 
 def download_file(url, filename):
     try:
-        with open(filename, 'wb') as f:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-            }
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            f.write(response.content)
+        footage_cache.stream_to_file(url, filename)
         return True
-    except requests.RequestException as e:
+    except (requests.RequestException, OSError) as e:
         logging.error(f"Error downloading file from {url}: {str(e)}")
         return False
 
@@ -33,26 +32,44 @@ def get_program_path(program_name):
     program_path = search_program(program_name)
     return program_path
 
+def get_ffmpeg_path():
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return get_program_path("ffmpeg") or "ffmpeg"
+
+def probe_duration(media_path):
+    # Duration in seconds from ffmpeg's input banner, or None
+    result = subprocess.run([get_ffmpeg_path(), "-hide_banner", "-i", media_path], capture_output=True)
+    match = re.search(rb"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def fetch_video_file(video_url, duration=None, metrics=None):
+    try:
+        return footage_cache.fetch(video_url, duration=duration, metrics=metrics)
+    except (requests.RequestException, OSError) as e:
+        logging.error(f"Error downloading file from {video_url}: {str(e)}")
+        return None
+
 def create_video_clip(video_url, t1, t2):
-    video_filename = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
-    if download_file(video_url, video_filename):
+    from moviepy.editor import VideoFileClip
+    video_filename = fetch_video_file(video_url, t2 - t1)
+    if video_filename:
         try:
-            video_clip = VideoFileClip(video_filename).subclip(0, t2-t1)
+            video_clip = VideoFileClip(video_filename, audio=False).subclip(0, t2-t1)
             video_clip = video_clip.set_start(t1).set_end(t2)
             return video_clip
         except Exception as e:
             logging.error(f"Error processing video clip: {str(e)}")
     return None
 
-def get_output_media(audio_file_path, timed_captions, background_video_data, video_server):
-    OUTPUT_FILE_NAME = "rendered_video.mp4"
-    magick_path = get_program_path("magick")
-    logging.info(f"ImageMagick path: {magick_path}")
-    if magick_path:
-        os.environ['IMAGEMAGICK_BINARY'] = magick_path
-    else:
-        os.environ['IMAGEMAGICK_BINARY'] = '/usr/bin/convert'
-    
+def get_output_media(audio_file_path, timed_captions, background_video_data, video_server, output_file="rendered_video.mp4"):
+    from moviepy.editor import AudioFileClip, CompositeVideoClip
+    from utility.render.caption_renderer import make_caption_clip, get_caption_cache_stats
     visual_clips = []
     
     with ThreadPoolExecutor() as executor:
@@ -70,39 +87,67 @@ def get_output_media(audio_file_path, timed_captions, background_video_data, vid
 
     for (t1, t2), text in timed_captions:
         try:
-            text_clip = TextClip(txt=text, fontsize=50, color="white", stroke_width=2, stroke_color="black", method='caption', size=(1920, 1080))
-            text_clip = text_clip.set_start(t1).set_end(t2).set_position(('center', 'bottom'))
-            visual_clips.append(text_clip)
+            visual_clips.append(make_caption_clip(text, t1, t2))
         except Exception as e:
             logging.error(f"Error creating text clip: {str(e)}")
+    logging.info(f"Caption cache stats: {get_caption_cache_stats()}")
 
+    sink = as_sink(output_file)
     try:
         video = CompositeVideoClip(visual_clips, size=(1920, 1080))
         video = video.set_audio(audio_clip)
         video = video.set_duration(audio_clip.duration)
 
-        with open(OUTPUT_FILE_NAME, 'wb') as f:
-            f.write(b'\0' * (1024 * 1024 * 100))  # Pre-allocate 100MB
-        with open(OUTPUT_FILE_NAME, 'r+b') as f:
-            mm = mmap.mmap(f.fileno(), 0)
-            video.write_videofile(mm, codec='libx264', audio_codec='aac', fps=30, threads=4, logger=None)
+        target = sink.target()
+        sink.start_encode()
+        video.write_videofile(target, codec='libx264', audio_codec='aac', fps=30, threads=4, logger=None,
+                              temp_audiofile=os.path.splitext(target)[0] + "_snd.m4a")
+        sink.finish_encode(int(round(video.duration * 30)))
+        result = sink.commit()
     except Exception as e:
+        sink.abort()
         logging.error(f"Error rendering final video: {str(e)}")
         return None
     
-    # Clean up downloaded files
-    for clip in visual_clips:
-        if isinstance(clip, VideoFileClip) and os.path.exists(clip.filename):
-            os.remove(clip.filename)
+    # Downloaded footage lives in the shared footage cache and is reused across renders
+    logging.info(f"Footage cache stats: {footage_cache.get_cache_stats()}")
 
-    return OUTPUT_FILE_NAME
+    return result
 
-def combine_video_segments(segment_videos):
+def combine_video_segments(segment_videos, output_file="final_video.mp4", audio_file=None, subtitles_file=None):
+    # Joins segments that share codec parameters with the ffmpeg concat demuxer,
+    # copying the video stream; audio_file, if given, is muxed in once here,
+    # and subtitles_file is added as a soft subtitle track.
+    # output_file is a path or an OutputSink.
+    sink = as_sink(output_file)
+    list_file = tempfile.NamedTemporaryFile('w', delete=False, suffix=".txt")
     try:
-        clips = [VideoFileClip(video) for video in segment_videos]
-        final_clip = concatenate_videoclips(clips)
-        final_clip.write_videofile("final_video.mp4", codec='libx264', audio_codec='aac', threads=4, logger=None)
-        return "final_video.mp4"
+        with list_file:
+            for video in segment_videos:
+                escaped = os.path.abspath(video).replace("'", "'\\''")
+                list_file.write(f"file '{escaped}'\n")
+        command = [get_ffmpeg_path(), "-y", "-hide_banner", "-loglevel", "error",
+                   "-f", "concat", "-safe", "0", "-i", list_file.name]
+        if audio_file:
+            command += ["-i", audio_file]
+        if subtitles_file:
+            command += ["-i", subtitles_file]
+        command += ["-map", "0:v:0", "-c:v", "copy"]
+        if audio_file:
+            command += ["-map", "1:a:0", "-c:a", "aac", "-shortest"]
+        if subtitles_file:
+            command += ["-map", f"{2 if audio_file else 1}:s:0", "-c:s", "mov_text"]
+        output_args, target = sink.ffmpeg_output()
+        command += [*output_args, target]
+        sink.run_ffmpeg(command)
+        return sink.commit()
+    except subprocess.CalledProcessError as e:
+        sink.abort()
+        logging.error(f"Error combining video segments: {e.stderr.decode(errors='replace').strip()}")
+        return None
     except Exception as e:
+        sink.abort()
         logging.error(f"Error combining video segments: {str(e)}")
-        return None
\ No newline at end of file
+        return None
+    finally:
+        os.remove(list_file.name)
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import logging
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from moviepy.editor import AudioFileClip, ColorClip, CompositeVideoClip, VideoFileClip
+from utility.render.render_engine import fetch_video_file, combine_video_segments
+from utility.render.output_sink import as_sink
+from utility.render import caption_renderer
+from utility.render.caption_renderer import make_caption_clip
+from utility import artifact_store
+
+VIDEO_SIZE = (1920, 1080)
+VIDEO_FPS = 30
+RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', '0')) or os.cpu_count() or 1
+CHUNK_SECONDS = 20
+# Recycle workers so a long video can't grow one process's heap without bound
+CHUNKS_PER_WORKER = 4
+
+def snap(t, fps=VIDEO_FPS):
+    return round(t * fps) / fps
+
+def plan_chunks(segments, total_duration, chunk_seconds=CHUNK_SECONDS, fps=VIDEO_FPS):
+    # Splits [0, total_duration) at segment ends into chunks of at least
+    # chunk_seconds, with boundaries on the frame grid
+    boundaries = [0]
+    for t1, t2, _ in segments:
+        end = snap(t2, fps)
+        if end - boundaries[-1] >= chunk_seconds and end < total_duration:
+            boundaries.append(end)
+    total = snap(total_duration, fps)
+    if total > boundaries[-1]:
+        boundaries.append(total)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+def render_chunk(chunk_file, c0, c1, segments, captions, fps=VIDEO_FPS, size=VIDEO_SIZE, preset="medium"):
+    # Runs in a worker process: composites only the footage and captions
+    # overlapping [c0, c1), on chunk-local time, and encodes it without audio
+    sources = []
+    layers = []
+    try:
+        for t1, t2, path in segments:
+            start, end = max(t1, c0), min(t2, c1)
+            if end <= start:
+                continue
+            offset = start - t1
+            source = VideoFileClip(path, audio=False)
+            sources.append(source)
+            layers.append(source.subclip(offset, offset + (end - start)).set_start(start - c0))
+        for (t1, t2), text in captions:
+            start, end = max(t1, c0), min(t2, c1)
+            if end > start:
+                layers.append(make_caption_clip(text, start - c0, end - c0))
+
+        if not layers:
+            # CompositeVideoClip can't be built from no clips, as in a tail
+            # chunk after the last footage and caption
+            layers.append(ColorClip(size, color=(0, 0, 0), duration=c1 - c0))
+        video = CompositeVideoClip(layers, size=size).set_duration(c1 - c0)
+        video.write_videofile(chunk_file, codec='libx264', fps=fps, preset=preset, audio=False, threads=1, logger=None)
+        return chunk_file
+    finally:
+        for source in sources:
+            source.close()
+
+def chunk_key(c0, c1, segments, captions, fps=VIDEO_FPS, size=VIDEO_SIZE, preset="medium"):
+    # Footage is identified by its cache file name, which hashes the source URL
+    footage = [(t1, t2, os.path.basename(path)) for t1, t2, path in segments]
+    style = (caption_renderer.CAPTION_FONT, caption_renderer.CAPTION_FONT_SIZE, caption_renderer.CAPTION_COLOR,
+             caption_renderer.CAPTION_STROKE_COLOR, caption_renderer.CAPTION_STROKE_WIDTH)
+    return artifact_store.artifact_key("render_chunk", c0, c1, footage, captions, fps, size, preset, style)
+
+def get_output_media_segmented(audio_file_path, timed_captions, background_video_data, video_server,
+                               output_file="rendered_video.mp4", workers=RENDER_WORKERS, chunk_seconds=CHUNK_SECONDS):
+    entries = [((t1, t2), url) for (t1, t2), url in background_video_data if url]
+    with ThreadPoolExecutor() as executor:
+        paths = list(executor.map(fetch_video_file, [url for _, url in entries], [t2 - t1 for (t1, t2), _ in entries]))
+    segments = sorted((t1, t2, path) for ((t1, t2), _), path in zip(entries, paths) if path)
+
+    try:
+        audio_clip = AudioFileClip(audio_file_path)
+        total_duration = audio_clip.duration
+        audio_clip.close()
+    except Exception as e:
+        logging.error(f"Error loading audio file: {str(e)}")
+        return None
+
+    chunks = plan_chunks(segments, total_duration, chunk_seconds)
+    sink = as_sink(output_file)
+    # Keep chunks on the output's filesystem when there is one
+    output_path = getattr(sink, "path", None)
+    work_dir = tempfile.mkdtemp(prefix="chunks_", dir=os.path.dirname(os.path.abspath(output_path)) if output_path else None)
+    logging.info(f"Rendering {len(chunks)} chunks with {workers} workers")
+    sink.start_encode()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=CHUNKS_PER_WORKER) as executor:
+            futures = []
+            chunk_files = []
+            for i, (c0, c1) in enumerate(chunks):
+                chunk_segments = [(t1, t2, path) for t1, t2, path in segments if t1 < c1 and t2 > c0]
+                chunk_captions = [((t1, t2), text) for (t1, t2), text in timed_captions if t1 < c1 and t2 > c0]
+                chunk_file = os.path.join(work_dir, f"chunk_{i:05d}.mp4")
+                chunk_files.append(chunk_file)
+                # Chunks whose footage and captions are unchanged are reused
+                key = chunk_key(c0, c1, chunk_segments, chunk_captions)
+                if artifact_store.load("render_chunk", key, file=chunk_file, metrics=sink.metrics) is None:
+                    futures.append((key, executor.submit(render_chunk, chunk_file, c0, c1, chunk_segments, chunk_captions), c1 - c0))
+            for key, future, duration in futures:
+                chunk_file = future.result()
+                artifact_store.save("render_chunk", key, {"duration": duration}, file=chunk_file)
+        sink.finish_encode(sum(int(round(duration * VIDEO_FPS)) for _, _, duration in futures))
+
+        return combine_video_segments(chunk_files, sink, audio_file=audio_file_path)
+    except Exception as e:
+        sink.abort()
+        logging.error(f"Error rendering final video: {str(e)}")
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -1,8 +1,6 @@
 import os
 import json
-import edge_tts
 import asyncio
-import whisper_timestamped as whisper
 from utility.audio.audio_generator import generate_audio
 from utility.captions.timed_captions_generator import generate_timed_captions
 from utility.video.background_video_generator import generate_video_url
@@ -10,16 +8,25 @@ from utility.render.render_engine import get_output_media
 from utility.video.video_search_query_generator import getVideoSearchQueriesTimed, merge_empty_intervals
 import argparse
 
-# Determine which API client to use
-if len(os.environ.get("GROQ_API_KEY", "")) > 30:
-    from groq import Groq
+# Determine which API client to use; it is built on the first request
+USE_GROQ = len(os.environ.get("GROQ_API_KEY", "")) > 30
+if USE_GROQ:
     model = "mixtral-8x7b-32768"
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
 else:
-    from openai import OpenAI
-    OPENAI_API_KEY = os.getenv('OPENAI_KEY')
     model = "gpt-4o"
-    client = OpenAI(api_key=OPENAI_API_KEY)
+
+_client = None
+
+def get_client():
+    global _client
+    if _client is None:
+        if USE_GROQ:
+            from groq import Groq
+            _client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+        else:
+            from openai import OpenAI
+            _client = OpenAI(api_key=os.getenv('OPENAI_KEY'))
+    return _client
 
 def generate_script(topic, video_type='short'):
     if video_type == 'short':
@@ -79,7 +86,7 @@ def generate_script(topic, video_type='short'):
 
 
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": prompt},
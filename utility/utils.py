@@ -1,7 +1,12 @@
 import os
-from datetime import datetime
-import json
+import glob
+import gzip
+import queue
+import atexit
 import logging
+import threading
+from datetime import datetime
+import orjson
 
 # Log types
 LOG_TYPE_GPT = "GPT"
@@ -11,32 +16,129 @@ LOG_TYPE_PEXEL = "PEXEL"
 DIRECTORY_LOG_GPT = ".logs/gpt_logs"
 DIRECTORY_LOG_PEXEL = ".logs/pexel_logs"
 
+LOG_DIRECTORIES = {LOG_TYPE_GPT: DIRECTORY_LOG_GPT, LOG_TYPE_PEXEL: DIRECTORY_LOG_PEXEL}
+LOG_ROTATE_BYTES = int(os.environ.get('LOG_ROTATE_MB', '64')) * 1024 * 1024
+LOG_COMPRESS = os.environ.get('LOG_COMPRESS', '0') == '1'
+LOG_BATCH_SIZE = 256
+LOG_FLUSH_INTERVAL = 0.5
+
 def ensure_directory_exists(directory):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
+class ResponseLogWriter:
+    # Appends log entries to per-type JSONL files from a background thread.
+    # Files are named <type>_<date>_<seq>.jsonl[.gz] and roll over to the
+    # next seq past LOG_ROTATE_BYTES. Each batch is compressed in memory as
+    # one gzip member; members can be appended, so files stay readable with zcat.
+    def __init__(self, directories=LOG_DIRECTORIES, rotate_bytes=LOG_ROTATE_BYTES, compress=LOG_COMPRESS):
+        self.directories = directories
+        self.rotate_bytes = rotate_bytes
+        self.compress = compress
+        self.queue = queue.SimpleQueue()
+        self.files = {}
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="response-log-writer", daemon=True)
+        self.thread.start()
+
+    def put(self, log_type, entry):
+        with self.idle:
+            self.pending += 1
+        self.queue.put((log_type, entry))
+
+    def flush(self, timeout=None):
+        # Waits until everything enqueued so far is on disk
+        with self.idle:
+            return self.idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < LOG_BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get(timeout=LOG_FLUSH_INTERVAL if len(batch) == 1 else 0))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except Exception as e:
+                logging.error(f"Error logging response: {str(e)}")
+            with self.idle:
+                self.pending -= len(batch)
+                self.idle.notify_all()
+
+    def _write(self, batch):
+        lines = {}
+        for log_type, entry in batch:
+            try:
+                lines.setdefault(log_type, []).append(orjson.dumps(entry, default=str) + b"\n")
+            except TypeError as e:
+                logging.error(f"Error logging response: {str(e)}")
+        for log_type, data in lines.items():
+            try:
+                data = b"".join(data)
+                if self.compress:
+                    data = gzip.compress(data)
+                path = self._path(log_type, len(data))
+                # One write on an O_APPEND descriptor, so batches from other
+                # processes logging to the same file land whole, never interleaved
+                fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    written = os.write(fd, data)
+                    while written < len(data):
+                        written += os.write(fd, data[written:])
+                    self.files[log_type]["size"] = os.fstat(fd).st_size
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                logging.error(f"Error logging response: {str(e)}")
+
+    def _path(self, log_type, incoming):
+        date = datetime.now().strftime("%Y%m%d")
+        suffix = ".jsonl.gz" if self.compress else ".jsonl"
+        state = self.files.get(log_type)
+        if state is None or state["date"] != date:
+            directory = self.directories[log_type]
+            ensure_directory_exists(directory)
+            # Continue after the newest file from an earlier run today
+            existing = sorted(glob.glob(os.path.join(directory, f"{log_type.lower()}_{date}_*{suffix}")))
+            seq = int(existing[-1].rsplit("_", 1)[1].split(".", 1)[0]) if existing else 0
+            path = existing[-1] if existing else None
+            state = self.files[log_type] = {"date": date, "seq": seq, "path": path,
+                                            "size": os.path.getsize(path) if path else 0}
+        if state["path"] is None or (state["size"] and state["size"] + incoming > self.rotate_bytes):
+            if state["path"] is not None:
+                state["seq"] += 1
+            state["path"] = os.path.join(self.directories[log_type], f"{log_type.lower()}_{date}_{state['seq']:03d}{suffix}")
+            state["size"] = 0
+        return state["path"]
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_log_writer():
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ResponseLogWriter()
+                atexit.register(_writer.flush, 5)
+    return _writer
+
+def flush_logs(timeout=None):
+    if _writer is not None:
+        return _writer.flush(timeout)
+    return True
+
 def log_response(log_type, query, response):
-    try:
-        log_entry = {
-            "query": query,
-            "response": response,
-            "timestamp": datetime.now().isoformat()
-        }
-
-        if log_type == LOG_TYPE_GPT:
-            directory = DIRECTORY_LOG_GPT
-        elif log_type == LOG_TYPE_PEXEL:
-            directory = DIRECTORY_LOG_PEXEL
-        else:
-            logging.error(f"Invalid log type: {log_type}")
-            return
-
-        ensure_directory_exists(directory)
-        filename = f'{datetime.now().strftime("%Y%m%d_%H%M%S")}_{log_type.lower()}.txt'
-        filepath = os.path.join(directory, filename)
-
-        with open(filepath, "w") as outfile:
-            json.dump(log_entry, outfile, indent=2)
-        logging.info(f"Log entry saved: {filepath}")
-    except Exception as e:
-        logging.error(f"Error logging response: {str(e)}")
\ No newline at end of file
+    # Only enqueues; serialization and file I/O happen on the writer thread,
+    # so callers must not mutate response afterwards
+    if log_type not in LOG_DIRECTORIES:
+        logging.error(f"Invalid log type: {log_type}")
+        return
+    get_log_writer().put(log_type, {
+        "query": query,
+        "response": response,
+        "timestamp": datetime.now().isoformat(),
+    })
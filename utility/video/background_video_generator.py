@@ -1,38 +1,64 @@
 import os 
-import requests
 from utility.utils import log_response, LOG_TYPE_PEXEL
+from utility.video import search_cache
 import logging
 import time
+import threading
 from concurrent.futures import ThreadPoolExecutor
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 
 PEXELS_API_KEY = os.environ.get('PEXELS_KEY')
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+PER_PAGE = 15
+# Draft renders download the smallest rendition with at least this short side
+PREVIEW_HEIGHT = int(os.environ.get('DRAFT_PREVIEW_HEIGHT', '360'))
+PEXELS_SEARCH_URL = os.environ.get('PEXELS_API_URL', "https://api.pexels.com") + "/videos/search"
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 
-session = requests.Session()
-retries = Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
-session.mount('https://', HTTPAdapter(max_retries=retries))
+_session = None
+_session_lock = threading.Lock()
 
-def search_videos(query_string, orientation_landscape=True, page=1):
-    url = "https://api.pexels.com/videos/search"
-    headers = {
-        "Authorization": PEXELS_API_KEY,
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
-    params = {
+def get_session():
+    # Built on first use: the async pipeline never needs requests here
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from requests.packages.urllib3.util.retry import Retry
+                session = requests.Session()
+                retries = Retry(total=5, backoff_factor=0.1, status_forcelist=[500, 502, 503, 504])
+                session.mount('https://', HTTPAdapter(max_retries=retries))
+                _session = session
+    return _session
+
+def search_params(query_string, orientation_landscape=True, page=1):
+    return {
         "query": query_string,
         "orientation": "landscape" if orientation_landscape else "portrait",
-        "per_page": 15,
+        "per_page": PER_PAGE,
         "page": page
     }
 
+def search_videos(query_string, orientation_landscape=True, page=1):
+    import requests
+    url = PEXELS_SEARCH_URL
+    headers = {
+        "Authorization": PEXELS_API_KEY,
+        "User-Agent": USER_AGENT
+    }
+    params = search_params(query_string, orientation_landscape, page)
+    cached = search_cache.get(query_string, params["orientation"], page, params["per_page"])
+    if cached is not None:
+        return cached
+
     for attempt in range(MAX_RETRIES):
         try:
-            response = session.get(url, headers=headers, params=params)
+            response = get_session().get(url, headers=headers, params=params)
             response.raise_for_status()
             json_data = response.json()
+            search_cache.put(query_string, params["orientation"], page, params["per_page"], json_data)
             log_response(LOG_TYPE_PEXEL, query_string, json_data)
             return json_data
         except requests.RequestException as e:
@@ -43,52 +69,121 @@ def search_videos(query_string, orientation_landscape=True, page=1):
                 logging.error("Max retries reached. Giving up.")
                 return None
 
-def getBestVideo(query_string, orientation_landscape=True, used_vids=[], page=1):
-    vids = search_videos(query_string, orientation_landscape, page)
-    
-    if vids is None or 'videos' not in vids:
-        logging.warning(f"No valid response for query: {query_string}")
-        return None
+class Candidate:
+    __slots__ = ("key", "link", "width", "height", "duration", "preview")
 
-    videos = vids['videos']
+    def __init__(self, key, link, width, height, duration, preview=None):
+        self.key = key
+        self.link = link
+        self.width = width
+        self.height = height
+        self.duration = duration
+        self.preview = preview or link
 
-    if not videos:
-        logging.warning(f"No videos found for query: {query_string}")
-        return None
+class VideoRegistry:
+    # Per-job set of clips already handed out, so no clip is used twice.
+    # previews maps each chosen link to its low-resolution rendition.
+    def __init__(self):
+        self.used = set()
+        self.previews = {}
+        self.lock = threading.Lock()
 
-    if orientation_landscape:
-        filtered_videos = [video for video in videos if video['width'] >= 1920 and video['height'] >= 1080 and video['width']/video['height'] == 16/9]
-    else:
-        filtered_videos = [video for video in videos if video['width'] >= 1080 and video['height'] >= 1920 and video['height']/video['width'] == 16/9]
+    def claim(self, key):
+        with self.lock:
+            if key in self.used:
+                return False
+            self.used.add(key)
+            return True
+
+    def __contains__(self, key):
+        return key in self.used
+
+    def __len__(self):
+        return len(self.used)
+
+def video_key(link):
+    return link.split('.hd')[0]
 
-    sorted_videos = sorted(filtered_videos, key=lambda x: abs(15-int(x['duration'])))
+def preview_link(video_files, orientation_landscape=True, min_height=PREVIEW_HEIGHT):
+    # Smallest 16:9 rendition whose short side is at least min_height, or None
+    best = None
+    for video_file in video_files:
+        width, height = video_file['width'], video_file['height']
+        if not orientation_landscape:
+            width, height = height, width
+        if width * 9 != height * 16 or height < min_height:
+            continue
+        if best is None or height < best[0]:
+            best = (height, video_file['link'])
+    return best[1] if best else None
 
-    for video in sorted_videos:
+def index_candidates(vids, orientation_landscape=True):
+    # Flattens a search response into the usable 1080p files, ordered by how
+    # close the video is to 15 s; built once per response and reused
+    if vids is None or not vids.get('videos'):
+        return ()
+    long_side, short_side = 1920, 1080
+    candidates = []
+    for video in vids['videos']:
+        width, height = video['width'], video['height']
+        if not orientation_landscape:
+            width, height = height, width
+        if width < long_side or height < short_side or width * 9 != height * 16:
+            continue
+        duration = int(video['duration'])
+        preview = preview_link(video['video_files'], orientation_landscape)
         for video_file in video['video_files']:
-            if orientation_landscape:
-                if video_file['width'] == 1920 and video_file['height'] == 1080:
-                    if not (video_file['link'].split('.hd')[0] in used_vids):
-                        return video_file['link']
-            else:
-                if video_file['width'] == 1080 and video_file['height'] == 1920:
-                    if not (video_file['link'].split('.hd')[0] in used_vids):
-                        return video_file['link']
+            file_width, file_height = video_file['width'], video_file['height']
+            if not orientation_landscape:
+                file_width, file_height = file_height, file_width
+            if file_width == long_side and file_height == short_side:
+                link = video_file['link']
+                candidates.append(Candidate(video_key(link), link, video_file['width'], video_file['height'], duration, preview))
+    candidates.sort(key=lambda candidate: abs(15 - candidate.duration))
+    return tuple(candidates)
+
+def pick_candidate(candidates, query_string, used_vids=None):
+    for candidate in candidates:
+        if used_vids is None:
+            return candidate.link
+        if isinstance(used_vids, VideoRegistry):
+            if used_vids.claim(candidate.key):
+                used_vids.previews[candidate.link] = candidate.preview
+                return candidate.link
+        elif candidate.key not in used_vids:
+            return candidate.link
 
     logging.warning(f"No suitable videos found for query: {query_string}")
     return None
 
-def search_video_for_segment(t1, t2, search_terms):
+def getBestVideo(query_string, orientation_landscape=True, used_vids=None, page=1):
+    vids = search_videos(query_string, orientation_landscape, page)
+    return select_best_video(vids, query_string, orientation_landscape, used_vids)
+
+def select_best_video(vids, query_string, orientation_landscape=True, used_vids=None):
+    if vids is None or 'videos' not in vids:
+        logging.warning(f"No valid response for query: {query_string}")
+        return None
+
+    if not vids['videos']:
+        logging.warning(f"No videos found for query: {query_string}")
+        return None
+
+    return pick_candidate(index_candidates(vids, orientation_landscape), query_string, used_vids)
+
+def search_video_for_segment(t1, t2, search_terms, used_vids=None):
     for page in range(1, 4):  # Try up to 3 pages
         for query in search_terms:
-            url = getBestVideo(query, orientation_landscape=True, page=page)
+            url = getBestVideo(query, orientation_landscape=True, used_vids=used_vids, page=page)
             if url:
                 return [(t1, t2), url]
     return [(t1, t2), None]
 
 def generate_video_url(timed_video_searches, video_server):
     if video_server == "pexel":
+        used_vids = VideoRegistry()
         with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(search_video_for_segment, t1, t2, search_terms) for (t1, t2), search_terms in timed_video_searches]
+            futures = [executor.submit(search_video_for_segment, t1, t2, search_terms, used_vids) for (t1, t2), search_terms in timed_video_searches]
             timed_video_urls = [future.result() for future in futures]
     elif video_server == "stable_diffusion":
         timed_video_urls = get_images_for_video(timed_video_searches)
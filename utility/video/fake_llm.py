@@ -0,0 +1,75 @@
+import os
+import ast
+import time
+import random
+import orjson
+from types import SimpleNamespace
+
+# Offline stand-in for the OpenAI/Groq chat client: answers the keyword
+# prompt with canned keywords over consecutive ~3 s windows of the timed
+# captions it was sent, after a fixed delay.
+#
+#   LLM_BACKEND=fake python app.py script.txt
+
+LATENCY = float(os.environ.get('FAKE_LLM_LATENCY', '0.5'))
+# With stream=True the first delta arrives after LATENCY and the rest trickle in
+STREAM_CHUNK_CHARS = 16
+STREAM_CHUNK_DELAY = float(os.environ.get('FAKE_LLM_CHUNK_DELAY', '0.002'))
+# Fraction of responses cut off halfway, as when a response is truncated
+MALFORMED_RATE = float(os.environ.get('FAKE_LLM_MALFORMED_RATE', '0'))
+SEED = os.environ.get('FAKE_LLM_SEED')
+WINDOW_SECONDS = 3
+KEYWORDS = [
+    ["desert highway", "sand dunes", "dusty road"],
+    ["night sky", "starry sky", "moon clouds"],
+    ["military base", "barbed wire fence", "guard tower"],
+    ["aircraft hangar", "fighter jet", "runway lights"],
+    ["city street", "traffic lights", "crowded sidewalk"],
+    ["ocean waves", "rocky coast", "lighthouse"],
+]
+
+def parse_captions(user_content):
+    # The user message is "Script: ...\nTimed Captions:[((t1, t2), 'text'), ...]"
+    _, _, captions = user_content.rpartition("Timed Captions:")
+    try:
+        return ast.literal_eval(captions.strip())
+    except (ValueError, SyntaxError):
+        return []
+
+def keyword_windows(captions, window=WINDOW_SECONDS):
+    windows = []
+    start = None
+    for (t1, t2), _ in captions:
+        if start is None:
+            start = t1
+        if t2 - start >= window:
+            windows.append([[start, t2], KEYWORDS[len(windows) % len(KEYWORDS)]])
+            start = None
+    if start is not None:
+        windows.append([[start, captions[-1][0][1]], KEYWORDS[len(windows) % len(KEYWORDS)]])
+    return windows
+
+def stream_content(content):
+    for i in range(0, len(content), STREAM_CHUNK_CHARS):
+        if i:
+            time.sleep(STREAM_CHUNK_DELAY)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + STREAM_CHUNK_CHARS]))])
+
+class FakeCompletions:
+    def __init__(self, malformed_rate=MALFORMED_RATE, seed=SEED):
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        time.sleep(LATENCY)
+        captions = parse_captions(messages[-1]["content"])
+        content = orjson.dumps(keyword_windows(captions)).decode()
+        if self.random.random() < self.malformed_rate:
+            content = content[:len(content) // 2]
+        if stream:
+            return stream_content(content)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+class FakeClient:
+    def __init__(self, malformed_rate=MALFORMED_RATE, seed=SEED):
+        self.chat = SimpleNamespace(completions=FakeCompletions(malformed_rate, seed))
@@ -0,0 +1,156 @@
+import time
+import asyncio
+import logging
+import requests
+from utility.video.pexels_client import PexelsClient
+from utility.video.background_video_generator import VideoRegistry
+from utility.render import footage_cache
+from utility import instrumentation
+
+SEARCH_WORKERS = 8
+DOWNLOAD_WORKERS = 4
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+async def iterate_segments(segments):
+    if hasattr(segments, "__aiter__"):
+        async for segment in segments:
+            yield segment
+    else:
+        for segment in segments:
+            yield segment
+
+def download_segment_video(url, duration=None, metrics=None):
+    with instrumentation.span("download_segment", url=url) as span:
+        fetched = {}
+        try:
+            return footage_cache.fetch(url, duration=duration, metrics=fetched)
+        except (requests.RequestException, OSError) as e:
+            logging.error(f"Error downloading file from {url}: {str(e)}")
+            return None
+        finally:
+            span.set(**fetched)
+            if metrics is not None:
+                for name, value in fetched.items():
+                    metrics[name] = metrics.get(name, 0) + value
+
+async def stream_footage(segments, search_workers=SEARCH_WORKERS, download_workers=DOWNLOAD_WORKERS,
+                         queue_size=QUEUE_SIZE, metrics=None, client=None, used_vids=None, normalize=False,
+                         draft=False, timeline_end=None):
+    # segments is a list or async iterator of [[t1, t2], [keywords...]].
+    # Each segment is searched as soon as it arrives and its footage is
+    # downloaded into the footage cache as soon as a URL is chosen; bounded
+    # queues hold back the producer when searches or downloads fall behind.
+    # Returns [[t1, t2], url] entries in segment order, like generate_video_url.
+    # Pass a PexelsClient to share its connection pool and rate limit across calls;
+    # used_vids defaults to a fresh VideoRegistry so a clip is used at most once.
+    # With normalize, each downloaded clip is also transcoded for the concat
+    # render backend while the remaining segments are still being searched;
+    # pass the audio duration as timeline_end so the last clip is cut where
+    # the render cuts it.
+    # With draft, the low-resolution rendition of each chosen clip is
+    # downloaded instead; the returned URLs are still the full-HD ones.
+    if client is None:
+        async with PexelsClient() as client:
+            return await stream_footage(segments, search_workers, download_workers, queue_size, metrics, client, used_vids,
+                                        normalize, draft, timeline_end)
+
+    if used_vids is None:
+        used_vids = VideoRegistry()
+
+    search_queue = asyncio.Queue(maxsize=queue_size)
+    download_queue = asyncio.Queue(maxsize=queue_size)
+    results = {}
+    start = time.perf_counter()
+    first_download = None
+    downloaded = 0
+    normalizing = []
+    released = 0
+    release_lock = asyncio.Lock()
+    if normalize:
+        # Imported here so the other backends never load the render modules
+        from utility.render.footage_normalizer import NORMALIZE_WORKERS, segment_frames, normalize_clip
+        normalize_slots = asyncio.Semaphore(NORMALIZE_WORKERS)
+
+        async def normalize_download(path, t1, t2):
+            async with normalize_slots:
+                await asyncio.to_thread(normalize_clip, path, segment_frames(t1, t2, timeline_end))
+
+    async def produce():
+        count = 0
+        async for (t1, t2), search_terms in iterate_segments(segments):
+            await search_queue.put((count, t1, t2, search_terms))
+            count += 1
+        for _ in range(search_workers):
+            await search_queue.put(_DONE)
+
+    async def search():
+        while True:
+            item = await search_queue.get()
+            if item is _DONE:
+                return
+            index, t1, t2, search_terms = item
+            with instrumentation.span("search_segment", segment=index) as span:
+                interval, url = await client.search_video_for_segment(t1, t2, search_terms, used_vids)
+                span.set(found=url is not None)
+            results[index] = [list(interval), url]
+            await release()
+
+    async def release(done=False):
+        # Hands chosen clips to the downloaders in segment order. A clip waits
+        # until the segments after it are searched: footage-less segments that
+        # follow are merged into it (merge_empty_intervals), so its download
+        # must cover them too.
+        nonlocal released
+        async with release_lock:
+            while released in results:
+                (t1, _), url = results[released]
+                end = released + 1
+                while end in results and results[end][1] is None:
+                    end += 1
+                if url is not None:
+                    if end not in results and not done:
+                        return
+                    await download_queue.put((url, t1, results[end - 1][0][1]))
+                released = end
+
+    async def download():
+        nonlocal first_download, downloaded
+        while True:
+            item = await download_queue.get()
+            if item is _DONE:
+                return
+            url, t1, t2 = item
+            if draft:
+                url = getattr(used_vids, "previews", {}).get(url, url)
+            path = await asyncio.to_thread(download_segment_video, url, t2 - t1, metrics)
+            if path:
+                downloaded += 1
+                if first_download is None:
+                    first_download = time.perf_counter() - start
+                if normalize:
+                    normalizing.append(asyncio.create_task(normalize_download(path, t1, t2)))
+
+    downloaders = [asyncio.create_task(download()) for _ in range(download_workers)]
+    searchers = [asyncio.create_task(produce())] + [asyncio.create_task(search()) for _ in range(search_workers)]
+    try:
+        await asyncio.gather(*searchers)
+        await release(done=True)
+        for _ in range(download_workers):
+            await download_queue.put(_DONE)
+        await asyncio.gather(*downloaders)
+        await asyncio.gather(*normalizing)
+    finally:
+        # On an error in any task, stop the rest rather than leave them running
+        for task in searchers + downloaders + normalizing:
+            task.cancel()
+
+    wall = time.perf_counter() - start
+    if metrics is not None:
+        metrics["time_to_first_download"] = round(first_download, 3) if first_download is not None else None
+        metrics["footage_wall"] = round(wall, 3)
+        metrics["footage_downloads"] = downloaded
+    logging.info(f"Footage pipeline: {len(results)} segments, {downloaded} downloads, first download after "
+                 f"{first_download if first_download is None else round(first_download, 2)}s, total {wall:.2f}s")
+    return [results[i] for i in sorted(results)]
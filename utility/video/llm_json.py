@@ -0,0 +1,184 @@
+import re
+import orjson
+
+# Single-pass repair and incremental parsing of the keyword JSON the LLM
+# returns, e.g. [[[0, 2.5], ["desert road", "sand dunes"]], ...].
+#
+# The repair turns smart quotes into ASCII, rewrites single-quoted strings
+# as double-quoted ones, escapes quotes that don't end their string (a
+# quote only closes a string when the next non-space character is one of
+# , : ] } or the end of the text), replaces control characters inside
+# strings with spaces, drops trailing commas and skips any text before
+# the first [ or {.
+
+OPEN_QUOTES = {'"': '"', "'": "'", "“": '"', "”": '"', "‘": "'", "’": "'"}
+STRING_SPECIAL = re.compile("[\"'\\\\“”‘’\x00-\x1f]")
+STRUCTURE = re.compile(r'[\[\]{}"\\]')
+CLOSERS = ",:]}"
+WHITESPACE = " \t\r\n"
+
+class JsonRepairer:
+    # feed() returns the repaired text for as much of the input as can be
+    # decided; input that needs lookahead is held until the next feed().
+    def __init__(self):
+        self.buffer = ""
+        self.quote = None
+        self.started = False
+        self.pending_comma = False
+
+    def feed(self, text, final=False):
+        buf = self.buffer + text if self.buffer else text
+        out = []
+        i = 0
+        n = len(buf)
+        while i < n:
+            if self.quote is not None:
+                match = STRING_SPECIAL.search(buf, i)
+                if match is None:
+                    out.append(buf[i:])
+                    i = n
+                    break
+                if match.start() > i:
+                    out.append(buf[i:match.start()])
+                i = match.start()
+                c = buf[i]
+                if c == "\\":
+                    if i + 1 >= n:
+                        if not final:
+                            break
+                        i += 1
+                        continue
+                    # \' isn't a JSON escape
+                    out.append("'" if buf[i + 1] == "'" else buf[i:i + 2])
+                    i += 2
+                    continue
+                if c < " ":
+                    out.append(" ")
+                    i += 1
+                    continue
+                quote = OPEN_QUOTES[c]
+                if quote == self.quote:
+                    j = i + 1
+                    while j < n and buf[j] in WHITESPACE:
+                        j += 1
+                    if j >= n and not final:
+                        break
+                    if j >= n or buf[j] in CLOSERS:
+                        out.append('"')
+                        self.quote = None
+                        i += 1
+                        continue
+                # A quote inside the string: keep it as text
+                out.append('\\"' if quote == '"' else "'")
+                i += 1
+                continue
+
+            c = buf[i]
+            if not self.started:
+                starts = [p for p in (buf.find("[", i), buf.find("{", i)) if p != -1]
+                if not starts:
+                    i = n
+                    break
+                i = min(starts)
+                self.started = True
+                continue
+            if c in WHITESPACE:
+                if not self.pending_comma:
+                    out.append(c)
+                i += 1
+                continue
+            if self.pending_comma:
+                self.pending_comma = False
+                if c not in "]}":
+                    out.append(",")
+            if c == ",":
+                self.pending_comma = True
+            elif c in OPEN_QUOTES:
+                self.quote = OPEN_QUOTES[c]
+                out.append('"')
+            else:
+                out.append(c)
+            i += 1
+
+        self.buffer = buf[i:]
+        if final:
+            self.buffer = ""
+            self.pending_comma = False
+            if self.quote is not None:
+                out.append('"')
+                self.quote = None
+        return "".join(out)
+
+def repair_json(text):
+    return JsonRepairer().feed(text, final=True)
+
+def loads_tolerant(text):
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return orjson.loads(repair_json(text))
+
+def validate_segment(segment):
+    # [[t1, t2], ["keyword", ...]]
+    if not (isinstance(segment, list) and len(segment) == 2):
+        raise ValueError(f"Invalid segment in API response: {segment!r}")
+    interval, keywords = segment
+    if not (isinstance(interval, list) and len(interval) == 2
+            and all(isinstance(t, (int, float)) and not isinstance(t, bool) for t in interval)):
+        raise ValueError(f"Invalid interval in API response: {interval!r}")
+    if not (isinstance(keywords, list) and all(isinstance(k, str) for k in keywords)):
+        raise ValueError(f"Invalid keywords in API response: {keywords!r}")
+    return segment
+
+class KeywordSegmentParser:
+    # Incremental parser for the top-level array: feed() returns the
+    # segments completed by the new text, each repaired and validated
+    def __init__(self):
+        self.repairer = JsonRepairer()
+        self.depth = 0
+        self.in_string = False
+        self.skip = 0
+        self.element = []
+
+    def feed(self, text):
+        return self._scan(self.repairer.feed(text))
+
+    def finish(self):
+        segments = self._scan(self.repairer.feed("", final=True))
+        if self.depth != 0:
+            raise ValueError("Truncated API response")
+        return segments
+
+    def _scan(self, text):
+        segments = []
+        start = 0 if self.depth >= 2 else None
+        skip_until = self.skip
+        for match in STRUCTURE.finditer(text):
+            p = match.start()
+            if p < skip_until:
+                continue
+            c = text[p]
+            if self.in_string:
+                if c == "\\":
+                    skip_until = p + 2
+                elif c == '"':
+                    self.in_string = False
+                continue
+            if c == '"':
+                self.in_string = True
+            elif c in "[{":
+                self.depth += 1
+                if self.depth == 2:
+                    start = p
+                    self.element = []
+            elif c in "]}":
+                if self.depth == 2:
+                    self.element.append(text[start:p + 1])
+                    segments.append(validate_segment(orjson.loads("".join(self.element))))
+                    self.element = []
+                    start = None
+                self.depth -= 1
+        self.skip = max(skip_until - len(text), 0)
+        if start is not None and self.depth >= 2:
+            self.element.append(text[start:])
+        return segments
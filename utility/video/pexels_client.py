@@ -0,0 +1,163 @@
+import time
+import random
+import asyncio
+import logging
+import aiohttp
+from utility.utils import log_response, LOG_TYPE_PEXEL
+from utility.video import search_cache
+from utility.video.background_video_generator import (PEXELS_API_KEY, PEXELS_SEARCH_URL, USER_AGENT, MAX_RETRIES,
+                                                      RETRY_DELAY, search_params, index_candidates, pick_candidate)
+
+MAX_CONNECTIONS = 8
+REQUESTS_PER_SECOND = 5
+BURST = 10
+REQUEST_TIMEOUT = 30
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    # Local rate limit that also defers to the server's X-Ratelimit-* headers:
+    # once the remaining quota hits zero every caller waits for the reset time
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def update_from_headers(self, headers):
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = headers.get("X-Ratelimit-Reset")
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining = int(remaining)
+            wait = max(float(reset) - time.time(), 0)
+        except ValueError:
+            return
+        if remaining <= 0:
+            self.blocked_until = time.monotonic() + wait
+            logging.warning(f"Pexels rate limit exhausted, pausing searches for {wait:.0f}s")
+
+class PexelsClient:
+    def __init__(self, api_key=PEXELS_API_KEY, search_url=PEXELS_SEARCH_URL, max_connections=MAX_CONNECTIONS,
+                 requests_per_second=REQUESTS_PER_SECOND, burst=BURST):
+        self.api_key = api_key
+        self.search_url = search_url
+        self.max_connections = max_connections
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.session = None
+        self.in_flight = {}
+        self.candidates = {}
+        self.stats = {"requests": 0, "coalesced": 0, "cache_hits": 0, "retries": 0, "failures": 0}
+
+    async def __aenter__(self):
+        self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def open(self):
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections)
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                headers={"Authorization": self.api_key or "", "User-Agent": USER_AGENT},
+            )
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def search_videos(self, query_string, orientation_landscape=True, page=1):
+        # Identical searches already in flight share one request
+        params = search_params(query_string, orientation_landscape, page)
+        key = (query_string, params["orientation"], page)
+        task = self.in_flight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(self._fetch(query_string, params))
+        self.in_flight[key] = task
+        task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, query_string, params):
+        cache_key = (query_string, params["orientation"], params["page"], params["per_page"])
+        cached = await asyncio.to_thread(search_cache.get, *cache_key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        self.open()
+        for attempt in range(MAX_RETRIES):
+            await self.bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                async with self.session.get(self.search_url, params=params) as response:
+                    self.bucket.update_from_headers(response.headers)
+                    if response.status in RETRY_STATUSES:
+                        raise aiohttp.ClientResponseError(response.request_info, response.history,
+                                                          status=response.status, message=response.reason)
+                    response.raise_for_status()
+                    json_data = await response.json()
+                await asyncio.to_thread(search_cache.put, *cache_key, json_data)
+                log_response(LOG_TYPE_PEXEL, query_string, json_data)
+                return json_data
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if isinstance(e, aiohttp.ClientResponseError) and e.status not in RETRY_STATUSES:
+                    # A bad request or API key fails the same way on every retry
+                    logging.error(f"Error in API request, not retrying: {str(e)}")
+                    break
+                logging.error(f"Error in API request (attempt {attempt + 1}/{MAX_RETRIES}): {str(e)}")
+                if attempt < MAX_RETRIES - 1:
+                    self.stats["retries"] += 1
+                    await asyncio.sleep(RETRY_DELAY * (2 ** attempt) * random.uniform(0.5, 1.0))
+                else:
+                    logging.error("Max retries reached. Giving up.")
+        self.stats["failures"] += 1
+        return None
+
+    async def get_candidates(self, query_string, orientation_landscape=True, page=1):
+        # Each response is indexed once and shared by every segment that runs
+        # the same search. A failed search isn't kept, so a later lookup retries it.
+        key = (query_string, orientation_landscape, page)
+        candidates = self.candidates.get(key)
+        if candidates is None:
+            vids = await self.search_videos(query_string, orientation_landscape, page)
+            if vids is None:
+                return ()
+            candidates = self.candidates.setdefault(key, index_candidates(vids, orientation_landscape))
+        return candidates
+
+    async def get_best_video(self, query_string, orientation_landscape=True, used_vids=None, page=1):
+        candidates = await self.get_candidates(query_string, orientation_landscape, page)
+        return pick_candidate(candidates, query_string, used_vids)
+
+    async def search_video_for_segment(self, t1, t2, search_terms, used_vids=None):
+        # Queries stay sequential within a segment so a hit on the first one
+        # doesn't spend quota on the others; segments run concurrently instead
+        for page in range(1, 4):  # Try up to 3 pages
+            for query in search_terms:
+                url = await self.get_best_video(query, orientation_landscape=True, used_vids=used_vids, page=page)
+                if url:
+                    return [(t1, t2), url]
+        return [(t1, t2), None]
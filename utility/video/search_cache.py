@@ -0,0 +1,183 @@
+import os
+import time
+import atexit
+import zlib
+import sqlite3
+import logging
+import threading
+import orjson
+
+CACHE_DB = os.environ.get('PEXELS_CACHE_DB', '.cache/pexels_search.sqlite3')
+CACHE_TTL = int(os.environ.get('PEXELS_CACHE_TTL', str(7 * 24 * 3600)))
+CACHE_MAX_BYTES = int(os.environ.get('PEXELS_CACHE_MAX_MB', '256')) * 1024 * 1024
+# Once over CACHE_MAX_BYTES the cache is trimmed to this fraction of it, so
+# eviction runs once per batch of writes rather than on every put
+EVICT_TARGET = 0.9
+# A hit only rewrites its row's access time when it is older than this
+ACCESS_RESOLUTION = 3600
+# Hit and miss counts are kept in memory and written every STATS_FLUSH lookups
+STATS_FLUSH = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    query TEXT NOT NULL,
+    orientation TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    per_page INTEGER NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (query, orientation, page, per_page)
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_pending_stats = {}
+
+def normalize_query(query_string):
+    return " ".join(query_string.lower().split())
+
+def get_connection(path=CACHE_DB):
+    # One connection per thread; WAL lets several processes share the file
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    connection = connections.get(path)
+    if connection is None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(path, timeout=30, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        connections[path] = connection
+    return connection
+
+def _bump(path, name):
+    with _stats_lock:
+        counts = _pending_stats.setdefault(path, {"hits": 0, "misses": 0})
+        counts[name] += 1
+        flush = sum(counts.values()) >= STATS_FLUSH
+    if flush:
+        flush_stats(path)
+
+def flush_stats(path=None):
+    # Writes the pending lookup counts of path, or of every cache, to the stats table
+    with _stats_lock:
+        paths = [path] if path is not None else list(_pending_stats)
+        pending = {p: _pending_stats.pop(p) for p in paths if p in _pending_stats}
+    for p, counts in pending.items():
+        try:
+            get_connection(p).executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                [(name, value) for name, value in counts.items() if value],
+            )
+        except sqlite3.Error as e:
+            logging.error(f"Error writing Pexels search cache stats: {str(e)}")
+
+atexit.register(flush_stats)
+
+def get(query_string, orientation, page, per_page, ttl=CACHE_TTL, path=CACHE_DB):
+    try:
+        connection = get_connection(path)
+        key = (normalize_query(query_string), orientation, page, per_page)
+        row = connection.execute(
+            "SELECT body, created, accessed FROM responses WHERE query = ? AND orientation = ? AND page = ? AND per_page = ?", key
+        ).fetchone()
+        now = time.time()
+        if row is None or now - row[1] > ttl:
+            _bump(path, "misses")
+            return None
+        if now - row[2] > ACCESS_RESOLUTION:
+            connection.execute(
+                "UPDATE responses SET accessed = ? WHERE query = ? AND orientation = ? AND page = ? AND per_page = ?", (now, *key)
+            )
+        _bump(path, "hits")
+        return orjson.loads(zlib.decompress(row[0]))
+    except (sqlite3.Error, zlib.error, orjson.JSONDecodeError) as e:
+        logging.error(f"Error reading Pexels search cache: {str(e)}")
+        return None
+
+def _total_bytes(connection):
+    # The running size lives in the stats table, so every process sharing the
+    # file sees it; databases written before it existed are summed once
+    row = connection.execute("SELECT value FROM stats WHERE name = 'bytes'").fetchone()
+    if row is not None:
+        return row[0]
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    connection.execute("INSERT INTO stats (name, value) VALUES ('bytes', ?)", (total,))
+    return total
+
+def _add_bytes(connection, amount):
+    connection.execute("UPDATE stats SET value = value + ? WHERE name = 'bytes'", (amount,))
+
+def put(query_string, orientation, page, per_page, response, max_bytes=CACHE_MAX_BYTES, path=CACHE_DB):
+    try:
+        connection = get_connection(path)
+        key = (normalize_query(query_string), orientation, page, per_page)
+        body = zlib.compress(orjson.dumps(response))
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            total = _total_bytes(connection)
+            row = connection.execute(
+                "SELECT size FROM responses WHERE query = ? AND orientation = ? AND page = ? AND per_page = ?", key
+            ).fetchone()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (query, orientation, page, per_page, body, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, body, len(body), now, now),
+            )
+            added = len(body) - (row[0] if row else 0)
+            _add_bytes(connection, added)
+            if total + added > max_bytes:
+                evict(connection, max_bytes)
+            connection.execute("COMMIT")
+        except sqlite3.Error:
+            connection.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as e:
+        logging.error(f"Error writing Pexels search cache: {str(e)}")
+
+def evict(connection, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL, target=EVICT_TARGET):
+    # Runs inside the caller's transaction: drops expired rows, then least
+    # recently used ones until the total is back under target * max_bytes
+    cutoff = time.time() - ttl
+    expired = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses WHERE created < ?", (cutoff,)).fetchone()[0]
+    connection.execute("DELETE FROM responses WHERE created < ?", (cutoff,))
+    _add_bytes(connection, -expired)
+    total = _total_bytes(connection)
+    if total > max_bytes * target:
+        stale = []
+        freed = 0
+        for rowid, size in connection.execute("SELECT rowid, size FROM responses ORDER BY accessed"):
+            if total - freed <= max_bytes * target:
+                break
+            stale.append((rowid,))
+            freed += size
+        connection.executemany("DELETE FROM responses WHERE rowid = ?", stale)
+        _add_bytes(connection, -freed)
+
+def get_stats(path=CACHE_DB):
+    flush_stats(path)
+    try:
+        connection = get_connection(path)
+        stats = dict(connection.execute("SELECT name, value FROM stats").fetchall())
+        entries, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+    except sqlite3.Error as e:
+        logging.error(f"Error reading Pexels search cache stats: {str(e)}")
+        return {}
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "entries": entries,
+        "bytes": size,
+    }
@@ -1,20 +1,64 @@
-from openai import OpenAI
 import os
-import orjson
-import re
+import time
+import asyncio
 import logging
-from functools import lru_cache
+import threading
+import contextvars
+from queue import SimpleQueue
 from concurrent.futures import ThreadPoolExecutor
+from utility import artifact_store
+from utility.video.llm_json import KeywordSegmentParser, loads_tolerant
 from utility.utils import log_response, LOG_TYPE_GPT
+from utility import instrumentation
 
-if len(os.environ.get("GROQ_API_KEY", "")) > 30:
-    from groq import Groq
+# The model is known up front (it is part of artifact keys); the client and
+# its SDK are only loaded on the first request, so importing this module
+# needs neither the SDK nor an API key
+if os.environ.get("LLM_BACKEND") == "fake":
+    LLM_BACKEND = "fake"
+    model = "fake"
+elif len(os.environ.get("GROQ_API_KEY", "")) > 30:
+    LLM_BACKEND = "groq"
     model = "llama3-70b-8192"
-    client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
 else:
+    LLM_BACKEND = "openai"
     model = "gpt-4"
-    OPENAI_API_KEY = os.environ.get('OPENAI_KEY')
-    client = OpenAI(api_key=OPENAI_API_KEY)
+
+# Long scripts are sent as overlapping windows of the caption timeline, up to
+# LLM_CONCURRENCY at a time: prompts stay well inside the context of the Groq
+# model, and a malformed response costs one window rather than the whole run
+WINDOW_SECONDS = float(os.environ.get('LLM_WINDOW_SECONDS', '90'))
+WINDOW_OVERLAP = float(os.environ.get('LLM_WINDOW_OVERLAP', '10'))
+LLM_CONCURRENCY = int(os.environ.get('LLM_CONCURRENCY', '4'))
+WINDOW_RETRIES = int(os.environ.get('LLM_WINDOW_RETRIES', '2'))
+# A window that still fails after its retries is requested again as windows
+# half its length, down to this size; below it the run fails
+MIN_WINDOW_SECONDS = float(os.environ.get('LLM_MIN_WINDOW_SECONDS', '15'))
+
+_client = None
+_client_lock = threading.Lock()
+# Set by a consumer that stops reading; the threads streaming its responses
+# see it through their copied context and drop the request at the next chunk
+_stop_requested = contextvars.ContextVar("keyword_stop_requested", default=None)
+
+class KeywordRequestStopped(Exception):
+    pass
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if LLM_BACKEND == "fake":
+                    from utility.video.fake_llm import FakeClient
+                    _client = FakeClient()
+                elif LLM_BACKEND == "groq":
+                    from groq import Groq
+                    _client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+                else:
+                    from openai import OpenAI
+                    _client = OpenAI(api_key=os.environ.get('OPENAI_KEY'))
+    return _client
 
 prompt = """
 Given the following video script and timed captions, extract three visually concrete and specific keywords for each time segment that can be used to search for background videos. The keywords should be short and capture the main essence of the sentence. They can be synonyms or related terms. If a caption is vague or general, consider the next timed caption for more context. If a keyword is a single word, try to return a two-word keyword that is visually concrete. If a time frame contains two or more important pieces of information, divide it into shorter time frames with one keyword each. Ensure that the time periods are strictly consecutive and cover the entire length of the video. Each keyword should cover between 2-4 seconds. The output should be in JSON format, like this: [[[t1, t2], ["keyword1", "keyword2", "keyword3"]], [[t2, t3], ["keyword4", "keyword5", "keyword6"]], ...].
@@ -34,52 +78,250 @@ Note: Your response should be the response only and no extra text or data.
 """
 
 def fix_json(json_str):
-    try:
-        return orjson.loads(json_str)
-    except orjson.JSONDecodeError:
-        json_str = json_str.replace("'", "'").replace(""", "\"").replace(""", "\"").replace("'", "\"").replace("'", "\"")
-        json_str = json_str.replace('"you didn"t"', '"you didn\'t"')
-        return orjson.loads(json_str)
-
-@lru_cache(maxsize=100)
-def call_OpenAI(script, captions_timed):
+    return loads_tolerant(json_str)
+
+def stream_OpenAI(script, captions_timed):
+    # Yields the completion text as it streams in; the full text is logged at the end
     user_content = f"Script: {script}\nTimed Captions:{captions_timed}"
     logging.info(f"Sending request to OpenAI API with content length: {len(user_content)}")
-    
+
+    parts = []
+    stop = _stop_requested.get()
     try:
-        response = client.chat.completions.create(
+        response = get_client().chat.completions.create(
             model=model,
             temperature=1,
             messages=[
                 {"role": "system", "content": prompt},
                 {"role": "user", "content": user_content}
-            ]
+            ],
+            stream=True,
         )
-        
-        text = response.choices[0].message.content.strip()
-        text = re.sub('\s+', ' ', text)
-        log_response(LOG_TYPE_GPT, script, text)
-        return text
+        for chunk in response:
+            if stop is not None and stop.is_set():
+                response.close()
+                raise KeywordRequestStopped("keyword request stopped by its consumer")
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if text:
+                parts.append(text)
+                yield text
+    except KeywordRequestStopped:
+        raise
     except Exception as e:
         logging.error(f"Error calling OpenAI API: {str(e)}")
         raise
+    finally:
+        if parts:
+            log_response(LOG_TYPE_GPT, script, "".join(parts))
+
+def request_segments(script, captions_timed, window=0, attempt=1):
+    # Yields validated [[t1, t2], [keywords...]] segments as soon as each one
+    # is complete in the streamed response
+    parser = KeywordSegmentParser()
+    with instrumentation.span("llm_request", model=model, window=window, attempt=attempt) as span:
+        chars = 0
+        segments = 0
+        first_segment = None
+        start = time.perf_counter()
+        for text in stream_OpenAI(script, str(captions_timed)):
+            chars += len(text)
+            for segment in parser.feed(text):
+                segments += 1
+                if first_segment is None:
+                    first_segment = round(time.perf_counter() - start, 3)
+                yield segment
+        for segment in parser.finish():
+            segments += 1
+            yield segment
+        span.set(response_chars=chars, segments=segments, first_segment_s=first_segment)
+
+def split_caption_windows(captions_timed, window_seconds=WINDOW_SECONDS, overlap=WINDOW_OVERLAP):
+    # Returns [(own_start, own_end, captions)]. The owned ranges split the
+    # timeline at caption boundaries; each window's captions reach overlap
+    # seconds past its owned range on both sides, as context for the model.
+    bounds = []
+    first = 0
+    for i, ((t1, t2), _) in enumerate(captions_timed):
+        if i + 1 < len(captions_timed) and t2 - captions_timed[first][0][0] >= window_seconds:
+            bounds.append((first, i + 1))
+            first = i + 1
+    bounds.append((first, len(captions_timed)))
+
+    windows = []
+    for first, last in bounds:
+        own_start = captions_timed[first][0][0] if first else float("-inf")
+        own_end = captions_timed[last][0][0] if last < len(captions_timed) else float("inf")
+        captions = [caption for caption in captions_timed
+                    if caption[0][1] > own_start - overlap and caption[0][0] < own_end + overlap]
+        windows.append((own_start, own_end, captions))
+    return windows
 
-def getVideoSearchQueriesTimed(script, captions_timed):
+def window_segments(script, captions_timed, emit, window=0):
+    # Requests one window's segments, passing each to emit as it streams in.
+    # When a response fails or doesn't parse partway, the segments validated
+    # so far are kept and only the captions after them are requested again.
+    key = artifact_store.artifact_key("keyword_window", model, prompt, script, captions_timed)
+    segments = artifact_store.load("keyword_window", key)
+    if segments is not None:
+        for segment in segments:
+            emit(segment)
+        return segments
+    segments = []
+    remaining = captions_timed
+    for attempt in range(1, WINDOW_RETRIES + 2):
+        received = 0
+        try:
+            for segment in request_segments(script, remaining, window, attempt):
+                received += 1
+                segments.append(segment)
+                emit(segment)
+            if not received:
+                raise ValueError("Invalid format in API response")
+        except KeywordRequestStopped:
+            raise
+        except Exception as e:
+            if attempt > WINDOW_RETRIES:
+                raise
+            if segments:
+                resume = segments[-1][0][1]
+                remaining = [caption for caption in captions_timed if caption[0][1] > resume]
+            logging.warning(f"Keyword window {window} failed on attempt {attempt}, retrying "
+                            f"{len(remaining)} of {len(captions_timed)} captions: {str(e)}")
+            if remaining:
+                continue
+        artifact_store.save("keyword_window", key, segments)
+        return segments
+
+def stitch_segment(segment, previous_end, own_start, own_end):
+    # Clips a segment to its window's owned range and starts it where the
+    # previous one ended, closing gaps and overlaps between windows. Returns
+    # None for a segment with nothing left, such as a repeat from a retry.
+    (t1, t2), keywords = segment
+    t1 = max(t1, own_start)
+    t2 = min(t2, own_end)
+    if previous_end is not None:
+        t1 = previous_end
+    if t2 <= t1:
+        return None
+    return [[t1, t2], keywords]
+
+def iterVideoSearchQueriesTimed(script, captions_timed, window_seconds=WINDOW_SECONDS, concurrency=LLM_CONCURRENCY):
+    # Yields strictly consecutive segments in timeline order. Windows are
+    # requested concurrently; a window's segments are released as they
+    # stream in once every earlier window is finished. Raises when part of
+    # the timeline gets no keywords even from the smallest windows.
+    windows = split_caption_windows(captions_timed, window_seconds)
+    outputs = [SimpleQueue() for _ in windows]
+    done = object()
+
+    def run(index, window_script, captions):
+        try:
+            window_segments(window_script, captions, outputs[index].put, index)
+            outputs[index].put(done)
+        except Exception as e:
+            outputs[index].put(e)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="keyword-window")
     try:
-        with ThreadPoolExecutor() as executor:
-            future = executor.submit(call_OpenAI, script, str(captions_timed))
-            content = future.result()
-        
-        out = fix_json(content)
-        
-        if not isinstance(out, list) or not all(isinstance(item, list) and len(item) == 2 for item in out):
+        for index, (_, _, captions) in enumerate(windows):
+            # A single window keeps the whole script; otherwise each window
+            # gets only its own text, so prompts stay small on long videos
+            window_script = script if len(windows) == 1 else " ".join(text for _, text in captions)
+            executor.submit(contextvars.copy_context().run, run, index, window_script, captions)
+
+        end = None
+        for index, ((own_start, own_end, captions), output) in enumerate(zip(windows, outputs)):
+            segments = iter(output.get, done)
+            for item in segments:
+                if isinstance(item, KeywordRequestStopped):
+                    raise item
+                if isinstance(item, Exception):
+                    segments = split_failed_window(item, index, script, captions, end, own_start, own_end,
+                                                   window_seconds, concurrency)
+                    break
+                segment = stitch_segment(item, end, own_start, own_end)
+                if segment:
+                    end = segment[0][1]
+                    yield segment
+            for item in segments:
+                segment = stitch_segment(item, end, own_start, own_end)
+                if segment:
+                    end = segment[0][1]
+                    yield segment
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def split_failed_window(error, index, script, captions, end, own_start, own_end, window_seconds, concurrency):
+    # Re-requests the part of a failed window after its last stitched
+    # segment as windows half as long, rather than stretching a neighbour
+    # over the gap; raises error once the windows would get too small
+    start = own_start if end is None else max(end, own_start)
+    remainder = [caption for caption in captions if caption[0][1] > start - WINDOW_OVERLAP]
+    if not any(t1 < own_end and t2 > start for (t1, t2), _ in remainder):
+        return []
+    # Halving the window length on each level bounds the recursion; a window
+    # over the whole script has no length of its own, so its span is halved
+    if window_seconds == float("inf"):
+        window_seconds = remainder[-1][0][1] - remainder[0][0][0]
+    smaller = window_seconds / 2
+    if smaller < MIN_WINDOW_SECONDS:
+        logging.error(f"Keyword window {index} failed after {WINDOW_RETRIES + 1} attempts: {str(error)}")
+        raise error
+    logging.warning(f"Keyword window {index} failed after {WINDOW_RETRIES + 1} attempts, "
+                    f"requesting its remaining {len(remainder)} captions as {smaller:.0f}s windows: {str(error)}")
+    return iterVideoSearchQueriesTimed(" ".join(text for _, text in remainder), remainder, smaller, concurrency)
+
+def getVideoSearchQueriesTimed(script, captions_timed, window_seconds=WINDOW_SECONDS, concurrency=LLM_CONCURRENCY):
+    try:
+        out = list(iterVideoSearchQueriesTimed(script, captions_timed, window_seconds, concurrency))
+        if not out:
             raise ValueError("Invalid format in API response")
-        
         return out
     except Exception as e:
         logging.error(f"Error in getVideoSearchQueriesTimed: {str(e)}")
         return None
 
+async def streamVideoSearchQueriesTimed(script, captions_timed, search_terms=None):
+    # Async view of iterVideoSearchQueriesTimed for the footage pipeline; the
+    # blocking client runs on a worker thread. Segments are also appended to
+    # search_terms. Raises if the response fails or doesn't parse.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+    stop = threading.Event()
+
+    def produce():
+        _stop_requested.set(stop)
+        try:
+            for segment in iterVideoSearchQueriesTimed(script, captions_timed):
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, segment)
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+        except KeywordRequestStopped:
+            pass
+        except Exception as e:
+            loop.call_soon_threadsafe(queue.put_nowait, e)
+
+    producer = asyncio.ensure_future(asyncio.to_thread(produce))
+    try:
+        while True:
+            item = await queue.get()
+            if item is done:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if search_terms is not None:
+                search_terms.append(item)
+            yield item
+    finally:
+        # A consumer that stops early (error, cancellation) doesn't wait for
+        # the rest of the responses to stream in
+        stop.set()
+        await producer
+
 def merge_empty_intervals(segments):
     merged = []
     i = 0
@@ -0,0 +1,194 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import asyncio
+import argparse
+import logging
+import app
+from batch import load_jobs
+from utility.job_queue import JobQueue, JobFailed, STAGES, QUEUE_DB
+from utility.captions.transcription_service import TranscriptionService, WHISPER_WORKERS
+
+# Queue-driven entry point for spreading video generation over processes
+# and machines. Jobs are enqueued once; each worker serves some stages, so
+# CPU-heavy stages (captions with Whisper, render) and I/O-heavy ones
+# (audio, footage search and downloads) scale independently:
+#
+#   python worker.py enqueue scripts/ --output_dir /shared/jobs --render_backend ffmpeg
+#   python worker.py work --stages audio footage --concurrency 8
+#   python worker.py work --stages captions render
+#   python worker.py status
+
+POLL_INTERVAL = float(os.environ.get('QUEUE_POLL_INTERVAL', '1'))
+
+def script_of(params):
+    return app.read_script_from_file(params["script_file"])
+
+def captions_of(checkpoints):
+    return [((t1, t2), text) for (t1, t2), text in checkpoints["captions"]["captions"]]
+
+def attempt_file(params, name, attempt):
+    # Each attempt writes its own file: a worker that lost its lease may still
+    # be writing until its heartbeat notices, while another attempt runs
+    base, ext = os.path.splitext(name)
+    return os.path.join(params["work_dir"], f"{base}.{attempt}{ext}")
+
+async def run_audio(params, checkpoints, timings, transcriber, attempt):
+    audio_file = attempt_file(params, app.AUDIO_FILE_NAME, attempt)
+    audio_key, word_boundaries = await app.process_audio(script_of(params), audio_file, params["caption_source"], timings=timings)
+    return {"audio_file": audio_file, "audio_key": audio_key, "word_boundaries": word_boundaries}
+
+async def run_captions(params, checkpoints, timings, transcriber, attempt):
+    audio = checkpoints["audio"]
+    timed_captions = await app.process_captions(audio["audio_key"], audio["audio_file"], audio["word_boundaries"],
+                                                params["caption_source"], timings=timings, transcriber=transcriber)
+    if not timed_captions:
+        raise JobFailed("No timed captions generated")
+    return {"captions": timed_captions}
+
+async def run_footage(params, checkpoints, timings, transcriber, attempt):
+    background_video_urls, previews = await app.find_footage(script_of(params), captions_of(checkpoints), params["render_backend"],
+                                                             timings=timings, draft=params["draft"],
+                                                             audio_file=checkpoints["audio"]["audio_file"])
+    if not background_video_urls:
+        raise JobFailed("No background video found")
+    return {"background_video_urls": background_video_urls, "previews": previews}
+
+async def run_render(params, checkpoints, timings, transcriber, attempt):
+    audio_file = checkpoints["audio"]["audio_file"]
+    timed_captions = captions_of(checkpoints)
+    footage = checkpoints["footage"]
+    output_file = os.path.join(params["work_dir"], app.DRAFT_FILE_NAME if params["draft"] else app.OUTPUT_FILE_NAME)
+    video = await app.render_video(audio_file, timed_captions, footage["background_video_urls"], output_file,
+                                   params["render_backend"], timings=timings, draft=params["draft"], previews=footage["previews"])
+    if not video:
+        raise RuntimeError("Render produced no output")
+    if params["draft"]:
+        app.save_draft_manifest(video, audio_file, timed_captions, footage["background_video_urls"])
+    return {"output": video}
+
+STAGE_RUNNERS = {
+    "audio": run_audio,
+    "captions": run_captions,
+    "footage": run_footage,
+    "render": run_render,
+}
+
+async def heartbeat(queue, task, owner, work, lost):
+    # Cancels the stage once the lease is lost, as another worker may
+    # already be running the task again
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not await asyncio.to_thread(queue.heartbeat, task["job_id"], task["stage"], owner):
+            logging.warning(f"Lost the lease on {task['name']}/{task['stage']}; cancelling it")
+            lost.set()
+            work.cancel()
+            return
+
+async def run_task(queue, task, owner, transcriber):
+    job_id, stage = task["job_id"], task["stage"]
+    logging.info(f"Running {task['name']}/{stage} (attempt {task['attempt']})")
+    timings = {}
+    start = time.perf_counter()
+    work = asyncio.create_task(STAGE_RUNNERS[stage](task["params"], task["checkpoints"], timings, transcriber, task["attempt"]))
+    lost = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(queue, task, owner, work, lost))
+    try:
+        checkpoint = await work
+    except asyncio.CancelledError:
+        if lost.is_set():
+            return
+        # Shutting down: hand the task back without counting the attempt
+        queue.release(job_id, stage, owner)
+        raise
+    except JobFailed as e:
+        logging.error(f"Job {task['name']} failed in {stage}: {str(e)}")
+        await asyncio.to_thread(queue.fail, job_id, stage, owner, str(e), False)
+    except Exception as e:
+        logging.error(f"Error in {task['name']}/{stage}: {str(e)}")
+        await asyncio.to_thread(queue.fail, job_id, stage, owner, str(e))
+    else:
+        checkpoint["timings"] = timings
+        if await asyncio.to_thread(queue.complete, job_id, stage, owner, checkpoint):
+            logging.info(f"Finished {task['name']}/{stage} in {time.perf_counter() - start:.2f}s")
+    finally:
+        beat.cancel()
+
+async def run_worker(queue, stages, concurrency=1, drain=False, poll_interval=POLL_INTERVAL, whisper_workers=WHISPER_WORKERS):
+    # Runs up to concurrency tasks at once; with drain, returns once no task
+    # of these stages is left to do
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+    # Whisper loads on first use, so workers that never transcribe never load it
+    transcriber = TranscriptionService(workers=whisper_workers)
+    logging.info(f"Worker {owner} serving {', '.join(stages)} with {concurrency} slots")
+
+    async def slot():
+        while True:
+            task = await asyncio.to_thread(queue.claim, stages, owner)
+            if task is not None:
+                await run_task(queue, task, owner, transcriber)
+            elif drain and await asyncio.to_thread(queue.pending, stages) == 0:
+                return
+            else:
+                await asyncio.sleep(poll_interval)
+
+    try:
+        await asyncio.gather(*(slot() for _ in range(concurrency)))
+    finally:
+        await transcriber.stop()
+
+def enqueue_jobs(queue, source, output_dir, render_backend, caption_source, draft=False):
+    job_ids = []
+    for job in load_jobs(source):
+        work_dir = os.path.abspath(os.path.join(output_dir, job["name"]))
+        os.makedirs(work_dir, exist_ok=True)
+        params = {"script_file": os.path.abspath(job["script_file"]), "work_dir": work_dir, "render_backend": render_backend,
+                  "caption_source": caption_source, "draft": draft}
+        job_ids.append(queue.enqueue(job["name"], params))
+    return job_ids
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Durable job queue and stage workers for video generation.")
+    parser.add_argument("--db", type=str, default=QUEUE_DB, help="Queue database; shared by every worker")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue = commands.add_parser("enqueue", help="Add jobs for scripts")
+    enqueue.add_argument("source", type=str, help="Directory of .txt scripts, or a .json/.txt manifest")
+    enqueue.add_argument("--output_dir", type=str, default="queue_output", help="Directory for per-job working directories")
+    enqueue.add_argument("--render_backend", type=str, choices=list(app.RENDER_BACKENDS), default='moviepy', help="Engine used for the final render")
+    enqueue.add_argument("--caption_source", type=str, choices=['tts', 'whisper'], default='tts', help="Take caption timings from TTS word boundaries or from a Whisper transcription")
+    enqueue.add_argument("--draft", action="store_true", help="Render low-resolution drafts")
+
+    work = commands.add_parser("work", help="Run a worker")
+    work.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages this worker runs")
+    work.add_argument("--concurrency", type=int, default=1, help="Tasks run at once")
+    work.add_argument("--drain", action="store_true", help="Exit once no task of these stages is left")
+    work.add_argument("--whisper_workers", type=int, default=WHISPER_WORKERS, help="Concurrent transcriptions, each with its own loaded Whisper model")
+
+    status = commands.add_parser("status", help="Print queue statistics, or every job with --jobs")
+    status.add_argument("--jobs", action="store_true", help="List jobs with their stage states")
+
+    requeue = commands.add_parser("requeue", help="Restart failed jobs from their failed stage")
+    requeue.add_argument("job_ids", nargs="*", help="Jobs to restart; all failed jobs if omitted")
+
+    args = parser.parse_args()
+    queue = JobQueue(args.db)
+
+    if args.command == "enqueue":
+        job_ids = enqueue_jobs(queue, args.source, args.output_dir, args.render_backend, args.caption_source, args.draft)
+        logging.info(f"Enqueued {len(job_ids)} jobs from {args.source}")
+    elif args.command == "work":
+        try:
+            asyncio.run(run_worker(queue, args.stages, args.concurrency, args.drain, whisper_workers=args.whisper_workers))
+        except KeyboardInterrupt:
+            logging.info("Worker stopped")
+    elif args.command == "status":
+        json.dump(queue.jobs() if args.jobs else queue.get_stats(), sys.stdout, indent=2)
+        print()
+    elif args.command == "requeue":
+        job_ids = args.job_ids or [job["id"] for job in queue.jobs("failed")]
+        requeued = sum(1 for job_id in job_ids if queue.requeue(job_id))
+        logging.info(f"Requeued {requeued} jobs")